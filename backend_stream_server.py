@@ -1,8 +1,9 @@
 # backend_stream_server.py
 from fastapi import FastAPI, WebSocket, Request
 from fastapi.middleware.cors import CORSMiddleware
-import asyncio, json, logging, os
+import asyncio, json, logging, os, time
 from prostocks_connector import ProStocksAPI
+from rescreen_scheduler import RescreenScheduler
 
 print("🔥🔥 BACKEND STREAM SERVER LOADED 🔥🔥")
 
@@ -396,6 +397,26 @@ async def place_order_simple(request: Request):
 auto_trader_running = False
 auto_trader_task = None
 
+# candle events from the tick engine → symbols to rescreen
+rescreen_scheduler = RescreenScheduler.from_env()
+
+
+# per-stage stats of the last screener run
+LAST_PIPELINE_METRICS = {}
+
+
+@app.get("/pipeline_metrics")
+async def pipeline_metrics_api():
+    return {"pipeline": LAST_PIPELINE_METRICS, "rescreen": rescreen_scheduler.stats()}
+
+
+@app.post("/candle_events")
+async def candle_events_api(request: Request):
+    body = await request.json()
+    events = body.get("events", [])
+    rescreen_scheduler.handle_events(events)
+    return {"status": "ok", "received": len(events), **rescreen_scheduler.stats()}
+
 
 async def auto_trader_loop():
     """
@@ -404,25 +425,45 @@ async def auto_trader_loop():
     """
     import asyncio
     from batch_screener import main as batch_main
+    from trading_calendar import get_calendar
     global auto_trader_running, ps_api
 
     logging.info("🚀 Auto Trader Loop Started")
+    calendar = get_calendar()
+    first_pass = True
 
     while auto_trader_running:
+        # idle outside market hours (re-check at most every minute)
+        wait = calendar.seconds_until_open()
+        if wait > 0:
+            await asyncio.sleep(min(wait, 60))
+            continue
+
+        # first pass screens everything; after that only symbols whose
+        # candles changed (per rescreen policy) are re-evaluated
+        if first_pass:
+            symbols = None
+            first_pass = False
+        else:
+            dirty = await asyncio.to_thread(rescreen_scheduler.wait, 30)
+            if not dirty:
+                continue
+            symbols = sorted(dirty)
+
         try:
-            await asyncio.to_thread(
+            out = await asyncio.to_thread(
                 batch_main,
                 ps_api,                       # FIX 1
                 None,                         # args
                 ps_api.trm_settings,          # FIX 2 → TRM always passed
-                None,                         # symbols
+                symbols,                      # None = full sweep
                 True                          # FIX 3 → place orders
             )
+            if isinstance(out, dict) and out.get("metrics"):
+                LAST_PIPELINE_METRICS.update(out["metrics"], at=time.time())
         except Exception as e:
             logging.error(f"❌ Auto Trader error: {e}")
 
-        await asyncio.sleep(3)
-
     logging.info("🛑 Auto Trader Loop Stopped")
 
 
@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+"""
+backtester.py
+Vectorized backtest of the live screener strategy.
+
+Entry rules = generate_signal_for_df evaluated on every bar at once:
+  TRM signal + MACD histogram + PAC mid, yesterday high/low, time-of-day
+  volatility threshold, day move (> 1.5 %) and gap (> 1.0 %) filters —
+  all with day-so-far values, so bar t only sees bars ≤ t. The day
+  values are the indicator graph's own columns (day_volatility,
+  skip_due_to_day_move, skip_due_to_gap), i.e. the trm_core rules.
+  The intraday candle-range filter (candle > 1.3 % / two candles ≥ 2 %)
+  is left out on purpose: the live code re-computes the signal after
+  that skip, so it never takes effect.
+Order rules = place_order_from_signal:
+  PAC band distance (2 %), get_dynamic_target_trail(volatility, bar time),
+  SL gap clamped to the table's min/max %, TP gap, tick rounding, trail.
+Book rules: one open position per symbol, each side at most once per day
+(check_trade_cycle_status), entries until the cutoff, square-off at the
+auto-exit time.
+
+Bracket exits are simulated for all candidate entries together on an
+(entries × bars-to-day-end) matrix:
+  - trailing SL moves by trail_rs for every full trail_rs of favourable
+    excursion (best price of the previous bars)
+  - SL and TP on the same bar → SL (conservative); gaps fill at the open
+  - no hit → exit at the close of the last bar before the auto-exit time
+
+Entry price = close of the signal bar (the live screener decides on the
+running candle). Bars inside the indicator warm-up are never traded.
+
+History (load_history): the live files only hold the warm-up window, so
+offline runs fetch the last `days` sessions + the warm-up as 1-minute
+TPSeries through the backend's broker session, resampled to 5 min like the
+tick engine preload, and keep them in history/<SYMBOL>.pkl until the next
+session close. A symbol with fewer sessions than requested is an error.
+
+Usage:
+  python backtester.py --days 60 [--symbols SBIN-EQ,TCS-EQ] [--out trades.csv]
+"""
+import argparse
+import math
+import os
+from datetime import datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+
+from indicator_graph import TRM_GRAPH
+from lookback_planner import required_bars, session_days
+from screener_prefilter import vol_thresholds
+from trading_calendar import IST, get_calendar
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_DIR = os.path.join(BASE_DIR, "history")
+BACKEND_URL = os.environ.get("BACKEND_URL", "https://backend-stream-nmlf.onrender.com")
+
+DEFAULT_START = time(9, 15)
+DEFAULT_CUTOFF = time(14, 50)       # dashboard_settings cutoff_time
+DEFAULT_EXIT = time(15, 12)         # dashboard_settings auto_exit_time
+BARS_PER_SESSION = 75               # 5-min bars, 09:15–15:30
+PAC_BAND_MAX = 0.02                 # BUY ≤ 2 % above PAC low / SELL ≤ 2 % below PAC high
+
+DAY_COLUMNS = ["date", "high_yest", "low_yest", "day_volatility",
+               "skip_due_to_day_move", "skip_due_to_gap"]
+SIGNAL_COLUMNS = ["trm_signal", "macd_hist", "pacC", "pacL", "pacU"]
+FRAME_COLUMNS = SIGNAL_COLUMNS + DAY_COLUMNS
+
+
+# =========================
+# Per-bar strategy evaluation
+# =========================
+def day_context(df):
+    """
+    Settings-independent part of the strategy (computed once per symbol):
+    OHLC arrays, yesterday high / low, day-so-far volatility and the
+    volatility / day move / gap filter (graph columns) → dict of arrays.
+    """
+    cols = TRM_GRAPH.columns(df, None, DAY_COLUMNS)
+    dt = df["datetime"]
+    date = cols["date"]
+    close = df["close"].to_numpy(dtype="float64")
+    volatility = cols["day_volatility"].to_numpy(dtype="float64")
+
+    minutes = (dt.dt.hour * 60 + dt.dt.minute + dt.dt.second / 60).to_numpy()
+    ok = volatility >= vol_thresholds(minutes)
+    ok &= ~cols["skip_due_to_day_move"].to_numpy(dtype=bool)
+    ok &= ~cols["skip_due_to_gap"].to_numpy(dtype=bool)
+
+    return {
+        "datetime": dt.reset_index(drop=True),
+        "date": date.reset_index(drop=True),
+        "minute": minutes,
+        "open": df["open"].to_numpy(dtype="float64"),
+        "high": df["high"].to_numpy(dtype="float64"),
+        "low": df["low"].to_numpy(dtype="float64"),
+        "close": close,
+        "high_yest": cols["high_yest"].to_numpy(dtype="float64"),
+        "low_yest": cols["low_yest"].to_numpy(dtype="float64"),
+        "volatility": volatility,
+        "day_ok": ok,
+    }
+
+
+def strategy_sides(day, trm_signal, macd_hist, pacC):
+    """Per-bar side (+1 BUY / -1 SELL / 0) from the TRM columns + day_context."""
+    close = day["close"]
+    trm = np.asarray(trm_signal)
+    hist = np.asarray(macd_hist, dtype="float64")
+    pacC = np.asarray(pacC, dtype="float64")
+
+    # core confluence (NaN PAC / histogram never qualifies, as in the live code)
+    buy = (trm == "Buy") & (hist > 0) & (close > pacC)
+    sell = (trm == "Sell") & (hist < 0) & (close < pacC)
+
+    # yesterday high / low
+    buy &= ~(close <= day["high_yest"])
+    sell &= ~(close >= day["low_yest"])
+
+    ok = day["day_ok"]
+    return np.where(buy & ok, 1, np.where(sell & ok, -1, 0))
+
+
+def signal_frame(day, side, pac_lower, pac_upper):
+    """Frame consumed by backtest_frame."""
+    return pd.DataFrame({
+        "datetime": day["datetime"],
+        "date": day["date"],
+        "minute": day["minute"],
+        "side": side,
+        "open": day["open"],
+        "high": day["high"],
+        "low": day["low"],
+        "close": day["close"],
+        "pacL": np.asarray(pac_lower, dtype="float64"),
+        "pacU": np.asarray(pac_upper, dtype="float64"),
+        "volatility": day["volatility"],
+    })
+
+
+def strategy_frame(df, settings, day=None):
+    """
+    generate_signal_for_df on every bar → DataFrame with
+    side (+1 BUY / -1 SELL / 0), OHLC, pacL, pacU, volatility, date, minute.
+    df: sorted 5-min candles with IST datetimes (naive or tz-aware).
+    day: day_context(df) when already computed.
+    """
+    day = day_context(df) if day is None else day
+    cols = TRM_GRAPH.columns(df, settings, SIGNAL_COLUMNS)
+    side = strategy_sides(day, cols["trm_signal"].to_numpy(), cols["macd_hist"].to_numpy(),
+                          cols["pacC"].to_numpy())
+    return signal_frame(day, side, cols["pacL"].to_numpy(), cols["pacU"].to_numpy())
+
+
+# =========================
+# Bracket orders
+# =========================
+def bracket_params(side, price, pac_lower, pac_upper, volatility, decision_time):
+    """
+    place_order_from_signal's order maths → (sl_gap, tp_gap, trail_rs) or None
+    when the order would be skipped.
+    """
+    from batch_screener import get_dynamic_target_trail
+
+    if np.isnan(pac_lower) or np.isnan(pac_upper):
+        return None
+    if side > 0 and price > pac_lower * (1 + PAC_BAND_MAX):
+        return None
+    if side < 0 and price < pac_upper * (1 - PAC_BAND_MAX):
+        return None
+
+    target_pct, trail_pct, min_sl_pct, max_sl_pct = get_dynamic_target_trail(
+        round(float(volatility), 2), now=decision_time)
+    if target_pct is None:
+        return None
+
+    pac_gap = abs(price - (pac_lower if side > 0 else pac_upper))
+    min_sl_rs = price * (min_sl_pct / 100.0)
+    max_sl_rs = price * (max_sl_pct / 100.0)
+    sl_gap = min(max(pac_gap, min_sl_rs), max_sl_rs)
+    tp_gap = max(price * (target_pct / 100.0), min_sl_rs)
+
+    tick = 0.01 if price < 200 else 0.05
+    return (round(sl_gap / tick) * tick,
+            round(tp_gap / tick) * tick,
+            round(price * (trail_pct / 100.0), 2))
+
+
+def simulate_exits(frame, entries, side, sl_gap, tp_gap, trail, last_bar):
+    """
+    Vectorized bracket exits for all entries of one symbol.
+    entries: bar index of each entry; last_bar: last tradable bar of its day.
+    → (exit_idx, exit_price, reason)
+    """
+    n_bars = len(frame)
+    entry = frame["close"].to_numpy()[entries] * side          # mirrored: SELL → -price
+    horizon = int(max(1, (last_bar - entries).max()))
+
+    J = entries[:, None] + np.arange(1, horizon + 1)[None, :]
+    valid = J <= last_bar[:, None]
+    Jc = np.minimum(J, n_bars - 1)
+
+    s = side[:, None]
+    hi = np.where(s > 0, frame["high"].to_numpy()[Jc], -frame["low"].to_numpy()[Jc])
+    lo = np.where(s > 0, frame["low"].to_numpy()[Jc], -frame["high"].to_numpy()[Jc])
+    op = frame["open"].to_numpy()[Jc] * s
+
+    # best favourable price before each bar → trailed stop
+    best = np.maximum.accumulate(np.where(valid, hi, -np.inf), axis=1)
+    prev_best = np.concatenate([entry[:, None], best[:, :-1]], axis=1)
+    prev_best = np.maximum(prev_best, entry[:, None])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        steps = np.where(trail[:, None] > 0,
+                         np.floor((prev_best - entry[:, None]) / trail[:, None]), 0.0)
+    stop = entry[:, None] - sl_gap[:, None] + steps * trail[:, None]
+    target = (entry + tp_gap)[:, None]
+
+    hit_sl = valid & (lo <= stop)
+    hit_tp = valid & (hi >= target)
+    hit = hit_sl | hit_tp
+    any_hit = hit.any(axis=1)
+    k = np.argmax(hit, axis=1)
+    rows = np.arange(len(entries))
+
+    sl_first = hit_sl[rows, k]
+    exit_px = np.where(sl_first,
+                       np.minimum(op[rows, k], stop[rows, k]),
+                       np.maximum(op[rows, k], target[rows, 0]))
+    reason = np.where(sl_first, np.where(steps[rows, k] > 0, "trail", "sl"), "tp")
+
+    exit_idx = np.where(any_hit, Jc[rows, k], last_bar)
+    eod_px = frame["close"].to_numpy()[last_bar] * side
+    exit_px = np.where(any_hit, exit_px, eod_px) * side        # un-mirror
+    reason = np.where(any_hit, reason, "eod")
+    return exit_idx, exit_px, reason
+
+
+def _minutes(t):
+    return t.hour * 60 + t.minute + t.second / 60
+
+
+def _time_of(minutes):
+    secs = int(round(minutes * 60))
+    return time(secs // 3600 % 24, secs // 60 % 60, secs % 60)
+
+
+def _last_tradable_bar(frame, exit_time, interval):
+    """Index of the bar each day is squared off at (its close ≤ exit_time, else day's last)."""
+    n = len(frame)
+    codes = pd.factorize(frame["date"])[0]
+    starts = np.r_[0, np.flatnonzero(np.diff(codes)) + 1]
+    counts = np.diff(np.r_[starts, n])
+    idx = np.arange(n)
+    eligible = np.where(frame["minute"].to_numpy() + interval <= _minutes(exit_time), idx, -1)
+    last = np.maximum.reduceat(eligible, starts)
+    last = np.where(last >= 0, last, starts + counts - 1)
+    return np.repeat(last, counts)
+
+
+# =========================
+# Engine
+# =========================
+def backtest_symbol(symbol, df, settings, qty_map=None, interval=5,
+                    start=DEFAULT_START, cutoff=DEFAULT_CUTOFF, exit_time=DEFAULT_EXIT,
+                    warmup=None):
+    """Trades of one symbol → list of dicts."""
+    if df is None or len(df) < 2:
+        return []
+    frame = strategy_frame(df, settings)
+    warmup = required_bars(settings) if warmup is None else warmup
+    return backtest_frame(symbol, frame, qty_map=qty_map, interval=interval,
+                          start=start, cutoff=cutoff, exit_time=exit_time, warmup=warmup)
+
+
+def backtest_frame(symbol, frame, qty_map=None, interval=5,
+                   start=DEFAULT_START, cutoff=DEFAULT_CUTOFF, exit_time=DEFAULT_EXIT,
+                   warmup=0):
+    """Trades of one strategy_frame → list of dicts."""
+    from trm_core import suggested_qty_by_mapping
+
+    decision = frame["minute"].to_numpy() + interval
+    sides_all = frame["side"].to_numpy()
+    cand = np.flatnonzero(
+        (sides_all != 0)
+        & (np.arange(len(frame)) >= warmup)
+        & (decision >= _minutes(start)) & (decision <= _minutes(cutoff))
+    )
+    if cand.size == 0:
+        return []
+
+    close = frame["close"].to_numpy()
+    pac_l = frame["pacL"].to_numpy()
+    pac_u = frame["pacU"].to_numpy()
+    vol = frame["volatility"].to_numpy()
+
+    # order maths per candidate (few rows; exact live arithmetic)
+    keep, sides, sl, tp, tr = [], [], [], [], []
+    for i in cand:
+        side = int(sides_all[i])
+        p = bracket_params(side, float(close[i]), pac_l[i], pac_u[i], vol[i], _time_of(decision[i]))
+        if p is None:
+            continue
+        keep.append(i)
+        sides.append(side)
+        sl.append(p[0])
+        tp.append(p[1])
+        tr.append(p[2])
+    if not keep:
+        return []
+
+    entries = np.asarray(keep)
+    side = np.asarray(sides)
+    last_bar = _last_tradable_bar(frame, exit_time, interval)[entries]
+    exit_idx, exit_px, reason = simulate_exits(
+        frame, entries, side, np.asarray(sl), np.asarray(tp), np.asarray(tr), last_bar)
+
+    # book rules: one position at a time, each side once per day
+    trades = []
+    busy_until = -1
+    used = set()
+    dates = frame["date"].to_numpy()
+    times = frame["datetime"]
+    for j, i in enumerate(entries):
+        day = dates[i]
+        if i <= busy_until or (day, side[j]) in used:
+            continue
+        entry_px = float(close[i])
+        qty = suggested_qty_by_mapping(entry_px, qty_map)
+        if not qty:
+            continue
+        busy_until = int(exit_idx[j])
+        used.add((day, side[j]))
+        pnl = (float(exit_px[j]) - entry_px) * side[j] * qty
+        trades.append({
+            "symbol": symbol,
+            "side": "BUY" if side[j] > 0 else "SELL",
+            "entry_time": times.iat[i],
+            "entry": entry_px,
+            "exit_time": times.iat[int(exit_idx[j])],
+            "exit": round(float(exit_px[j]), 4),
+            "reason": str(reason[j]),
+            "qty": qty,
+            "sl_gap": sl[j],
+            "tp_gap": tp[j],
+            "trail": tr[j],
+            "pnl": round(pnl, 4),
+            "pnl_pct": round((float(exit_px[j]) - entry_px) / entry_px * 100 * side[j], 4),
+        })
+    return trades
+
+
+def summarize(trades):
+    if trades.empty:
+        return {"trades": 0, "wins": 0, "win_rate": 0.0, "total_pnl": 0.0,
+                "avg_pnl_pct": 0.0, "profit_factor": None, "max_drawdown": 0.0, "by_reason": {}}
+    pnl = trades.sort_values("exit_time", kind="stable")["pnl"]
+    equity = pnl.cumsum()
+    gross_win = pnl[pnl > 0].sum()
+    gross_loss = -pnl[pnl < 0].sum()
+    return {
+        "trades": int(len(trades)),
+        "wins": int((trades["pnl"] > 0).sum()),
+        "win_rate": round(float((trades["pnl"] > 0).mean() * 100), 2),
+        "total_pnl": round(float(pnl.sum()), 2),
+        "avg_pnl_pct": round(float(trades["pnl_pct"].mean()), 4),
+        "profit_factor": round(float(gross_win / gross_loss), 3) if gross_loss > 0 else None,
+        "max_drawdown": round(float((equity.cummax() - equity).max()), 2),
+        "by_reason": trades["reason"].value_counts().to_dict(),
+    }
+
+
+def run_backtest(frames, settings, qty_map=None, **kwargs):
+    """
+    frames: {symbol: 5-min candle DataFrame (naive IST datetimes, sorted)}
+    → (trades DataFrame, summary dict)
+    """
+    if qty_map is None:
+        from dashboard_logic import load_qty_map
+        qty_map = load_qty_map()
+
+    rows = []
+    for sym, df in frames.items():
+        rows.extend(backtest_symbol(sym, df, settings, qty_map=qty_map, **kwargs))
+    trades = pd.DataFrame(rows)
+    return trades, summarize(trades)
+
+
+# =========================
+# CLI
+# =========================
+def backend_session():
+    """(ps_api, tokens_map) on the backend's broker session (same attach as tick_engine_worker)."""
+    import requests
+    from prostocks_connector import ProStocksAPI
+
+    try:
+        info = requests.get(f"{BACKEND_URL}/session_info", timeout=25).json()
+    except Exception as e:
+        raise SystemExit(f"❌ Could not load session_info from backend: {e}")
+    token, userid = info.get("session_token"), info.get("userid")
+    tokens_map = info.get("tokens_map") or {}
+    if not (token and userid and tokens_map):
+        raise SystemExit("❌ Backend has no broker session yet (log in on the dashboard first)")
+
+    ps_api = ProStocksAPI(
+        userid=userid,
+        password_plain="",
+        vc=info.get("vc") or os.environ.get("VC"),
+        api_key=info.get("api_key") or os.environ.get("API_KEY"),
+        imei=info.get("imei") or os.environ.get("IMEI"),
+        base_url=os.environ.get("BASE_URL", "https://starapi.prostocks.com/NorenWClientTP"),
+    )
+    ps_api.session_token = token
+    ps_api.jKey = token
+    ps_api.uid = userid
+    ps_api.actid = userid
+    ps_api.logged_in = True
+    ps_api.is_logged_in = True
+    ps_api.is_session_active = True
+    ps_api.headers = {
+        "Content-Type": "application/x-www-form-urlencoded",
+        "Authorization": token,
+    }
+    return ps_api, tokens_map
+
+
+def history_sessions(df):
+    """Sorted trading dates present in a candle frame."""
+    if df is None or df.empty:
+        return []
+    cal = get_calendar()
+    return sorted(d for d in df["datetime"].dt.date.unique() if cal.is_trading_day(d))
+
+
+def _last_close(now=None):
+    """Close of the latest finished session (tz-aware IST)."""
+    now = now or datetime.now(IST)
+    past = [c for _, c in get_calendar().sessions_between(now - timedelta(days=15), now)
+            if c <= now.timestamp()]
+    return datetime.fromtimestamp(past[-1], IST) if past else now
+
+
+def _cached_history(sym, sessions):
+    """history/<sym>.pkl if written after the last session close and long enough, else None."""
+    path = os.path.join(HISTORY_DIR, f"{sym}.pkl")
+    if not os.path.exists(path) or os.path.getmtime(path) < _last_close().timestamp():
+        return None
+    df = pd.read_pickle(path)
+    return df if len(history_sessions(df)) >= sessions else None
+
+
+def fetch_history(ps_api, token, sessions, store=None, exch="NSE"):
+    """Last `sessions` sessions of 5-min candles (1m TPSeries resampled locally, tz-aware IST)."""
+    import batch_screener as bs
+    from candle_resampler import MinuteBarStore
+
+    store = store or MinuteBarStore(max_days=session_days(sessions + 1), refresh_secs=None)
+    try:
+        store.load(ps_api, exch, token)
+        df = store.get(exch, token, 5).copy()
+    finally:
+        store.drop(exch, token)
+    if df.empty:
+        return df
+    return bs.tz_normalize_df(df).sort_values("datetime").reset_index(drop=True)
+
+
+def load_history(symbols, days, settings, session=None):
+    """
+    5-min history per symbol: the last `days` sessions + the indicator warm-up.
+
+    symbols: list, or None for every symbol of the backend's token map.
+    session: (ps_api, tokens_map); attached from the backend when a symbol
+    has to be fetched. Raises ValueError if any symbol has fewer sessions.
+    """
+    from candle_resampler import MinuteBarStore
+
+    warmup = math.ceil(required_bars(settings) / BARS_PER_SESSION)
+    need = days + warmup
+    if symbols is None:
+        session = session or backend_session()
+        symbols = sorted(session[1])
+
+    store = MinuteBarStore(max_days=session_days(need + 1), refresh_secs=None)
+    frames, short = {}, {}
+    for sym in symbols:
+        df = _cached_history(sym, need)
+        if df is None:
+            session = session or backend_session()
+            token = session[1].get(sym)
+            df = fetch_history(session[0], token, need, store) if token else None
+            if df is not None and not df.empty:
+                os.makedirs(HISTORY_DIR, exist_ok=True)
+                df.to_pickle(os.path.join(HISTORY_DIR, f"{sym}.pkl"))
+
+        found = history_sessions(df)
+        if len(found) < need:
+            short[sym] = len(found)
+            continue
+        frames[sym] = df[df["datetime"].dt.date >= found[-need]].reset_index(drop=True)
+        print(f"📥 {sym}: {len(frames[sym])} candles, {need} sessions")
+
+    if short:
+        listed = ", ".join(f"{s} ({n})" for s, n in list(short.items())[:10])
+        raise ValueError(f"❌ {len(short)} of {len(symbols)} symbols have fewer than {need} sessions "
+                         f"({days} + {warmup} warm-up): {listed}")
+    return frames
+
+
+def main():
+    from trm_core import get_trm_settings
+
+    parser = argparse.ArgumentParser(description="Vectorized strategy backtest")
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--symbols", default="", help="comma separated (default: backend token map)")
+    parser.add_argument("--out", default="", help="write trades CSV")
+    args = parser.parse_args()
+
+    settings = get_trm_settings()
+    if not settings:
+        raise SystemExit("❌ TRM settings missing (trm_settings.json)")
+
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()] or None
+    try:
+        frames = load_history(symbols, args.days, settings)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    trades, summary = run_backtest(frames, settings)
+    print(f"📊 {len(frames)} symbols | {summary}")
+    if args.out and not trades.empty:
+        trades.to_csv(args.out, index=False)
+        print(f"💾 trades → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -27,9 +27,14 @@ print("🔍 Using TRM file:", TRM_FILE)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 LIVE_PATH = os.path.join(BASE_DIR, "live_candles")
+TPS_PATH = os.path.join(BASE_DIR, "tpseries")
 
 
-def load_live_5min(sym):
+def load_live_5min(sym, bars=None):
+    """
+    TPSeries + live candles → 5-min bars, trimmed to the indicator warm-up
+    window (bars=None → planned from the saved TRM settings).
+    """
     sym_clean = str(sym).upper().replace("-EQ", "").strip()
 
     live_fn = os.path.join(LIVE_PATH, f"{sym_clean}.json")
@@ -80,15 +85,9 @@ def load_live_5min(sym):
 
     print(f"✅ MERGED {sym_clean}: Total {len(df)} candles")
 
-    return df.tail(200)
-
-    except Exception as e:
-        print(f"❌ load_live_5min error {sym}: {e}")
-        return pd.DataFrame()
-
-    # If both not found
-    print(f"❌ Tick data missing for {sym} (tried both)")
-    return pd.DataFrame()
+    if bars is None:
+        bars = required_bars(trm.load_trm_settings_from_file())
+    return trim_to_lookback(df, bars)
 
 import os
 import time
@@ -100,7 +99,17 @@ import numpy as np
 
 from prostocks_connector import ProStocksAPI
 from dashboard_logic import place_order_from_signal, load_credentials
-import tkp_trm_chart as trm
+import trm_core as trm
+from screener_prefilter import vol_threshold_at, prefilter_symbols, load_snapshot
+from indicator_graph import TRM_GRAPH
+from lookback_planner import backfill_days, required_bars, trim_to_lookback
+
+# indicator columns generate_signal_for_df reads (ATR trails are not used here)
+SIGNAL_COLUMNS = ["trm_signal", "macd_hist", "pacC", "pacL", "pacU",
+                  "date", "range_pct", "day_two_bar_move"]
+# day filters, only needed without daily levels
+DAY_FILTER_COLUMNS = ["high_yest", "low_yest", "day_move_pct", "skip_due_to_day_move",
+                      "gap_pct", "skip_due_to_gap", "day_volatility"]
 import threading
 print("🔥🔥 batch_screener_debug.py LOADED 🔥🔥")
 # -----------------------------
@@ -316,18 +325,16 @@ def resp_to_status_and_list(resp):
 # ----------------------- 
 # Signal generation with debug
 # -----------------------
-def generate_signal_for_df(df, settings):
+def generate_signal_for_df(df, settings, levels=None):
+    """
+    levels: optional daily reference levels of this symbol (daily_levels),
+    matching df's last bar → gap / day-move / YHL / day range read in O(1)
+    instead of grouping the history by date.
+    """
     print("✅✅ FUNCTION generate_signal_for_df CALLED ✅✅")
     try:
-        df = df.copy()
-        df = trm.calc_tkp_trm(df, settings)
-        df = trm.calc_macd(df, settings)
-        df = trm.calc_pac(df, settings)
-        df = trm.calc_atr_trails(df, settings)
-        df = trm.calc_yhl(df)
-        df = trm.calc_gap_move_flag(df)
-        df = trm.calc_intraday_volatility_flag(df)  # ✅ add this line if defined in tkp_trm_chart.py
-        df = trm.calc_day_move_flag(df)  # ✅ new day move indicator (adds day_move_pct + flag)
+        want = SIGNAL_COLUMNS + (DAY_FILTER_COLUMNS if levels is None else [])
+        df = TRM_GRAPH.frame(df, settings, want)
     except Exception as e:
         print(f"❌ Error calculating indicators for {df.iloc[-1].name if not df.empty else 'unknown'}: {e}")
         print("🔹 Last few rows of dataframe causing error:\n", df.tail())
@@ -351,11 +358,13 @@ def generate_signal_for_df(df, settings):
     pac_lower = last.get("pacL", None)
     pac_upper = last.get("pacU", None)
 
-    latest_day = df["datetime"].iloc[-1].date()
-    day_data = df[df["datetime"].dt.date == latest_day].copy()
-    day_high = day_data["high"].max() if not day_data.empty else last_price
-    day_low = day_data["low"].min() if not day_data.empty else last_price
-    volatility = ((day_high - day_low) / day_low) * 100 if day_low > 0 else 0
+    if levels is not None:
+        day_high = levels["day_high"]
+        day_low = levels["day_low"]
+        volatility = ((day_high - day_low) / day_low) * 100 if day_low > 0 else 0
+    else:
+        today = df["date"] == df["date"].iloc[-1]
+        volatility = float(last["day_volatility"])
 
     reasons, signal = [], None
 
@@ -364,21 +373,22 @@ def generate_signal_for_df(df, settings):
     # ============================================================
     try:
         skip_due_to_intraday_vol = False
-        intraday_df = day_data.copy(deep=True)
-        intraday_df["range_pct"] = ((intraday_df["high"] - intraday_df["low"]) / intraday_df["low"]) * 100
+        if levels is not None:
+            single_hit = (levels.get("max_range_pct") or 0) >= 1.3
+            two_hit = (levels.get("max_two_bar_pct") or 0) >= 2
+        else:
+            single_hit = (df["range_pct"][today] >= 1.3).any()
+            two_hit = (df["day_two_bar_move"][today] >= 2).any()
 
         # --- (1) Any single candle > 1.3% range ---
-        if (intraday_df["range_pct"] >= 1.3).any():
+        if single_hit:
             skip_due_to_intraday_vol = True
             reasons.append("⚠️ Intraday candle >1.3% range — skipping trade")
 
         # --- (2) Two consecutive candles combined > 2% move ---
-        if len(intraday_df) >= 2:
-            intraday_df["close_change_pct"] = intraday_df["close"].pct_change() * 100
-            intraday_df["two_candle_move"] = intraday_df["close_change_pct"].rolling(2).sum().abs()
-            if (intraday_df["two_candle_move"] >= 2).any():
-                skip_due_to_intraday_vol = True
-                reasons.append("⚠️ Two consecutive candles ≥2% combined move — skipping trade")
+        if two_hit:
+            skip_due_to_intraday_vol = True
+            reasons.append("⚠️ Two consecutive candles ≥2% combined move — skipping trade")
 
         if skip_due_to_intraday_vol:
             signal = None
@@ -408,8 +418,12 @@ def generate_signal_for_df(df, settings):
     # ============================================================
     # 🔹 Yesterday High/Low Filter
     # ============================================================
-    y_high = last.get("high_yest")
-    y_low = last.get("low_yest")
+    if levels is not None:
+        y_high = levels.get("prev_high")
+        y_low = levels.get("prev_low")
+    else:
+        y_high = last.get("high_yest")
+        y_low = last.get("low_yest")
 
     if signal == "BUY" and y_high is not None and last_price <= y_high:
         reasons.append(f"Price {last_price:.2f} ≤ Yesterday High {y_high:.2f}, skipping BUY")
@@ -423,25 +437,7 @@ def generate_signal_for_df(df, settings):
     # 🔹 Time-based volatility safeguard
     # ============================================================
     last_candle_time = pd.to_datetime(df["datetime"].iloc[-1]).time()
-    vol_threshold = 1.0
-    t = datetime.datetime.strptime
-
-    if t("09:15", "%H:%M").time() <= last_candle_time < t("09:20", "%H:%M").time():
-        vol_threshold = 1.60
-    elif t("09:20", "%H:%M").time() <= last_candle_time < t("10:00", "%H:%M").time():
-        vol_threshold = 1.80
-    elif t("10:00", "%H:%M").time() <= last_candle_time < t("11:00", "%H:%M").time():
-        vol_threshold = 2.00
-    elif t("11:00", "%H:%M").time() <= last_candle_time < t("12:00", "%H:%M").time():
-        vol_threshold = 2.20
-    elif t("12:00", "%H:%M").time() <= last_candle_time < t("13:00", "%H:%M").time():
-        vol_threshold = 2.40
-    elif t("13:00", "%H:%M").time() <= last_candle_time < t("14:00", "%H:%M").time():
-        vol_threshold = 2.80
-    elif t("14:00", "%H:%M").time() <= last_candle_time <= t("14:45", "%H:%M").time():
-        vol_threshold = 2.80
-    elif t("14:45", "%H:%M").time() <= last_candle_time <= t("15:25", "%H:%M").time():
-        vol_threshold = 2.60
+    vol_threshold = vol_threshold_at(last_candle_time)
 
     if volatility < vol_threshold:
         signal = "NEUTRAL"
@@ -450,27 +446,39 @@ def generate_signal_for_df(df, settings):
     # ============================================================
     # 🔹 Day Move Filter (from indicator)
     # ============================================================
-    day_move_pct = float(last.get("day_move_pct", 0) or 0)
+    if levels is not None:
+        day_open = levels["day_open"]
+        day_move_pct = (last_price - day_open) / day_open * 100
+        skip_day_move = abs(day_move_pct) > 1.5
+    else:
+        day_move_pct = float(last.get("day_move_pct", 0) or 0)
+        skip_day_move = bool(last.get("skip_due_to_day_move", False))
 
     # ✅ NaN protection
     if pd.isna(day_move_pct):
         day_move_pct = 0.0
 
     # ✅ Boolean cast to avoid "string True"/"NaN" issue
-    if bool(last.get("skip_due_to_day_move", False)):
+    if skip_day_move:
         signal = None
         reasons.append(f"⚠️ Price moved {day_move_pct:.2f}% from open (>1.5%), skipping trade")
 
     # ============================================================
     # 🔹 Gap Move Filter (from indicator)
     # ============================================================
-    gap_pct = float(last.get("gap_pct", 0) or 0)
+    if levels is not None:
+        prev_close = levels.get("prev_close")
+        gap_pct = ((levels["day_open"] - prev_close) / prev_close * 100) if prev_close and prev_close > 0 else 0.0
+        skip_gap = abs(gap_pct) > 1.0
+    else:
+        gap_pct = float(last.get("gap_pct", 0) or 0)
+        skip_gap = bool(last.get("skip_due_to_gap", False))
 
     # ✅ NaN protection
     if pd.isna(gap_pct):
         gap_pct = 0.0
 
-    if bool(last.get("skip_due_to_gap", False)):
+    if skip_gap:
         signal = None
         reasons.append(f"⚠️ Gap {gap_pct:.2f}% from yesterday close (>1.0%), skipping trade")
 
@@ -511,88 +519,82 @@ def generate_signal_for_df(df, settings):
 import datetime, pytz
 from typing import Tuple, Optional
 
-def get_dynamic_target_trail(volatility: float) -> Tuple[Optional[float], Optional[float], Optional[float], Optional[float]]:
+# (window start, window end, rows) — windows are inclusive and checked in order;
+# rows: (lo, hi, target_pct, trail_pct, min_sl_pct, max_sl_pct)
+DYNAMIC_TT_TABLES = [
+    (datetime.time(9, 20), datetime.time(9, 30), [
+        (1.61, 1.8, 1.0, 0.3, 0.3, 0.5),
+        (1.81, 2.0, 1.0, 0.4, 0.3, 0.5),
+        (2.01, 2.2, 1.3, 0.7, 0.3, 1.0),
+        (2.21, 2.4, 2.0, 0.9, 0.3, 1.1),
+        (2.41, 2.6, 2.3, 1.0, 0.3, 1.1),
+        (2.61, 2.8, 2.5, 1.0, 0.3, 1.1),
+        (2.81, 3.0, 3.0, 1.0, 0.3, 1.1),
+        (3.01, 999, 3.0, 1.0, 0.3, 1.1),
+    ]),
+    (datetime.time(9, 30), datetime.time(10, 0), [
+        (1.81, 2.0, 1.3, 0.4, 0.3, 0.7),
+        (2.01, 2.2, 1.5, 0.5, 0.3, 0.9),
+        (2.21, 2.4, 1.7, 0.6, 0.3, 1.0),
+        (2.41, 2.6, 2.0, 0.7, 0.3, 1.1),
+        (2.61, 2.8, 2.2, 0.8, 0.3, 1.1),
+        (2.81, 3.0, 2.5, 0.9, 0.3, 1.1),
+        (3.01, 3.2, 3.0, 1.0, 0.3, 1.1),
+        (3.21, 999, 3.5, 1.1, 0.3, 1.1),
+    ]),
+    (datetime.time(10, 0), datetime.time(11, 0), [
+        (2.01, 2.2, 1.0, 0.3, 0.3, 0.7),
+        (2.21, 2.4, 1.2, 0.4, 0.3, 0.8),
+        (2.41, 2.6, 1.5, 0.5, 0.3, 0.9),
+        (2.61, 2.8, 1.7, 0.7, 0.3, 1.0),
+        (2.81, 3.0, 2.0, 0.8, 0.3, 1.1),
+        (3.01, 3.2, 2.2, 0.9, 0.3, 1.1),
+        (3.21, 999, 2.5, 1.0, 0.3, 1.1),
+    ]),
+    (datetime.time(11, 0), datetime.time(12, 0), [
+        (2.21, 2.4, 0.75, 0.3, 0.3, 0.5),
+        (2.41, 2.6, 1.0, 0.4, 0.3, 0.6),
+        (2.61, 2.8, 1.2, 0.5, 0.3, 0.7),
+        (2.81, 3.0, 1.5, 0.6, 0.3, 0.7),
+        (3.01, 999, 1.7, 0.7, 0.3, 0.8),
+    ]),
+    (datetime.time(12, 0), datetime.time(13, 0), [
+        (2.41, 2.6, 0.75, 0.3, 0.3, 0.5),
+        (2.61, 2.8, 0.9, 0.3, 0.3, 0.6),
+        (2.81, 3.0, 1.0, 0.3, 0.3, 0.7),
+        (3.01, 999, 1.3, 0.3, 0.3, 0.7),
+    ]),
+    (datetime.time(13, 0), datetime.time(14, 0), [
+        (2.81, 3.0, 0.75, 0.3, 0.1, 0.5),
+        (3.01, 999, 1.0, 0.3, 0.1, 0.5),
+    ]),
+    (datetime.time(14, 0), datetime.time(14, 45), [
+        (2.81, 3.0, 0.75, 0.3, 0.1, 0.5),
+        (3.01, 999, 0.75, 0.3, 0.1, 0.5),
+    ]),
+]
+# after 14:45 / market close testing table (and any time outside the windows)
+DYNAMIC_TT_DEFAULT = [
+    (2.81, 3.0, 0.75, 0.3, 0.1, 0.3),
+    (3.01, 999, 1.0, 0.3, 0.1, 0.3),
+]
+
+
+def get_dynamic_target_trail(volatility: float, now=None) -> Tuple[Optional[float], Optional[float], Optional[float], Optional[float]]:
     """
     Return (target_pct, trail_pct, min_sl_pct, max_sl_pct) based on current time and volatility.
     volatility: in percent (e.g. 2.45)
+    now: IST time of day (default: current time) — the backtester passes bar times
     """
     volatility = round(float(volatility), 2)
-    now = datetime.datetime.now(pytz.timezone("Asia/Kolkata")).time()
-
-    def in_range(start, end):
-        return start <= now <= end
-
-    # Each row: (lo, hi, target_pct, trail_pct, min_sl_pct, max_sl_pct)
-    if in_range(datetime.time(9, 20), datetime.time(9, 30)):
-        table = [
-            (1.61, 1.8, 1.0, 0.3, 0.3, 0.5),
-            (1.81, 2.0, 1.0, 0.4, 0.3, 0.5),
-            (2.01, 2.2, 1.3, 0.7, 0.3, 1.0),
-            (2.21, 2.4, 2.0, 0.9, 0.3, 1.1),
-            (2.41, 2.6, 2.3, 1.0, 0.3, 1.1),
-            (2.61, 2.8, 2.5, 1.0, 0.3, 1.1),
-            (2.81, 3.0, 3.0, 1.0, 0.3, 1.1),
-            (3.01, 999, 3.0, 1.0, 0.3, 1.1),
-        ]
+    if now is None:
+        now = datetime.datetime.now(pytz.timezone("Asia/Kolkata")).time()
 
-    elif in_range(datetime.time(9, 30), datetime.time(10, 0)):
-        table = [
-            (1.81, 2.0, 1.3, 0.4, 0.3, 0.7),
-            (2.01, 2.2, 1.5, 0.5, 0.3, 0.9),
-            (2.21, 2.4, 1.7, 0.6, 0.3, 1.0),
-            (2.41, 2.6, 2.0, 0.7, 0.3, 1.1),
-            (2.61, 2.8, 2.2, 0.8, 0.3, 1.1),
-            (2.81, 3.0, 2.5, 0.9, 0.3, 1.1),
-            (3.01, 3.2, 3.0, 1.0, 0.3, 1.1),
-            (3.21, 999, 3.5, 1.1, 0.3, 1.1),
-        ]
-
-    elif in_range(datetime.time(10, 0), datetime.time(11, 0)):
-        table = [
-            (2.01, 2.2, 1.0, 0.3, 0.3, 0.7),
-            (2.21, 2.4, 1.2, 0.4, 0.3, 0.8),
-            (2.41, 2.6, 1.5, 0.5, 0.3, 0.9),
-            (2.61, 2.8, 1.7, 0.7, 0.3, 1.0),
-            (2.81, 3.0, 2.0, 0.8, 0.3, 1.1),
-            (3.01, 3.2, 2.2, 0.9, 0.3, 1.1),
-            (3.21, 999, 2.5, 1.0, 0.3, 1.1),
-        ]
-
-    elif in_range(datetime.time(11, 0), datetime.time(12, 0)):
-        table = [
-            (2.21, 2.4, 0.75, 0.3, 0.3, 0.5),
-            (2.41, 2.6, 1.0, 0.4, 0.3, 0.6),
-            (2.61, 2.8, 1.2, 0.5, 0.3, 0.7),
-            (2.81, 3.0, 1.5, 0.6, 0.3, 0.7),
-            (3.01, 999, 1.7, 0.7, 0.3, 0.8),
-        ]
-
-    elif in_range(datetime.time(12, 0), datetime.time(13, 0)):
-        table = [
-            (2.41, 2.6, 0.75, 0.3, 0.3, 0.5),
-            (2.61, 2.8, 0.9, 0.3, 0.3, 0.6),
-            (2.81, 3.0, 1.0, 0.3, 0.3, 0.7),
-            (3.01, 999, 1.3, 0.3, 0.3, 0.7),
-        ]
-
-    elif in_range(datetime.time(13, 0), datetime.time(14, 0)):
-        table = [
-            (2.81, 3.0, 0.75, 0.3, 0.1, 0.5),
-            (3.01, 999, 1.0, 0.3, 0.1, 0.5),
-        ]
-
-    elif in_range(datetime.time(14, 0), datetime.time(14, 45)):
-        table = [
-            (2.81, 3.0, 0.75, 0.3, 0.1, 0.5),
-            (3.01, 999, 0.75, 0.3, 0.1, 0.5),
-        ]
-
-    else:
-        # after 14:45 / market close testing table
-        table = [
-            (2.81, 3.0, 0.75, 0.3, 0.1, 0.3),
-            (3.01, 999, 1.0, 0.3, 0.1, 0.3),
-        ]
+    table = DYNAMIC_TT_DEFAULT
+    for start, end, rows in DYNAMIC_TT_TABLES:
+        if start <= now <= end:
+            table = rows
+            break
 
     for lo, hi, tgt, trail, min_sl_pct, max_sl_pct in table:
         if lo <= volatility <= hi:
@@ -724,64 +726,18 @@ def place_order_from_signal(ps_api, sig):
         print(f"❌ Exception placing BO for {symbol}: {e}")
         return [{"stat": "Exception", "emsg": str(e)}]
 
-# -----------------------
-# Per-symbol processing
-# -----------------------
-def process_symbol(ps_api, symbol_obj, interval, settings):
-    sym = symbol_obj.get("tsym")
-    exch = symbol_obj.get("exch", "NSE")
-
-    result = {"symbol": sym, "exch": exch, "status": "unknown"}
-
-    # ✅ ONLY use tick_engine data (single source of truth)
-    df = load_live_5min(sym)
-
-    if df is None or df.empty:
-        result.update({
-            "status": "no_live_data",
-            "emsg": "Tick data missing. Run tick_engine_worker.py"
-        })
-        return result
-
-    # Minimum 2 candles needed:
-    # 1 TPSeries historical + 1 running live candle
-    if len(df) < 2:
-        result.update({
-            "status": "not_enough_candles",
-            "emsg": f"Need at least 2 candles (TPSeries + Live). Found {len(df)}"
-        })
-        return result
-
-    # Normalize time & clean
-    df = tz_normalize_df(df)
-
-    if df.empty:
-        result.update({"status": "invalid_live_data"})
-        return result
-
-    # ✅ Indicators + signal (full strategy)
-    sig = generate_signal_for_df(df, settings)
-
-    if sig is None:
-        result.update({"status": "no_signal"})
-        return result
-
-    result.update(sig)
-    result.update({"status": "ok"})
-    return result
-
 # ============================================================
 #  🔥 INSERTED: FAST HTML ORDER ENTRY STRATEGY BLOCK
 # ============================================================
+ORDER_PANEL_COLUMNS = ["trm_signal", "macd", "macd_signal", "skip_due_to_gap",
+                       "skip_due_to_intraday_vol", "day_move_pct"]
+
+
 def run_strategy_request(ps_api, symbol, qty, side):
     """
     HTML order panel request → full strategy logic → filtered order
     """
-    from tkp_trm_chart import (
-        calc_tkp_trm, calc_pac, calc_macd, calc_atr_trails,
-        get_trm_settings_safe,
-        calc_gap_move_flag, calc_intraday_volatility_flag, calc_day_move_flag
-    )
+    from tkp_trm_chart import get_trm_settings_safe
     import pandas as pd
 
     exch = "NSE"
@@ -790,9 +746,11 @@ def run_strategy_request(ps_api, symbol, qty, side):
         return {"status": "error", "msg": "Symbol token not found"}
 
     # ------------------------------
-    # 1) Load TPSeries (last 3 days)
+    # 1) Load TPSeries (warm-up window of the active settings)
     # ------------------------------
-    df_raw = ps_api.fetch_full_tpseries(exch, token, interval="5", max_days=3)
+    settings = get_trm_settings_safe()
+    df_raw = ps_api.fetch_full_tpseries(exch, token, interval="5",
+                                        max_days=backfill_days(settings, interval=5))
     if df_raw is None or df_raw.empty:
         return {"status": "error", "msg": "No TPSeries data"}
 
@@ -801,16 +759,9 @@ def run_strategy_request(ps_api, symbol, qty, side):
     df = df.sort_values("datetime")
 
     # ------------------------------
-    # 2) Apply Indicators
+    # 2) Apply Indicators (same graph as the screener / chart)
     # ------------------------------
-    settings = get_trm_settings_safe()
-    df = calc_tkp_trm(df, settings)
-    df = calc_pac(df, settings)
-    df = calc_atr_trails(df, settings)
-    df = calc_macd(df, settings)
-    df = calc_gap_move_flag(df)
-    df = calc_day_move_flag(df)
-    df = calc_intraday_volatility_flag(df)
+    df = TRM_GRAPH.frame(df, settings, ORDER_PANEL_COLUMNS)
 
     last = df.iloc[-1]
 
@@ -922,7 +873,6 @@ def start_trailing_sl(ps_api, interval=5):
 # -----------------------
 import datetime  # <-- changed import to use datetime.datetime
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 import argparse
 
@@ -1032,7 +982,14 @@ def main(ps_api=None, args=None, settings=None, symbols=None, place_orders=False
     if hasattr(ps_api, "_tokens") and ps_api._tokens:
         print("🚀 Using backend-synced token map (from /init)")
         tokens_map = ps_api._tokens
-        symbols = list(tokens_map.keys())
+
+        # event-driven rescreen → only the requested symbols
+        if symbols:
+            wanted = {str(s).upper().strip() for s in symbols}
+            symbols = [s for s in tokens_map.keys() if str(s).upper().strip() in wanted]
+            print(f"🎯 Rescreen subset: {len(symbols)} of {len(tokens_map)} symbols")
+        else:
+            symbols = list(tokens_map.keys())
 
         symbols_with_tokens = []
         for sym in symbols:
@@ -1090,86 +1047,44 @@ def main(ps_api=None, args=None, settings=None, symbols=None, place_orders=False
 
         print(f"ℹ️ Symbols with valid tokens: {len(symbols_with_tokens)}")
 
-    results = []
-    all_order_responses = []
-
     start_time = time.time()
 
     # ============================
-    # Parallel Batch Processing 🚀
+    # Day-level pre-filter (whole universe, one vectorized pass)
     # ============================
-    MAX_WORKERS = 60  # process 60 stocks at a time
-    BATCH_SIZE = 60
-
-    def process_one(sym, ob_list_cache):
-        """Wrapper to process and optionally place order"""
-        try:
-            r = process_symbol(ps_api, sym, args.interval if args else "5", settings)
-
-            # --- Place order only if valid signal and allowed ---
-            if r.get("status") == "ok" and r.get("signal") in ["BUY", "SELL"] and getattr(args, 'place_orders', False):
-
-                # ✅ Backend-based skip flag (gap / day move / volatility)
-                if r.get("skip_due_to_gap", False):
-                    gap_pct = float(r.get("gap_pct", 0))
-                    print(f"⏸ Skipping {r['symbol']} due to {gap_pct:.2f}% gap (>1.0%)")
-                    all_order_responses.append({
-                        "symbol": r['symbol'],
-                        "response": {"stat": "Skipped", "emsg": f"Gap {gap_pct:.2f}% > 1.0%"}
-                    })
-                    return {"symbol": r['symbol'], "response": {"stat": "Skipped", "emsg": f"Gap {gap_pct:.2f}% > 1.0%"}}
-
-                # --- Skip if open order already exists (use cached order book) ---
-                open_orders = [
-                    o for o in ob_list_cache if isinstance(o, dict)
-                    and (o.get("trading_symbol") == r["symbol"] or o.get("tsym") == r["symbol"])
-                    and (o.get("status") in ["OPEN", "PENDING", "TRIGGER PENDING"])
-                ]
-                if open_orders:
-                    return {"symbol": r["symbol"], "response": {"stat": "Skipped", "emsg": "Open order exists"}}
-
-                # --- Place the order now ---
-                import requests
-
-                res = requests.post(
-                    "https://backend-stream-nmlf.onrender.com/place_order",
-                    json={
-                        "symbol": r["symbol"],
-                        "side": r["signal"],
-                        "qty": r.get("suggested_qty", 1)
-                    },
-                    timeout=5
-                )
-
-                order_resp = res.json()
-
-                return {"symbol": r["symbol"], "response": order_resp}
-
-            else:
-                return {"symbol": r.get("symbol"), "response": {"stat": "Skipped", "emsg": "No signal or disabled"}}
-
-        except Exception as e:
-            return {"symbol": sym.get("tsym"), "response": {"stat": "Error", "emsg": str(e)}}
-
-
-    # Run batches
-    for i in range(0, len(symbols_with_tokens), BATCH_SIZE):
-        batch = symbols_with_tokens[i:i + BATCH_SIZE]
-        print(f"\n⚡ Processing batch {i//BATCH_SIZE + 1} ({len(batch)} symbols)...")
-
-        # ✅ Fetch order book once per batch (cache)
-        ob_raw = ps_api.order_book()
-        ob_stat, ob_list = resp_to_status_and_list(ob_raw)
+    prefilter_stats = None
+    pruned_results = []
+    snap = load_snapshot()
+    if os.environ.get("SCREENER_PREFILTER", "1") != "0":
+        symbols_with_tokens, pruned_results, prefilter_stats = prefilter_symbols(symbols_with_tokens, snap)
+        print(f"🧹 Prefilter: {prefilter_stats['pruned']} of {prefilter_stats['universe']} pruned "
+              f"(vol={prefilter_stats['pruned_vol']}, day_move={prefilter_stats['pruned_day_move']}, "
+              f"gap={prefilter_stats['pruned_gap']}) → {prefilter_stats['survivors']} to compute")
 
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = [executor.submit(process_one, sym, ob_list) for sym in batch]
-            for future in as_completed(futures):
-                res = future.result()
-                results.append(res)
-                all_order_responses.append(res)
+    # ============================
+    # Staged pipeline 🚀 (load → compute → decide → route)
+    # ============================
+    from screener_pipeline import run_pipeline
+
+    # tick engine's daily levels → O(1) gap / day-move / YHL in the compute stage
+    levels_map = {
+        sym: {k: (None if pd.isna(v) else v) for k, v in row.items()}
+        for sym, row in snap.to_dict("index").items()
+    } if not snap.empty else None
+
+    results, metrics = run_pipeline(
+        ps_api, symbols_with_tokens, settings,
+        place_orders=getattr(args, 'place_orders', False),
+        levels_map=levels_map,
+        bars=required_bars(settings)     # warm-up window, planned once per run
+    )
+    results = pruned_results + results
+    metrics["prefilter"] = prefilter_stats
+    all_order_responses = list(results)
 
-        # small sleep to avoid API burst
-        time.sleep(0.005)
+    for st in metrics["stages"]:
+        print(f"📊 {st['stage']:<8} items={st['items']} busy={st['busy_secs']}s "
+              f"rate={st['items_per_sec']}/s qmax={st['queue_max']} errors={st['errors']}")
 
     total_time = round(time.time() - start_time, 2)
     print(f"\n✅ Batch completed for {len(symbols_with_tokens)} symbols in {total_time} sec")
@@ -1180,7 +1095,7 @@ def main(ps_api=None, args=None, settings=None, symbols=None, place_orders=False
     out_df.to_csv(out_file, index=False)
     print(f"💾 Saved results to {out_file}")
 
-    return {"results": results, "orders": all_order_responses}
+    return {"results": results, "orders": all_order_responses, "metrics": metrics}
 # -------------------------------------------------------
 # Alias for Auto Trader compatibility
 # -------------------------------------------------------
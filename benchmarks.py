@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+benchmarks.py
+Small performance checks for the screener / tick engine.
+
+Usage:
+  python benchmarks.py startup [--repeat 5] [--modules trm_core,tkp_trm_chart]
+  python benchmarks.py ema [--bars 5000] [--repeat 20]
+  python benchmarks.py backtest [--symbols 200] [--days 60]
+  python benchmarks.py optimize [--symbols 20] [--days 40] [--samples 24]
+  python benchmarks.py replay [--symbols 500] [--ticks 500000] [--batch-ms 20]
+  python benchmarks.py memory [--symbols 500] [--ticks-per-min 4]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# =========================
+# Worker startup (import time + RSS)
+# =========================
+# tkp_trm_chart = what headless workers used to import (Streamlit + Plotly)
+# trm_core      = compute core they import now
+STARTUP_MODULES = ["tkp_trm_chart", "trm_core", "batch_screener"]
+
+_STARTUP_PROBE = """
+import json, resource, sys, time
+t0 = time.perf_counter()
+import {module}
+dt = time.perf_counter() - t0
+mods = sorted(m for m in ("streamlit", "plotly") if m in sys.modules)
+print("@@" + json.dumps({{"secs": dt,
+                         "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                         "ui_modules": mods}}))
+"""
+
+
+def measure_import(module):
+    """Import `module` in a fresh interpreter → {secs, rss_mb, ui_modules}."""
+    proc = subprocess.run(
+        [sys.executable, "-c", _STARTUP_PROBE.format(module=module)],
+        cwd=BASE_DIR, capture_output=True, text=True
+    )
+    for line in proc.stdout.splitlines():
+        if line.startswith("@@"):
+            return json.loads(line[2:])
+    raise RuntimeError(f"import {module} failed: {proc.stderr.strip()[-500:]}")
+
+
+def bench_startup(args):
+    modules = args.modules.split(",") if args.modules else STARTUP_MODULES
+    print(f"{'module':<16} {'import s':>9} {'max RSS MB':>11}  ui modules loaded")
+    for module in modules:
+        runs = [measure_import(module) for _ in range(args.repeat)]
+        secs = statistics.median(r["secs"] for r in runs)
+        rss = statistics.median(r["rss_mb"] for r in runs)
+        ui = ",".join(runs[-1]["ui_modules"]) or "-"
+        print(f"{module:<16} {secs:>9.3f} {rss:>11.1f}  {ui}")
+
+
+# =========================
+# TRM EMAs: pandas calc_* chain vs fused kernel
+# =========================
+BENCH_SETTINGS = {
+    "long": 25, "short": 5, "signal": 14, "len_rsi": 5,
+    "rsiBuyLevel": 50, "rsiSellLevel": 50,
+    "buyColor": "#26a69a", "sellColor": "#ef5350", "neutralColor": "#808080",
+    "macd_fast": 12, "macd_slow": 26, "macd_signal": 9,
+    "pac_length": 34, "use_heikin_ashi": True,
+}
+
+
+def synthetic_ohlc(bars, seed=0):
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    c = 100 * np.exp(np.cumsum(rng.normal(0, 0.003, bars)))
+    o = np.r_[c[0], c[:-1]]
+    return pd.DataFrame({
+        "datetime": pd.date_range("2025-01-01 09:15", periods=bars, freq="5min"),
+        "open": o, "high": np.maximum(o, c) * 1.001, "low": np.minimum(o, c) * 0.999, "close": c,
+    })
+
+
+def _best_of(fn, repeat):
+    import time
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_ema(args):
+    import contextlib
+    import io
+    import numpy as np
+    import ema_kernel
+    import trm_core
+
+    df = synthetic_ohlc(args.bars)
+    s = BENCH_SETTINGS
+    arrays = [df[c].to_numpy() for c in ("open", "high", "low", "close")]
+
+    def pandas_chain():
+        with contextlib.redirect_stdout(io.StringIO()):
+            d = trm_core.calc_tkp_trm(df.copy(), s)
+        d = trm_core.calc_macd(d, s)
+        return trm_core.calc_pac(d, s)
+
+    ref = pandas_chain()
+    cases = [("pandas calc_* chain", pandas_chain),
+             ("trm_emas (pandas)", lambda: ema_kernel.trm_emas(*arrays, s, use_kernel=False))]
+    if ema_kernel.HAVE_NUMBA:
+        ema_kernel.trm_emas(*arrays, s, use_kernel=True)   # JIT warm-up
+        cases.append(("trm_emas (numba kernel)", lambda: ema_kernel.trm_emas(*arrays, s, use_kernel=True)))
+    else:
+        print("ℹ️ numba not installed → fused kernel benchmark skipped")
+
+    print(f"{args.bars} bars, best of {args.repeat}")
+    print(f"{'variant':<26} {'ms':>9} {'speedup':>8}  exact")
+    base = None
+    for name, fn in cases:
+        secs = _best_of(fn, args.repeat)
+        base = base or secs
+        out = fn()
+        if isinstance(out, dict):
+            exact = all(np.array_equal(out[k], ref[k].to_numpy(), equal_nan=True)
+                        for k in ema_kernel.OUTPUTS)
+        else:
+            exact = True
+        print(f"{name:<26} {secs * 1000:>9.3f} {base / secs:>7.1f}x  {'yes' if exact else 'NO'}")
+
+
+# =========================
+# Backtester throughput
+# =========================
+def synthetic_sessions(days, seed=0):
+    """5-min candles on `days` weekday sessions (09:15–15:25, IST naive)."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    starts = pd.bdate_range("2025-01-01", periods=days) + pd.Timedelta(hours=9, minutes=15)
+    t = (starts.values[:, None] + (np.arange(75) * np.timedelta64(5, "m"))[None, :]).ravel()
+    c = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, len(t))))
+    o = np.r_[c[0], c[:-1]]
+    return pd.DataFrame({
+        "datetime": pd.to_datetime(t), "open": o,
+        "high": np.maximum(o, c) * (1 + rng.uniform(0, 0.003, len(t))),
+        "low": np.minimum(o, c) * (1 - rng.uniform(0, 0.003, len(t))),
+        "close": c,
+    })
+
+
+def bench_backtest(args):
+    import contextlib
+    import io
+    import time
+    import backtester
+
+    s = dict(BENCH_SETTINGS, atr_fast_period=5, atr_fast_mult=0.5,
+             atr_slow_period=10, atr_slow_mult=3.0)
+    frames = {f"SYM{i}": synthetic_sessions(args.days, seed=i) for i in range(args.symbols)}
+    qty_map = {f"Q{i}": 1 for i in range(1, 21)}
+
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        trades, summary = backtester.run_backtest(frames, s, qty_map=qty_map)
+    secs = time.perf_counter() - t0
+    bars = sum(len(f) for f in frames.values())
+    print(f"{args.symbols} symbols x {args.days} sessions = {bars} bars")
+    print(f"backtest: {secs:.2f} s ({bars / secs:,.0f} bars/s), {summary['trades']} trades")
+
+
+# =========================
+# Parameter sweep: shared intermediates vs per-point recompute
+# =========================
+def bench_optimize(args):
+    import contextlib
+    import io
+    import time
+    import backtester
+    import trm_optimizer
+    from lookback_planner import required_bars
+
+    base = dict(BENCH_SETTINGS, atr_fast_period=5, atr_fast_mult=0.5,
+                atr_slow_period=10, atr_slow_mult=3.0)
+    frames = {f"SYM{i}": synthetic_sessions(args.days, seed=i) for i in range(args.symbols)}
+    qty_map = {f"Q{i}": 1 for i in range(1, 21)}
+    points = trm_optimizer.random_points(samples=args.samples, seed=0)
+    warmup = max(required_bars(dict(base, **p)) for p in points)
+
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        naive = [backtester.run_backtest(frames, dict(base, **p), qty_map=qty_map, warmup=warmup)[1]
+                 for p in points]
+    t_naive = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        ranking = trm_optimizer.optimize(frames, points, base, qty_map=qty_map,
+                                         min_trades=0, workers=args.workers)
+    t_sweep = time.perf_counter() - t0
+
+    by_params = {json.dumps(r["params"], sort_keys=True): r["summary"] for r in ranking}
+    exact = all(by_params[json.dumps(p, sort_keys=True)] == sm for p, sm in zip(points, naive))
+    print(f"{len(points)} settings x {args.symbols} symbols x {args.days} sessions")
+    print(f"{'per-point recompute':<22} {t_naive:>7.2f} s")
+    print(f"{'sweep (shared cache)':<22} {t_sweep:>7.2f} s  {t_naive / t_sweep:.1f}x  "
+          f"same results: {'yes' if exact else 'NO'}")
+
+
+# =========================
+# Tick replay: per-tick vs micro-batched candle updates
+# =========================
+def synthetic_ticks(symbols, ticks, rate, seed=0):
+    """
+    Tick stream (symbol index, price, volume, epoch) at `rate` ticks/s from
+    09:15 IST; activity ~ 1 / rank like a real watchlist (liquid names dominate).
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, symbols + 1)
+    sym = rng.choice(symbols, ticks, p=weights / weights.sum())
+    start = 1735702500                      # 2025-01-01 09:15 IST
+    ts = start + np.sort(rng.integers(0, max(1, ticks // rate), ticks))
+    walk = np.cumsum(rng.normal(0, 0.05, ticks))
+    price = np.round(100 + sym % 50 + walk - walk.mean(), 2)
+    volume = rng.integers(1, 500, ticks)
+    return sym.tolist(), price.tolist(), volume.tolist(), ts.tolist()
+
+
+def bench_replay(args):
+    import contextlib
+    import io
+    import time
+    from tick_aggregator import TickAggregator
+    from tick_batch import MicroBatcher
+    with contextlib.redirect_stdout(io.StringIO()):
+        from tick_engine_worker import CandleBuilder
+
+    sym, price, volume, ts = synthetic_ticks(args.symbols, args.ticks, args.rate)
+    names = [f"SYM{i}" for i in range(args.symbols)]
+    keys = [f"NSE|{i}" for i in range(args.symbols)]
+    ticks = list(zip(sym, price, volume, ts))
+    per_flush = max(1, int(args.rate * args.batch_ms / 1000))   # ticks arriving per flush
+
+    def per_tick_builder(update):
+        def run():
+            cb = CandleBuilder()
+            for s, p, v, t in ticks:
+                update(cb, names[s], t, p, v)
+            return cb
+        return run
+
+    def batched_builder():
+        cb = CandleBuilder()
+        mb = MicroBatcher(cb.update_batch, registry=cb.symbols)
+        for n, (s, p, v, t) in enumerate(ticks, 1):
+            mb.put(names[s], p, v, t)
+            if n % per_flush == 0:
+                mb.flush()
+        mb.flush()
+        return cb
+
+    def builder_state(cb):
+        return {sym: list(bars) for sym, bars in zip(cb.symbols.keys, cb.bars)}
+
+    def per_tick_aggregator():
+        agg = TickAggregator()
+        for s, p, v, t in ticks:
+            agg.add(keys[s], t, p, v)
+        return agg
+
+    def batched_aggregator():
+        agg = TickAggregator()
+        mb = MicroBatcher(agg.add_batch, registry=agg.tokens)
+        for n, (s, p, v, t) in enumerate(ticks, 1):
+            mb.put(keys[s], p, v, t)
+            if n % per_flush == 0:
+                mb.flush()
+        mb.flush()
+        return agg
+
+    def agg_state(agg):
+        running = {agg.tokens.key_of(i): runs for i, runs in enumerate(agg.running)}
+        return {k: list(r) for k, r in agg.closed.items()}, running
+
+    def update_tick(cb, sym_, t, p, v):
+        with contextlib.redirect_stdout(io.StringIO()):     # its two log lines per tick
+            cb.update_tick(sym_, p, v, t)
+
+    def update_bar(cb, sym_, t, p, v):
+        cb.update_bar(sym_, t, p, p, p, p, v)
+
+    print(f"{args.ticks} ticks, {args.symbols} symbols, {args.rate} ticks/s "
+          f"→ {per_flush} ticks per {args.batch_ms:.0f} ms flush")
+    print(f"{'variant':<32} {'s':>7} {'ticks/s':>11}  speedup  same candles")
+    groups = [
+        [("CandleBuilder.update_tick (5m)", per_tick_builder(update_tick), builder_state),
+         ("CandleBuilder.update_bar (5m)", per_tick_builder(update_bar), builder_state),
+         ("  micro-batched", batched_builder, builder_state)],
+        [("TickAggregator.add (6 tf)", per_tick_aggregator, agg_state),
+         ("  micro-batched", batched_aggregator, agg_state)],
+    ]
+    for cases in groups:
+        base = ref = None
+        for name, fn, state in cases:
+            t0 = time.perf_counter()
+            out = state(fn())
+            secs = time.perf_counter() - t0
+            base = base or secs
+            ref = ref if ref is not None else out
+            print(f"{name:<32} {secs:>7.2f} {args.ticks / secs:>11,.0f} {base / secs:>7.1f}x  "
+                  f"{'yes' if out == ref else 'NO'}")
+
+
+# =========================
+# Memory: compact records vs per-object dicts (full session)
+# =========================
+def _retained(build):
+    """→ (result, bytes allocated by build() and still alive afterwards)."""
+    import gc
+    import tracemalloc
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    out = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return out, size
+
+
+def bench_memory(args):
+    import contextlib
+    import io
+    import json
+    import time
+    from collections import deque
+    from datetime import datetime
+    from market_records import Tick
+    from tick_aggregator import TickAggregator
+    from ws_shards import parse_tick
+    with contextlib.redirect_stdout(io.StringIO()):
+        from tick_engine_worker import IST, CandleBuilder
+
+    minutes = 375                                    # 09:15–15:30
+    n_ticks = args.symbols * minutes * args.ticks_per_min
+    sym, price, volume, ts = synthetic_ticks(args.symbols, n_ticks, n_ticks // (minutes * 60) or 1)
+    names = [f"SYM{i}" for i in range(args.symbols)]
+    keys = [f"NSE|{i}" for i in range(args.symbols)]
+
+    # --- tick records: decoded WS dict vs Tick ---
+    sample = min(n_ticks, 100_000)
+    msgs = [json.dumps({"t": "tf", "e": "NSE", "tk": str(sym[i]), "lp": f"{price[i]:.2f}",
+                        "v": str(volume[i]), "ft": str(ts[i])}) for i in range(sample)]
+    dicts, d_size = _retained(lambda: [json.loads(m) for m in msgs])
+    recs, r_size = _retained(lambda: [parse_tick(d) for d in dicts])
+    assert all(isinstance(r, Tick) for r in recs)
+    del dicts, recs
+
+    # --- candle stores after a full session ---
+    def day_builder():
+        cb = CandleBuilder(max_bars=minutes // 5)
+        for s, p, v, t in zip(sym, price, volume, ts):
+            cb.update_bar(names[s], t, p, p, p, p, v)
+        return cb
+
+    def day_aggregator():
+        agg = TickAggregator(max_candles=minutes)
+        for s, p, v, t in zip(sym, price, volume, ts):
+            agg.add(keys[s], t, p, v)
+        return agg
+
+    t0 = time.perf_counter()
+    cb, cb_size = _retained(day_builder)
+    agg, agg_size = _retained(day_aggregator)
+    secs = time.perf_counter() - t0
+
+    # same content in the dict layouts the stores used before
+    def dict_builder():
+        out = {}
+        for symbol, bars in zip(cb.symbols.keys, cb.bars):
+            for c in bars:
+                dt = datetime.fromtimestamp(c.time, tz=IST)
+                out[(symbol, dt)] = c.as_dict("datetime", dt)
+        return out
+
+    def dict_aggregator():
+        closed = {k: deque((c.as_dict() for c in ring), maxlen=minutes) for k, ring in agg.closed.items()}
+        running = {agg.tokens.key_of(i): [[c.time, c.open, c.high, c.low, c.close, c.volume]
+                                          for c in runs if c is not None]
+                   for i, runs in enumerate(agg.running)}
+        return closed, running
+
+    _, cb_dict = _retained(dict_builder)
+    _, agg_dict = _retained(dict_aggregator)
+    n_bars = sum(len(b) for b in cb.bars)
+    n_agg = sum(len(r) for r in agg.closed.values())
+
+    mb = 1024 * 1024
+    print(f"{args.symbols} symbols x {minutes} min x {args.ticks_per_min} ticks/min = "
+          f"{n_ticks:,} ticks (replayed in {secs:.1f}s)")
+    print(f"{'store':<34} {'dicts MB':>9} {'records MB':>11} {'B/item':>12}  saving")
+    rows = [
+        (f"ticks ({sample:,} decoded)", d_size, r_size, sample),
+        (f"CandleBuilder 5m ({n_bars:,} bars)", cb_dict, cb_size, n_bars),
+        (f"TickAggregator 6 tf ({n_agg:,} bars)", agg_dict, agg_size, n_agg),
+    ]
+    for name, old, new, n in rows:
+        print(f"{name:<34} {old / mb:>9.1f} {new / mb:>11.1f} {old // max(n, 1):>5} → {new // max(n, 1):<5} "
+              f"{1 - new / old:>6.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stock dashboard benchmarks")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("startup", help="import time + RSS of worker modules")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--modules", default="", help="comma separated module names")
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("ema", help="TRM/MACD/PAC EMAs: pandas chain vs fused kernel")
+    p.add_argument("--bars", type=int, default=5000)
+    p.add_argument("--repeat", type=int, default=20)
+    p.set_defaults(func=bench_ema)
+
+    p = sub.add_parser("backtest", help="vectorized backtest throughput (synthetic data)")
+    p.add_argument("--symbols", type=int, default=200)
+    p.add_argument("--days", type=int, default=60)
+    p.set_defaults(func=bench_backtest)
+
+    p = sub.add_parser("optimize", help="TRM parameter sweep with shared intermediates")
+    p.add_argument("--symbols", type=int, default=20)
+    p.add_argument("--days", type=int, default=40)
+    p.add_argument("--samples", type=int, default=24)
+    p.add_argument("--workers", type=int, default=0, help="processes (default: all cores)")
+    p.set_defaults(func=bench_optimize)
+
+    p = sub.add_parser("replay", help="tick replay: per-tick vs micro-batched candle updates")
+    p.add_argument("--symbols", type=int, default=500)
+    p.add_argument("--ticks", type=int, default=500000)
+    p.add_argument("--rate", type=int, default=5000, help="replayed ticks per second")
+    p.add_argument("--batch-ms", type=float, default=20)
+    p.set_defaults(func=bench_replay)
+
+    p = sub.add_parser("memory", help="full-session memory: compact records vs dicts")
+    p.add_argument("--symbols", type=int, default=500)
+    p.add_argument("--ticks-per-min", type=int, default=4, help="ticks per symbol and minute")
+    p.set_defaults(func=bench_memory)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+# candle_resampler.py
+"""
+1-minute history store + local resampling to any chart interval.
+
+- 1-minute TPSeries is fetched ONCE per symbol and cached
+- higher intervals (3/5/10/15/30/60/120/240) are derived locally with
+  session-aligned buckets anchored at 09:15 IST (so 60m = 09:15, 10:15, ...)
+- new 1-minute bars are folded in incrementally: only the last (open)
+  bucket of every derived interval is rebuilt
+
+Switching chart intervals therefore costs no broker calls.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from prostocks_connector import tpseries_to_df
+
+SESSION_ANCHOR_MIN = 9 * 60 + 15   # 09:15
+OHLCV_COLS = ["open", "high", "low", "close", "volume"]
+
+
+# =========================
+# Session-aligned resampling
+# =========================
+def session_buckets(dt, interval):
+    """Bucket start for every timestamp, aligned to the 09:15 session open."""
+    interval = int(interval)
+    day = dt.dt.normalize()
+    minutes = (dt - day) // pd.Timedelta(minutes=1) - SESSION_ANCHOR_MIN
+    bucket = (minutes // interval) * interval + SESSION_ANCHOR_MIN
+    return day + pd.to_timedelta(bucket, unit="min")
+
+
+def resample_session_aligned(df, interval):
+    """
+    Aggregate 1-minute OHLCV candles (datetime column) into `interval`-minute
+    candles with buckets anchored at 09:15 of each day.
+    """
+    interval = int(interval)
+    if df is None or df.empty:
+        return pd.DataFrame(columns=["datetime"] + OHLCV_COLS)
+    if interval <= 1:
+        return df.reset_index(drop=True)
+
+    agg = {"open": "first", "high": "max", "low": "min", "close": "last"}
+    if "volume" in df.columns:
+        agg["volume"] = "sum"
+
+    out = (
+        df.groupby(session_buckets(df["datetime"], interval), sort=True)
+          .agg(agg)
+    )
+    out.index.name = "datetime"
+    return out.reset_index()
+
+
+def normalize_minute_frame(df):
+    """Numeric OHLCV + sorted, de-duplicated datetime (last bar wins)."""
+    if df is None or df.empty or "datetime" not in df.columns:
+        return pd.DataFrame(columns=["datetime"] + OHLCV_COLS)
+
+    df = df[[c for c in ["datetime"] + OHLCV_COLS if c in df.columns]].copy()
+    for col in OHLCV_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    df = df.dropna(subset=["datetime", "open", "high", "low", "close"])
+    df = df.drop_duplicates(subset="datetime", keep="last").sort_values("datetime")
+    return df.reset_index(drop=True)
+
+
+# =========================
+# Per-symbol 1-minute store
+# =========================
+class MinuteBarStore:
+    """
+    Cache of 1-minute bars per (exch, token) with incrementally maintained
+    derived intervals.
+
+    store = MinuteBarStore(max_days=5)
+    df_15 = store.bars(ps_api, "NSE", "3045", 15)   # first call fetches 1m
+    df_5  = store.bars(ps_api, "NSE", "3045", 5)    # no broker call
+    """
+
+    def __init__(self, max_days=5, refresh_secs=60):
+        self.max_days = max_days
+        self.refresh_secs = refresh_secs
+        self._minutes = {}      # key -> 1m DataFrame
+        self._derived = {}      # (key, interval) -> DataFrame
+        self._refreshed = {}    # key -> epoch of last broker call
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(exch, token):
+        return f"{exch}|{token}"
+
+    # ---------- broker side ----------
+    def load(self, ps_api, exch, token, force=False):
+        """Full 1-minute history, fetched only once per symbol."""
+        key = self._key(exch, token)
+        with self._lock:
+            if key in self._minutes and not force:
+                return self._minutes[key]
+
+        df = ps_api.fetch_full_tpseries(exch, token, interval="1", max_days=self.max_days)
+        df = normalize_minute_frame(df)
+
+        with self._lock:
+            self._minutes[key] = df
+            self._refreshed[key] = time.time()
+            for k in [k for k in self._derived if k[0] == key]:
+                del self._derived[k]
+        return df
+
+    def refresh(self, ps_api, exch, token):
+        """Fetch only the 1-minute bars after the last cached one."""
+        key = self._key(exch, token)
+        with self._lock:
+            df = self._minutes.get(key)
+        if df is None or df.empty:
+            return self.load(ps_api, exch, token, force=True)
+
+        # TPSeries times are IST wall-clock → convert to epoch via +05:30
+        last = df["datetime"].iloc[-1].to_pydatetime().replace(tzinfo=None)
+        st = int((last - timedelta(hours=5, minutes=30)).replace(tzinfo=timezone.utc).timestamp())
+        et = int(datetime.now(timezone.utc).timestamp())
+
+        resp = ps_api.get_tpseries(exch, token, "1", st, et)
+        with self._lock:
+            self._refreshed[key] = time.time()
+        if isinstance(resp, list) and resp:
+            self.append(exch, token, tpseries_to_df(resp))
+        return self._minutes.get(key)
+
+    def bars(self, ps_api, exch, token, interval):
+        """Candles at `interval` minutes, derived locally from the 1m cache."""
+        key = self._key(exch, token)
+        with self._lock:
+            cached = key in self._minutes
+            stale = (
+                self.refresh_secs is not None
+                and time.time() - self._refreshed.get(key, 0) > self.refresh_secs
+            )
+
+        if not cached:
+            self.load(ps_api, exch, token)
+        elif stale:
+            try:
+                self.refresh(ps_api, exch, token)
+            except Exception as e:
+                print(f"⚠️ 1m refresh failed for {key}: {e}")
+
+        return self.get(exch, token, interval)
+
+    # ---------- local side ----------
+    def get(self, exch, token, interval):
+        """Derived candles from what is cached (never calls the broker)."""
+        key = self._key(exch, token)
+        interval = int(interval)
+        with self._lock:
+            df_1m = self._minutes.get(key)
+            if df_1m is None:
+                return pd.DataFrame(columns=["datetime"] + OHLCV_COLS)
+            if interval <= 1:
+                return df_1m
+
+            dkey = (key, interval)
+            if dkey not in self._derived:
+                self._derived[dkey] = resample_session_aligned(df_1m, interval)
+            return self._derived[dkey]
+
+    def append(self, exch, token, df_new):
+        """
+        Merge new/updated 1-minute bars and refresh derived intervals from
+        the first affected bucket onward.
+        """
+        key = self._key(exch, token)
+        df_new = normalize_minute_frame(df_new)
+        if df_new.empty:
+            return
+
+        with self._lock:
+            df_old = self._minutes.get(key)
+            first_new = df_new["datetime"].iloc[0]
+
+            if df_old is None or df_old.empty:
+                merged = df_new
+            else:
+                keep_old = df_old[df_old["datetime"] < first_new]
+                tail_old = df_old[df_old["datetime"] >= first_new]
+                merged = normalize_minute_frame(pd.concat([tail_old, df_new], ignore_index=True))
+                merged = pd.concat([keep_old, merged], ignore_index=True)
+
+            self._minutes[key] = merged
+
+            for (dk, interval), derived in list(self._derived.items()):
+                if dk != key:
+                    continue
+                bucket_start = session_buckets(pd.Series([first_new]), interval).iloc[0]
+                fresh = resample_session_aligned(
+                    merged[merged["datetime"] >= bucket_start], interval
+                )
+                self._derived[(dk, interval)] = pd.concat(
+                    [derived[derived["datetime"] < bucket_start], fresh],
+                    ignore_index=True
+                )
+
+    def drop(self, exch, token):
+        key = self._key(exch, token)
+        with self._lock:
+            self._minutes.pop(key, None)
+            self._refreshed.pop(key, None)
+            for k in [k for k in self._derived if k[0] == key]:
+                del self._derived[k]
@@ -0,0 +1,87 @@
+# config_cache.py
+"""
+mtime-invalidated cache for the small JSON config files
+(trm_settings.json, qty_map.json, dashboard_settings.json).
+
+load_json(path) parses a file once and afterwards only stats it — at most
+once per STAT_INTERVAL_SECS — re-reading when mtime or size changed.
+Callers get a deep copy, so mutating the result never leaks into the cache.
+save_* helpers call invalidate(path) so their own writes are seen at once;
+writes from other processes are picked up within STAT_INTERVAL_SECS.
+"""
+import copy
+import json
+import os
+import threading
+import time
+
+STAT_INTERVAL_SECS = 1.0
+
+_MISSING = object()
+
+
+class ConfigCache:
+    def __init__(self, stat_interval=STAT_INTERVAL_SECS):
+        self.stat_interval = stat_interval
+        self._entries = {}      # path → {"sig", "value", "checked"}
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.stats_calls = 0
+
+    def _signature(self, path):
+        self.stats_calls += 1
+        st = os.stat(path)      # FileNotFoundError propagates
+        return st.st_mtime_ns, st.st_size
+
+    def load_json(self, path):
+        """Parsed JSON of `path` (deep copy). Raises like open()/json.load()."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or now - entry["checked"] >= self.stat_interval:
+                entry = self._refresh(path, entry, now)
+            if entry["value"] is _MISSING:
+                raise FileNotFoundError(path)
+            return copy.deepcopy(entry["value"])
+
+    def _refresh(self, path, entry, now):
+        try:
+            sig = self._signature(path)
+        except FileNotFoundError:
+            sig = None
+
+        if entry is not None and entry["sig"] == sig:
+            entry["checked"] = now
+            return entry
+
+        if sig is None:
+            value = _MISSING    # remember absence too (no stat storm)
+        else:
+            with open(path, "r") as f:
+                value = json.load(f)
+            self.reads += 1
+        entry = {"sig": sig, "value": value, "checked": now}
+        self._entries[path] = entry
+        return entry
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+
+_cache = ConfigCache()
+
+
+def load_json(path):
+    return _cache.load_json(path)
+
+
+def invalidate(path=None):
+    _cache.invalidate(path)
+
+
+def cache_stats():
+    return {"files": len(_cache._entries), "reads": _cache.reads, "stats": _cache.stats_calls}
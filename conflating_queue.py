@@ -0,0 +1,105 @@
+# conflating_queue.py
+"""
+Bounded tick queue with per-token conflation ("latest value wins").
+
+A plain queue.Queue between the WS thread and a slow (or missing)
+consumer grows without limit, and the consumer falls further behind with
+every tick. ConflatingTickQueue keeps the queue.Queue interface the
+consumers already use (put / put_nowait / get / get_nowait / qsize /
+empty, queue.Empty) but:
+
+  - conflates: an item whose key(item) is already queued replaces the
+    queued value in place (same FIFO position), so at most one pending
+    tick per token is ever held
+  - is bounded: put never blocks; when maxsize is reached the oldest
+    tick is dropped (unkeyed control messages only when no tick is left)
+  - counts: stats() → put / conflated / dropped / size / high_water
+
+Items with key(item) None (status messages, DataFrames, …) are never
+conflated. conflate=False keeps only the bound (drop-oldest), for
+consumers that need every tick (e.g. the dashboard's live candle
+high / low).
+"""
+import itertools
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+TICK_QUEUE_MAX = int(os.environ.get("TICK_QUEUE_MAX", 10000))
+
+
+def tick_key(tick):
+    """Raw WS tick dict → "EXCH|TOKEN" (None for non-tick messages)."""
+    if not isinstance(tick, dict) or not tick.get("tk"):
+        return None
+    return f"{tick.get('e') or 'NSE'}|{tick['tk']}"
+
+
+class _Unkeyed(tuple):
+    """Private slot key of a never-conflated item."""
+
+
+class ConflatingTickQueue:
+    """
+    q = ConflatingTickQueue(maxsize=5000, key=tick_key)
+    q.put(tick)                # never blocks
+    q.get_nowait()             # oldest slot, latest value of its token
+    """
+
+    def __init__(self, maxsize=TICK_QUEUE_MAX, key=tick_key, conflate=True):
+        self.maxsize = maxsize
+        self.key = key if conflate else (lambda item: None)
+        self._items = OrderedDict()
+        self._seq = itertools.count()
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = {"put": 0, "conflated": 0, "dropped": 0, "high_water": 0}
+
+    # ---------- producer ----------
+    def put(self, item, block=True, timeout=None):
+        k = self.key(item)
+        with self._cond:
+            st = self._stats
+            st["put"] += 1
+            if k is not None and k in self._items:
+                self._items[k] = item
+                st["conflated"] += 1
+                return
+            if self.maxsize > 0 and len(self._items) >= self.maxsize:
+                self._evict()
+            self._items[k if k is not None else _Unkeyed(("#", next(self._seq)))] = item
+            st["high_water"] = max(st["high_water"], len(self._items))
+            self._cond.notify()
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+    def _evict(self):
+        victim = next((k for k in self._items if not isinstance(k, _Unkeyed)), None)
+        if victim is None:
+            self._items.popitem(last=False)
+        else:
+            del self._items[victim]
+        self._stats["dropped"] += 1
+
+    # ---------- consumer ----------
+    def get(self, block=True, timeout=None):
+        with self._cond:
+            if block and not self._items:
+                self._cond.wait_for(lambda: self._items, timeout)
+            if not self._items:
+                raise queue.Empty
+            return self._items.popitem(last=False)[1]
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def qsize(self):
+        return len(self._items)
+
+    def empty(self):
+        return not self._items
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, size=len(self._items))
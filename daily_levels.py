@@ -0,0 +1,222 @@
+# daily_levels.py
+"""
+Per-symbol daily reference levels, kept incrementally.
+
+For every symbol:
+  prev_day / prev_high / prev_low / prev_close   (yesterday H/L/C)
+  day / day_open / day_high / day_low / last      (today so far)
+  max_range_pct / max_two_bar_pct                 (intraday bar checks)
+
+The table is seeded once from history (one date split per symbol) and then
+advanced bar by bar: a running candle update or a new candle is O(1), a
+new date rolls today into yesterday. Gap, day-move and YHL filters read
+the levels directly instead of grouping the full history by date.
+"""
+import threading
+
+import pandas as pd
+
+
+class _Levels:
+    """Mutable state of one symbol (internal)."""
+
+    __slots__ = (
+        "day", "day_open", "day_high", "day_low", "last", "bar_ts", "last_minute",
+        "prev_day", "prev_high", "prev_low", "prev_close",
+        "bar_count", "prev_bar_close", "prev_bar_pct", "cur_pct",
+        "closed_max_range", "closed_max_two_bar", "cur_range", "cur_two_bar",
+        "cur_high", "cur_low",
+    )
+
+    def __init__(self):
+        for k in self.__slots__:
+            setattr(self, k, None)
+
+    def start_day(self, day):
+        if self.day is not None:
+            self.prev_day = self.day
+            self.prev_high = self.day_high
+            self.prev_low = self.day_low
+            self.prev_close = self.last
+        self.day = day
+        self.day_open = self.day_high = self.day_low = self.last = None
+        self.bar_ts = None
+        self.bar_count = 0
+        self.prev_bar_close = self.prev_bar_pct = self.cur_pct = None
+        self.closed_max_range = self.closed_max_two_bar = None
+        self.cur_range = self.cur_two_bar = None
+        self.cur_high = self.cur_low = None
+
+    def close_bar(self):
+        """Fold the running bar into the closed-bar maxima."""
+        if self.cur_range is not None:
+            self.closed_max_range = _nanmax(self.closed_max_range, self.cur_range)
+        if self.cur_two_bar is not None:
+            self.closed_max_two_bar = _nanmax(self.closed_max_two_bar, self.cur_two_bar)
+        self.prev_bar_pct = self.cur_pct
+        self.prev_bar_close = self.last
+
+    def apply(self, ts, o, h, l, c):
+        """New bar (ts > bar_ts) or update of the running bar (ts == bar_ts)."""
+        if self.bar_ts is None or ts > self.bar_ts:
+            if self.bar_ts is not None:
+                self.close_bar()
+            self.bar_ts = ts
+            self.bar_count += 1
+            if self.day_open is None:
+                self.day_open = o
+            self.cur_high, self.cur_low = h, l
+        else:
+            self.cur_high = max(self.cur_high, h)
+            self.cur_low = min(self.cur_low, l)
+
+        self.day_high = h if self.day_high is None else max(self.day_high, h)
+        self.day_low = l if self.day_low is None else min(self.day_low, l)
+        self.last = c
+
+        # same formulas as the pandas day filters (pct_change → rolling(2).sum)
+        self.cur_range = (self.cur_high - self.cur_low) / self.cur_low * 100
+        self.cur_pct = (
+            (c - self.prev_bar_close) / self.prev_bar_close * 100
+            if self.prev_bar_close is not None else None
+        )
+        self.cur_two_bar = (
+            abs(self.prev_bar_pct + self.cur_pct)
+            if self.prev_bar_pct is not None and self.cur_pct is not None else None
+        )
+
+    def as_dict(self):
+        return {
+            "day": str(self.day),
+            "day_open": self.day_open,
+            "day_high": self.day_high,
+            "day_low": self.day_low,
+            "prev_day": str(self.prev_day) if self.prev_day is not None else None,
+            "prev_high": self.prev_high,
+            "prev_low": self.prev_low,
+            "prev_close": self.prev_close,
+            "last": self.last,
+            "bar_ts": self.bar_ts,
+            "last_minute": self.last_minute,
+            "max_range_pct": _nanmax(self.closed_max_range, self.cur_range),
+            "max_two_bar_pct": _nanmax(self.closed_max_two_bar, self.cur_two_bar) or 0.0,
+        }
+
+
+def _nanmax(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
+
+
+class DailyLevelsTable:
+    """
+    levels = DailyLevelsTable()
+    levels.sync("SBIN", df)            # seeds once, then only new/updated bars
+    levels.update_bar("SBIN", bar)     # single candle dict
+    levels.get("SBIN")["prev_close"]
+    """
+
+    def __init__(self):
+        self._levels = {}
+        self._lock = threading.Lock()
+
+    # ---------- writers ----------
+    def seed(self, symbol, df):
+        """(Re)build a symbol's levels from its candle history."""
+        lv = _Levels()
+        df = df.dropna(subset=["datetime", "open", "high", "low", "close"])
+        if not df.empty:
+            dates = df["datetime"].dt.date
+            today = dates.iloc[-1]
+            prev = df[dates < today]
+            if not prev.empty:
+                prev_day = dates[dates < today].iloc[-1]
+                y = prev[dates[dates < today] == prev_day]
+                lv.prev_day = prev_day
+                lv.prev_high = float(y["high"].max())
+                lv.prev_low = float(y["low"].min())
+                lv.prev_close = float(y["close"].iloc[-1])
+            lv.start_day(today)
+            for row in df[dates == today].itertuples(index=False):
+                self._apply_row(lv, row.datetime, row.open, row.high, row.low, row.close)
+
+        with self._lock:
+            self._levels[symbol] = lv
+        return lv
+
+    @staticmethod
+    def _apply_row(lv, dt, o, h, l, c):
+        dt = pd.Timestamp(dt)
+        day = dt.date()
+        if lv.day is None or day > lv.day:
+            lv.start_day(day)
+        elif day < lv.day:
+            return   # stale bar from an older session
+        lv.apply(dt.value // 10**9, float(o), float(h), float(l), float(c))
+        lv.last_minute = dt.hour * 60 + dt.minute + dt.second / 60
+
+    def update_bar(self, symbol, bar):
+        """Apply one candle dict (datetime/open/high/low/close)."""
+        with self._lock:
+            lv = self._levels.get(symbol)
+            if lv is None:
+                lv = self._levels[symbol] = _Levels()
+            self._apply_row(lv, bar["datetime"], bar["open"], bar["high"], bar["low"], bar["close"])
+
+    def sync(self, symbol, df):
+        """Seed on first sight, afterwards apply only bars at/after the last known one."""
+        with self._lock:
+            lv = self._levels.get(symbol)
+        if lv is None or lv.bar_ts is None:
+            return self.seed(symbol, df)
+        if df.empty:
+            return lv
+
+        ts = df["datetime"]
+        epoch = ts.map(lambda x: pd.Timestamp(x).value // 10**9) if ts.dtype == object else \
+            ts.astype("int64") // 10**9
+        start = int(epoch.searchsorted(lv.bar_ts, side="left"))
+        with self._lock:
+            for row in df.iloc[start:].itertuples(index=False):
+                if pd.isna(row.open) or pd.isna(row.close):
+                    continue
+                self._apply_row(lv, row.datetime, row.open, row.high, row.low, row.close)
+        return lv
+
+    def drop(self, symbol):
+        with self._lock:
+            self._levels.pop(symbol, None)
+
+    # ---------- readers ----------
+    def get(self, symbol):
+        """Levels dict of one symbol (None if unknown)."""
+        with self._lock:
+            lv = self._levels.get(symbol)
+            return lv.as_dict() if lv is not None and lv.bar_ts is not None else None
+
+    def snapshot(self):
+        """{symbol: levels dict} for every seeded symbol."""
+        with self._lock:
+            return {s: lv.as_dict() for s, lv in self._levels.items() if lv.bar_ts is not None}
+
+
+def levels_from_frame(df):
+    """One-off levels dict for a candle frame (no table needed)."""
+    table = DailyLevelsTable()
+    table.seed("_", df)
+    return table.get("_")
+
+
+def levels_match(levels, df):
+    """True if `levels` describe exactly the last bar of candle frame `df`."""
+    if not levels or df is None or df.empty:
+        return False
+    last_dt = pd.Timestamp(df["datetime"].iloc[-1])
+    return (
+        levels.get("bar_ts") == last_dt.value // 10**9
+        and levels.get("day") == str(last_dt.date())
+        and levels.get("last") == float(df["close"].iloc[-1])
+    )
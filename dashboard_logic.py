@@ -7,22 +7,25 @@ import json
 import time
 import threading
 import pandas as pd
-import streamlit as st
 from datetime import datetime, time
 from dotenv import load_dotenv
 
+import config_cache
+
 SETTINGS_FILE = "dashboard_settings.json"
 QTY_MAP_FILE = "qty_map.json"
 
 # === Load general dashboard settings (auto buy/sell, timings etc.)
 def load_settings():
-    if os.path.exists(SETTINGS_FILE):
-        with open(SETTINGS_FILE, "r") as f:
-            data = json.load(f)
-            for k in ["trading_start", "trading_end", "cutoff_time", "auto_exit_time"]:
-                if k in data:
-                    data[k] = datetime.strptime(data[k], "%H:%M").time()
-            return data
+    try:
+        data = config_cache.load_json(SETTINGS_FILE)   # re-read only when the file changed
+    except FileNotFoundError:
+        data = None
+    if data is not None:
+        for k in ["trading_start", "trading_end", "cutoff_time", "auto_exit_time"]:
+            if k in data:
+                data[k] = datetime.strptime(data[k], "%H:%M").time()
+        return data
     return {
         "master_auto": True,
         "auto_buy": True,
@@ -36,19 +39,19 @@ def load_settings():
 def save_settings(settings):
     with open(SETTINGS_FILE, "w") as f:
         json.dump(settings, f)
+    config_cache.invalidate(SETTINGS_FILE)
 
 # === Qty Map (Q1..Q20)
 def save_qty_map(qty_map: dict):
     with open(QTY_MAP_FILE, "w") as f:
         json.dump(qty_map, f)
+    config_cache.invalidate(QTY_MAP_FILE)
 
 def load_qty_map() -> dict:
-    if os.path.exists(QTY_MAP_FILE):
-        try:
-            with open(QTY_MAP_FILE, "r") as f:
-                return json.load(f)
-        except Exception:
-            pass
+    try:
+        return config_cache.load_json(QTY_MAP_FILE)
+    except Exception:
+        pass
     # Default quantity mapping (Q1–Q20)
     return {
         "Q1": 1,  "Q2": 1,  "Q3": 1,  "Q4": 1,  "Q5": 1,
@@ -115,7 +118,10 @@ def place_order_from_signal(ps_api, result):
 
 # === Live engine helper: preload TPSeries + start WebSocket ===
 def start_live_engine(ps_api, watchlist_id, interval, ui_queue):
-    """Fetch TPSeries for the watchlist and start websocket in background."""
+    """
+    Fetch TPSeries for the watchlist and start websocket in background.
+    ui_queue: bounded ConflatingTickQueue(conflate=False), oldest message dropped when full.
+    """
 
     # --- TPSeries preload ---
     try:
@@ -0,0 +1,199 @@
+# ema_kernel.py
+"""
+Fused EMA kernel for the TRM strategy.
+
+calc_tkp_trm + calc_macd + calc_pac run 11 separate `ewm` passes, each
+allocating a Series. trm_emas() computes all of them in ONE pass over the
+close / PAC source arrays into a preallocated (8, n) output:
+
+  tsi, tsi_signal            ema(ema(Δclose, long), short) / same of |Δclose|
+  macd, macd_signal, macd_hist
+  pacC, pacL, pacU
+
+Every EMA step replicates pandas' ewm(span, adjust=False) recurrence
+(ignore_na=False, min_periods=0) operation for operation, so results are
+bit-identical to the pandas path.
+
+numba is optional: with it the kernel is JIT-compiled; without it
+trm_emas() falls back to the pandas ewm calls (a pure-Python loop would
+be slower than pandas' compiled passes).
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # optional dependency
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+# rows of the output array
+OUTPUTS = ("tsi", "tsi_signal", "macd", "macd_signal", "macd_hist", "pacC", "pacL", "pacU")
+
+
+def span_alpha(span):
+    """pandas: com = (span - 1) / 2, alpha = 1 / (1 + com)."""
+    com = (span - 1) / 2.0
+    return 1.0 / (1.0 + com)
+
+
+# =========================
+# Kernel
+# =========================
+@njit(cache=True)
+def _ewm_step(weighted, old_wt, cur, alpha):
+    """
+    One step of pandas' ewm(adjust=False) mean for bar i ≥ 1.
+    → (weighted, old_wt); NaN input decays the old weight (ignore_na=False).
+    """
+    if weighted == weighted:
+        old_wt *= 1.0 - alpha
+        if cur == cur:
+            if weighted != cur:
+                weighted = old_wt * weighted + alpha * cur
+                weighted /= old_wt + alpha
+            old_wt = 1.0
+    elif cur == cur:
+        weighted = cur
+    return weighted, old_wt
+
+
+@njit(cache=True)
+def _div(a, b):
+    """a / b with numpy semantics (x/0 → ±inf, 0/0 → nan)."""
+    if b != 0.0:
+        return a / b
+    if a != a or a == 0.0:
+        return math.nan
+    return math.copysign(math.inf, a) * math.copysign(1.0, b)
+
+
+@njit(cache=True)
+def _trm_kernel(close, pac_c, pac_l, pac_u, a_long, a_short, a_signal,
+                a_fast, a_slow, a_macd_sig, a_pac, out):
+    n = close.shape[0]
+    if n == 0:
+        return out
+
+    # state per EMA: weighted value, old weight
+    # bar 0: Δclose is NaN → TSI chain starts empty
+    l1 = s1 = l2 = s2 = sig = math.nan
+    wl1 = ws1 = wl2 = ws2 = wsig = 1.0
+    fast = close[0]
+    slow = close[0]
+    macd_sig = fast - slow
+    pc_ = pac_c[0]
+    pl_ = pac_l[0]
+    pu_ = pac_u[0]
+    wf = wsl = wms = wpc = wpl = wpu = 1.0
+
+    out[0, 0] = math.nan
+    out[1, 0] = math.nan
+    out[2, 0] = fast - slow
+    out[3, 0] = macd_sig
+    out[4, 0] = (fast - slow) - macd_sig
+    out[5, 0] = pc_
+    out[6, 0] = pl_
+    out[7, 0] = pu_
+
+    for i in range(1, n):
+        pc = close[i] - close[i - 1]
+
+        # --- TSI ---
+        l1, wl1 = _ewm_step(l1, wl1, pc, a_long)
+        s1, ws1 = _ewm_step(s1, ws1, l1, a_short)
+        l2, wl2 = _ewm_step(l2, wl2, abs(pc), a_long)
+        s2, ws2 = _ewm_step(s2, ws2, l2, a_short)
+        tsi = 100 * _div(s1, s2)
+        sig, wsig = _ewm_step(sig, wsig, tsi, a_signal)
+
+        # --- MACD ---
+        fast, wf = _ewm_step(fast, wf, close[i], a_fast)
+        slow, wsl = _ewm_step(slow, wsl, close[i], a_slow)
+        macd = fast - slow
+        macd_sig, wms = _ewm_step(macd_sig, wms, macd, a_macd_sig)
+
+        # --- PAC ---
+        pc_, wpc = _ewm_step(pc_, wpc, pac_c[i], a_pac)
+        pl_, wpl = _ewm_step(pl_, wpl, pac_l[i], a_pac)
+        pu_, wpu = _ewm_step(pu_, wpu, pac_u[i], a_pac)
+
+        out[0, i] = tsi
+        out[1, i] = sig
+        out[2, i] = macd
+        out[3, i] = macd_sig
+        out[4, i] = macd - macd_sig
+        out[5, i] = pc_
+        out[6, i] = pl_
+        out[7, i] = pu_
+    return out
+
+
+# =========================
+# Public API
+# =========================
+def pac_sources(o, h, l, c, use_heikin_ashi):
+    """(close, low, high) series the PAC channel is smoothed from."""
+    if use_heikin_ashi:
+        return ((o + h + l + c) / 4,
+                np.fmin(np.fmin(l, o), c),
+                np.fmax(np.fmax(h, o), c))
+    return c, l, h
+
+
+def _trm_emas_pandas(o, h, l, c, settings):
+    from trm_core import ema
+
+    close = pd.Series(c)
+    pc = close.diff()
+    ds_pc = ema(ema(pc, settings["long"]), settings["short"])
+    ds_abs = ema(ema(pc.abs(), settings["long"]), settings["short"])
+    tsi = 100 * (ds_pc / ds_abs)
+
+    exp1 = close.ewm(span=settings.get("macd_fast", 12), adjust=False).mean()
+    exp2 = close.ewm(span=settings.get("macd_slow", 26), adjust=False).mean()
+    macd = exp1 - exp2
+    macd_sig = macd.ewm(span=settings.get("macd_signal", 9), adjust=False).mean()
+
+    src_c, src_l, src_u = pac_sources(o, h, l, c, settings["use_heikin_ashi"])
+    n = settings["pac_length"]
+    return {
+        "tsi": tsi.to_numpy(),
+        "tsi_signal": ema(tsi, settings["signal"]).to_numpy(),
+        "macd": macd.to_numpy(),
+        "macd_signal": macd_sig.to_numpy(),
+        "macd_hist": (macd - macd_sig).to_numpy(),
+        "pacC": ema(pd.Series(src_c), n).to_numpy(),
+        "pacL": ema(pd.Series(src_l), n).to_numpy(),
+        "pacU": ema(pd.Series(src_u), n).to_numpy(),
+    }
+
+
+def trm_emas(o, h, l, c, settings, use_kernel=None):
+    """
+    All TRM / MACD / PAC EMAs for one settings set → {name: ndarray}.
+    o/h/l/c: float64 arrays. use_kernel defaults to HAVE_NUMBA.
+    """
+    o, h, l, c = (np.ascontiguousarray(x, dtype="float64") for x in (o, h, l, c))
+    if use_kernel is None:
+        use_kernel = HAVE_NUMBA
+    if not use_kernel:
+        return _trm_emas_pandas(o, h, l, c, settings)
+
+    src_c, src_l, src_u = pac_sources(o, h, l, c, settings["use_heikin_ashi"])
+    out = np.empty((len(OUTPUTS), len(c)), dtype="float64")
+    _trm_kernel(
+        c, src_c, src_l, src_u,
+        span_alpha(settings["long"]), span_alpha(settings["short"]), span_alpha(settings["signal"]),
+        span_alpha(settings.get("macd_fast", 12)), span_alpha(settings.get("macd_slow", 26)),
+        span_alpha(settings.get("macd_signal", 9)), span_alpha(settings["pac_length"]),
+        out,
+    )
+    return dict(zip(OUTPUTS, out))
@@ -0,0 +1,97 @@
+# engine_checkpoint.py
+"""
+Checkpoint / restore of the tick engine state for fast restarts.
+
+run_tick_engine_forever restarts tick_engine_worker.py whenever it dies;
+without a checkpoint every restart redoes the full TPSeries preload and
+loses the running candles. The worker now writes, every CHECKPOINT_SECS:
+
+  tp    cached_tp (backfilled candles per symbol) as column arrays
+  live  the running CandleBuilder candle per symbol
+
+to live_candles/_engine_checkpoint.pkl.gz (gzip'd pickle, written to a temp
+file and renamed, so a crash mid-write never corrupts the last good one).
+On start the worker restores it and backfills only the span since
+`saved_at` (gap_repair.fetch_since) instead of the whole history.
+"""
+import gzip
+import os
+import pickle
+import time
+
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CHECKPOINT_FILE = os.path.join(BASE_DIR, "live_candles", "_engine_checkpoint.pkl.gz")
+CHECKPOINT_SECS = float(os.environ.get("TICK_CHECKPOINT_SECS", 60))
+FORMAT_VERSION = 1
+
+
+# =========================
+# Frame packing
+# =========================
+def _pack_frame(df):
+    """DataFrame → {"tz", "datetime": int64 ns (UTC), col: ndarray}."""
+    dt = df["datetime"]
+    tz = dt.dt.tz
+    if tz is not None:
+        dt = dt.dt.tz_convert("UTC").dt.tz_localize(None)
+    packed = {"tz": str(tz) if tz is not None else None,
+              "datetime": dt.to_numpy(dtype="datetime64[ns]").view("int64")}
+    for col in df.columns:
+        if col != "datetime":
+            packed[col] = df[col].to_numpy()
+    return packed
+
+
+def _unpack_frame(packed):
+    packed = dict(packed)
+    tz = packed.pop("tz")
+    dt = pd.to_datetime(packed.pop("datetime"))
+    if tz is not None:
+        dt = dt.tz_localize("UTC").tz_convert(tz)
+    return pd.DataFrame({"datetime": dt, **packed})
+
+
+# =========================
+# Save / load
+# =========================
+def save_checkpoint(cached_tp, live_candles, path=CHECKPOINT_FILE):
+    """Write the checkpoint atomically → bytes written."""
+    state = {
+        "version": FORMAT_VERSION,
+        "saved_at": time.time(),
+        "tp": {sym: _pack_frame(df) for sym, df in list(cached_tp.items())
+               if df is not None and not df.empty},
+        "live": {sym: dict(c) for sym, c in live_candles.items()},
+    }
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wb", compresslevel=1) as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return os.path.getsize(path)
+
+
+def load_checkpoint(path=CHECKPOINT_FILE, max_age_secs=None):
+    """
+    → {"saved_at", "tp": {sym: DataFrame}, "live": {sym: candle}} or None
+    (missing, unreadable, other format version, older than max_age_secs).
+    """
+    try:
+        with gzip.open(path, "rb") as f:
+            state = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ checkpoint unreadable ({path}): {e}")
+        return None
+
+    if state.get("version") != FORMAT_VERSION:
+        return None
+    age = time.time() - state["saved_at"]
+    if max_age_secs is not None and age > max_age_secs:
+        print(f"⚠️ checkpoint too old ({age / 3600:.1f} h) — full preload")
+        return None
+
+    state["tp"] = {sym: _unpack_frame(p) for sym, p in state["tp"].items()}
+    return state
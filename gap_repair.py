@@ -0,0 +1,207 @@
+# gap_repair.py
+"""
+Targeted TPSeries backfill of a missing time span.
+
+Instead of re-running the full multi-day preload, only the span since a
+known point in time (checkpoint, last live candle) is fetched:
+
+  fetch_since(ps_api, exch, token, since)   1m bars since `since` → interval bars
+  merge_gap(df, df_gap)                     replace the overlap, append the rest
+  detect_gaps(last_candles, disconnected_at)  symbols that lost ticks in a WS drop
+  GapRepairer(ps_api, on_bars)              batched, rate-limited repairs (thread)
+
+1-minute bars are resampled locally with the same 09:15-anchored buckets
+as the preload (candle_resampler), and the span always starts at a bucket
+boundary so a partially covered candle is rebuilt completely.
+
+All TPSeries calls of a process go through one RateLimiter
+(GAP_CALLS_PER_SEC), so a reconnect storm never floods the broker.
+"""
+import os
+import threading
+import time
+
+import pandas as pd
+
+from candle_resampler import normalize_minute_frame, resample_session_aligned
+from prostocks_connector import tpseries_to_df
+from trading_calendar import get_calendar
+
+BUCKET_SECS = 5 * 60       # IST offset and the 09:15 anchor are multiples of 5 min
+GAP_CALLS_PER_SEC = float(os.environ.get("GAP_CALLS_PER_SEC", 4))
+GAP_BATCH_SIZE = 25
+GAP_BATCH_PAUSE = 1.0
+MIN_GAP_SECS = 30          # shorter drops only cost a few ticks of the running candle
+
+
+class RateLimiter:
+    """Evenly spaced calls: at most `per_sec` per second across threads."""
+
+    def __init__(self, per_sec):
+        self.interval = 1.0 / per_sec if per_sec > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+tpseries_limiter = RateLimiter(GAP_CALLS_PER_SEC)
+
+
+def gap_start(since, interval=5):
+    """Bucket start (epoch) of the candle containing `since`, one bucket earlier for safety."""
+    step = max(BUCKET_SECS, int(interval) * 60)
+    return int(since // step) * step - step
+
+
+def fetch_since(ps_api, exch, token, since, until=None, interval=5, chunk_days=5,
+                limiter=tpseries_limiter):
+    """
+    1-minute TPSeries for the trading sessions in [gap_start(since), until]
+    resampled to `interval` → DataFrame (naive IST datetimes, as the preload).
+    Empty when the span contains no session.
+    """
+    until = until or time.time()
+    windows = get_calendar().plan_fetch_windows(gap_start(since, interval), until,
+                                                chunk_days=chunk_days)
+    chunks = []
+    for st, et in windows:
+        if limiter is not None:
+            limiter.wait()
+        resp = ps_api.get_tpseries(exch, token, "1", st, et)
+        if isinstance(resp, list) and resp:
+            chunks.extend(resp)
+        elif isinstance(resp, dict):
+            print(f"⚠️ gap fetch {exch}|{token}: {resp.get('emsg') or resp.get('stat')}")
+
+    df = normalize_minute_frame(tpseries_to_df(chunks)) if chunks else normalize_minute_frame(None)
+    if df.empty or int(interval) <= 1:
+        return df
+    return resample_session_aligned(df, interval)
+
+
+def merge_gap(df, df_gap):
+    """Candles of df before the gap + the fetched gap candles (gap wins on overlap)."""
+    if df_gap is None or df_gap.empty:
+        return df
+    if df is None or df.empty:
+        return df_gap.reset_index(drop=True)
+    first = df_gap["datetime"].iloc[0]
+    return pd.concat([df[df["datetime"] < first], df_gap], ignore_index=True)
+
+
+# =========================
+# Reconnect repair
+# =========================
+def candle_epoch(candle):
+    """Bucket start (epoch) of a live candle dict ("datetime": tz-aware / naive IST, or "time")."""
+    t = candle.get("datetime", candle.get("time"))
+    if isinstance(t, (int, float)):
+        return float(t)
+    ts = pd.Timestamp(t)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("Asia/Kolkata")
+    return ts.timestamp()
+
+
+def detect_gaps(last_candles, disconnected_at, now=None, min_gap_secs=MIN_GAP_SECS, interval=5):
+    """
+    Symbols whose live candles have a hole after a WS drop → {symbol: since}.
+
+    last_candles: {symbol: last live candle} of symbols that ticked this session.
+    A symbol's hole runs from the end of its last candle (the disconnect if
+    that candle was still running then) to the wall clock. Symbols whose
+    last candle is the current bucket are already live again and skipped;
+    holes with less than min_gap_secs of session time are ignored.
+    """
+    now = now or time.time()
+    step = max(BUCKET_SECS, int(interval) * 60)
+    cal = get_calendar()
+    lost_since = {}          # since → session seconds lost (many symbols share it)
+    gaps = {}
+    for sym, candle in last_candles.items():
+        end = candle_epoch(candle) + step
+        if end > now:
+            continue
+        since = min(disconnected_at, end)
+        lost = lost_since.get(since)
+        if lost is None:
+            lost = lost_since[since] = sum(et - st for st, et in cal.sessions_between(since, now))
+        if lost >= min_gap_secs:
+            gaps[sym] = since
+    return gaps
+
+
+class GapRepairer:
+    """
+    Background worker for targeted backfills: symbols are queued with the
+    start of their hole, fetched in batches of GAP_BATCH_SIZE through the
+    shared rate limiter, and handed to on_bars(symbol, df_gap).
+    """
+
+    def __init__(self, ps_api, on_bars, exch="NSE", interval=5,
+                 batch_size=GAP_BATCH_SIZE, batch_pause=GAP_BATCH_PAUSE):
+        self.ps_api = ps_api
+        self.on_bars = on_bars
+        self.exch = exch
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self._pending = {}      # symbol → (token, since)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self.stats = {"scheduled": 0, "repaired": 0, "bars": 0, "errors": 0}
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def schedule(self, gaps, token_of):
+        """gaps: {symbol: since}; a symbol already queued keeps its earliest since."""
+        with self._lock:
+            for sym, since in gaps.items():
+                token = token_of(sym)
+                if not token:
+                    continue
+                prev = self._pending.get(sym)
+                self._pending[sym] = (token, min(since, prev[1]) if prev else since)
+                self.stats["scheduled"] += 1
+            if self._pending:
+                self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _take_batch(self):
+        with self._lock:
+            batch = list(self._pending.items())[:self.batch_size]
+            for sym, _ in batch:
+                del self._pending[sym]
+            if not self._pending:
+                self._wake.clear()
+            return batch
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            batch = self._take_batch()
+            if not batch:
+                continue
+
+            for sym, (token, since) in batch:
+                try:
+                    df_gap = fetch_since(self.ps_api, self.exch, token, since, interval=self.interval)
+                    if not df_gap.empty:
+                        self.on_bars(sym, df_gap)
+                    self.stats["repaired"] += 1
+                    self.stats["bars"] += len(df_gap)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    print(f"⚠️ gap repair failed for {sym}: {e}")
+
+            print(f"🩹 Gap repair batch: {len(batch)} symbols, {self.pending()} pending | {self.stats}")
+            time.sleep(self.batch_pause)
@@ -0,0 +1,127 @@
+# indicator_cache.py
+"""
+In-memory LRU cache for computed indicator frames and built Plotly figures.
+
+Entries are keyed by (kind, token, interval, data version, settings hash):
+  - data version = number of candles + last candle timestamp + last OHLC,
+    so a live tick that changes the running candle invalidates the entry
+  - settings hash = stable hash of the TRM settings dict
+
+Reruns of the Streamlit script with no new data hit the cache and skip
+indicator computation and figure building entirely.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def settings_hash(settings):
+    """Stable short hash of a settings dict (order independent)."""
+    raw = json.dumps(settings or {}, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def data_version(times, opens, highs, lows, closes):
+    """Cheap fingerprint of an OHLC history: length + last candle."""
+    if len(times) == 0:
+        return (0, None)
+    last_ts = pd.Timestamp(times[-1]).value
+    return (len(times), last_ts,
+            float(opens[-1]), float(highs[-1]), float(lows[-1]), float(closes[-1]))
+
+
+def make_key(kind, token, interval, version, settings):
+    return (kind, str(token), str(interval), version, settings_hash(settings))
+
+
+def estimate_nbytes(obj):
+    """Rough memory footprint of a cached value."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=False).sum())
+
+    # plotly Figure → count points of every array attribute
+    data = getattr(obj, "data", None)
+    if data is not None:
+        total = 0
+        for trace in data:
+            for attr in ("x", "y", "open", "high", "low", "close"):
+                arr = getattr(trace, attr, None) if attr in trace else None
+                if arr is not None:
+                    total += len(arr) * 32
+        return total
+
+    if isinstance(obj, (list, tuple)):
+        return len(obj) * 512
+
+    # indicator_graph node outputs → {column: ndarray}
+    if isinstance(obj, dict):
+        return sum(getattr(v, "nbytes", 1024) for v in obj.values())
+
+    return 1024
+
+
+class IndicatorCache:
+    """Thread-safe LRU with an entry limit and an approximate memory cap."""
+
+    def __init__(self, max_entries=32, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()   # key -> (value, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value):
+        nbytes = estimate_nbytes(value)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+            # too big to ever fit → don't cache
+            if nbytes > self.max_bytes:
+                return value
+
+            self._items[key] = (value, nbytes)
+            self._bytes += nbytes
+            self._evict()
+        return value
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, compute())
+        return value
+
+    def _evict(self):
+        while self._items and (len(self._items) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, nbytes) = self._items.popitem(last=False)
+            self._bytes -= nbytes
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
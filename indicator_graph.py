@@ -0,0 +1,249 @@
+# indicator_graph.py
+"""
+Declarative indicator graph.
+
+Every feature is a node that declares
+  - inputs   : base columns or outputs of other nodes
+  - settings : TRM settings keys it depends on
+  - outputs  : columns it produces
+and a function computing its outputs from those inputs only.
+
+TRM_GRAPH.frame(df, settings, want=[...]) resolves the nodes needed for the
+wanted columns, computes each once (shared intermediates such as `date`
+or `range_pct` are reused by every consumer), skips everything else and
+assembles the result with a single DataFrame copy at the end.
+
+Results can be memoized across calls per (key, frame version, node,
+settings subset) by passing a memo (indicator_cache.IndicatorCache).
+
+The strategy rules themselves (TRM signal, YHL, day move, gap, intraday
+volatility) live in trm_core and are shared with the calc_* chain; nodes
+only wire them to columns.
+"""
+import pandas as pd
+
+from ema_kernel import OUTPUTS as EMA_OUTPUTS, trm_emas
+from trm_core import (TRM_REQUIRED_KEYS, atr_trail, calc_atr, check_trm_settings, day_move,
+                      day_volatility,
+                      gap_move, intraday_volatility, rsi, trm_barcolor, trm_signal,
+                      two_bar_move, yesterday_high_low)
+
+BASE_COLUMNS = ("datetime", "open", "high", "low", "close", "volume")
+
+
+class Node:
+    def __init__(self, name, func, inputs=(), settings=(), outputs=()):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.settings = tuple(settings)
+        self.outputs = tuple(outputs)
+
+
+class _Context:
+    """Column lookup over the base frame + computed outputs (no copies)."""
+
+    def __init__(self, df, computed):
+        self._df = df
+        self._computed = computed
+
+    def __getitem__(self, col):
+        if col in self._computed:
+            return self._computed[col]
+        return self._df[col]
+
+    @property
+    def index(self):
+        return self._df.index
+
+    def __len__(self):
+        return len(self._df)
+
+
+def frame_version(df):
+    """Cheap fingerprint of a candle frame: length + first/last bar."""
+    if df.empty:
+        return (0,)
+    dt = df["datetime"]
+    return (len(df), pd.Timestamp(dt.iloc[0]).value, pd.Timestamp(dt.iloc[-1]).value,
+            float(df["close"].iloc[-1]), float(df["high"].iloc[-1]), float(df["low"].iloc[-1]))
+
+
+class IndicatorGraph:
+    def __init__(self):
+        self.nodes = {}
+        self._producer = {}     # column → node name
+
+    def node(self, name, inputs=(), settings=(), outputs=()):
+        """Decorator registering a node function f(ctx, settings) → {col: values}."""
+        def register(func):
+            n = Node(name, func, inputs, settings, outputs or (name,))
+            self.nodes[name] = n
+            for col in n.outputs:
+                self._producer[col] = name
+            return func
+        return register
+
+    # ---------- planning ----------
+    def plan(self, want):
+        """Nodes needed for the wanted columns, dependencies first."""
+        order, seen = [], set()
+
+        def visit(col):
+            name = self._producer.get(col)
+            if name is None:
+                if col not in BASE_COLUMNS:
+                    raise KeyError(f"No indicator node produces column '{col}'")
+                return
+            if name in seen:
+                return
+            seen.add(name)
+            for dep in self.nodes[name].inputs:
+                visit(dep)
+            order.append(self.nodes[name])
+
+        for col in want:
+            visit(col)
+        return order
+
+    # ---------- execution ----------
+    def _execute(self, df, settings, want, memo=None, key=None):
+        """Run the plan → {column: Series} of every executed node's outputs."""
+        computed = {}
+        ctx = _Context(df, computed)
+        version = frame_version(df) if memo is not None and key is not None else None
+
+        for n in self.plan(want):
+            mkey = None
+            if version is not None:
+                mkey = ("graph", key, version, n.name,
+                        tuple((k, (settings or {}).get(k)) for k in n.settings))
+                hit = memo.get(mkey)
+                if hit is not None:
+                    # cached arrays are positional; re-label them for this frame
+                    computed.update({col: pd.Series(v, index=df.index, name=col)
+                                     for col, v in hit.items()})
+                    continue
+
+            out = n.func(ctx, settings)
+            out = {col: (v if isinstance(v, pd.Series) else pd.Series(v, index=df.index))
+                   for col, v in out.items()}
+            computed.update(out)
+            if mkey is not None:
+                memo.put(mkey, {col: v.to_numpy() for col, v in out.items()})
+
+        return computed
+
+    def columns(self, df, settings, want, memo=None, key=None):
+        """{column: Series} for the wanted columns only."""
+        computed = self._execute(df, settings, want, memo=memo, key=key)
+        ctx = _Context(df, computed)
+        return {col: ctx[col] for col in want}
+
+    def frame(self, df, settings, want, memo=None, key=None):
+        """df plus the outputs of every node needed for `want` (a single copy)."""
+        return df.assign(**self._execute(df, settings, want, memo=memo, key=key))
+
+
+TRM_GRAPH = IndicatorGraph()
+
+
+# =========================
+# Shared intermediates
+# =========================
+@TRM_GRAPH.node("date", inputs=["datetime"])
+def _date(ctx, s):
+    return {"date": ctx["datetime"].dt.date}
+
+
+@TRM_GRAPH.node("range_pct", inputs=["high", "low"])
+def _range_pct(ctx, s):
+    return {"range_pct": ((ctx["high"] - ctx["low"]) / ctx["low"]) * 100}
+
+
+@TRM_GRAPH.node("close_change_pct", inputs=["close"])
+def _close_change_pct(ctx, s):
+    return {"close_change_pct": ctx["close"].pct_change() * 100}
+
+
+# =========================
+# TRM / MACD / PAC (fused EMAs) / ATR
+# =========================
+@TRM_GRAPH.node("emas", inputs=["open", "high", "low", "close"],
+                settings=TRM_REQUIRED_KEYS + ["pac_length", "use_heikin_ashi"],
+                outputs=list(EMA_OUTPUTS))
+def _emas(ctx, settings):
+    """TSI / MACD / PAC smoothing in one fused pass (ema_kernel)."""
+    check_trm_settings(settings)
+    print("🔹 Strategy settings loaded OK:", settings)
+    return trm_emas(ctx["open"].to_numpy(), ctx["high"].to_numpy(),
+                    ctx["low"].to_numpy(), ctx["close"].to_numpy(), settings)
+
+
+@TRM_GRAPH.node("trm", inputs=["close", "tsi", "tsi_signal"],
+                settings=TRM_REQUIRED_KEYS + ["buyColor", "sellColor", "neutralColor"],
+                outputs=["rsi", "trm_signal", "barcolor"])
+def _trm(ctx, settings):
+    rsi_vals = rsi(ctx["close"], settings["len_rsi"])
+    trm = trm_signal(ctx["tsi"], ctx["tsi_signal"], rsi_vals, settings)
+    return {"rsi": rsi_vals, "trm_signal": trm, "barcolor": trm_barcolor(trm, settings)}
+
+
+@TRM_GRAPH.node("atr_trails", inputs=["high", "low", "close"],
+                settings=["atr_fast_period", "atr_fast_mult", "atr_slow_period", "atr_slow_mult"],
+                outputs=["Trail1", "Trail2", "Bull"])
+def _atr_trails(ctx, settings):
+    sc = ctx["close"]
+    trail1 = atr_trail(sc, settings["atr_fast_mult"] * calc_atr(ctx, settings["atr_fast_period"]))
+    trail2 = atr_trail(sc, settings["atr_slow_mult"] * calc_atr(ctx, settings["atr_slow_period"]))
+    bull = (trail1 > trail2) & (sc > trail2) & (ctx["low"] > trail2)
+    return {"Trail1": trail1, "Trail2": trail2, "Bull": bull}
+
+
+# =========================
+# Day-level filters
+# =========================
+@TRM_GRAPH.node("yhl", inputs=["date", "high", "low"], outputs=["high_yest", "low_yest"])
+def _yhl(ctx, s):
+    high_yest, low_yest = yesterday_high_low(ctx["date"], ctx["high"], ctx["low"])
+    return {"high_yest": high_yest, "low_yest": low_yest}
+
+
+@TRM_GRAPH.node("day_open", inputs=["date", "open"])
+def _day_open(ctx, s):
+    return {"day_open": ctx["open"].groupby(ctx["date"]).transform("first")}
+
+
+@TRM_GRAPH.node("day_move", inputs=["close", "day_open"],
+                outputs=["day_move_pct", "skip_due_to_day_move"])
+def _day_move(ctx, s):
+    pct, skip = day_move(ctx["close"], ctx["day_open"])
+    return {"day_move_pct": pct, "skip_due_to_day_move": skip}
+
+
+@TRM_GRAPH.node("day_volatility", inputs=["date", "high", "low"])
+def _day_volatility(ctx, s):
+    return {"day_volatility": day_volatility(ctx["date"], ctx["high"], ctx["low"])}
+
+
+@TRM_GRAPH.node("gap", inputs=["date", "day_open", "close"], outputs=["gap_pct", "skip_due_to_gap"])
+def _gap(ctx, s):
+    """Opening gap of each day (every bar of the day)."""
+    pct, skip = gap_move(ctx["date"], ctx["day_open"], ctx["close"])
+    return {"gap_pct": pct, "skip_due_to_gap": skip}
+
+
+@TRM_GRAPH.node("intraday_vol", inputs=["range_pct", "close_change_pct"],
+                outputs=["flag_single", "two_candle_move", "flag_two", "skip_due_to_intraday_vol"])
+def _intraday_vol(ctx, s):
+    flag_single, two, flag_two, skip = intraday_volatility(ctx["range_pct"], ctx["close_change_pct"])
+    return {"flag_single": flag_single, "two_candle_move": two, "flag_two": flag_two,
+            "skip_due_to_intraday_vol": skip}
+
+
+@TRM_GRAPH.node("day_two_bar_move", inputs=["date", "close"])
+def _day_two_bar_move(ctx, s):
+    """Two-candle combined move % within each day (first bars of a day → NaN)."""
+    date = ctx["date"]
+    pct = ctx["close"].groupby(date).pct_change() * 100
+    return {"day_two_bar_move": pct.groupby(date).transform(two_bar_move)}
@@ -0,0 +1,103 @@
+# lookback_planner.py
+"""
+Minimum history needed for the TRM indicators to warm up.
+
+An EMA with span s (α = 2 / (s + 1)) still carries (1 - α)^n of its seed
+value after n bars, so it is within `tol` of a fully warmed-up EMA after
+
+    n = ceil(ln(tol) / ln(1 - α))
+
+Chained EMAs add up (TSI: long → short → signal), rolling windows (RSI,
+ATR) need their length + 1 (diff / shift). The largest chain of the active
+settings is the warm-up in bars; on top of that the day filters (YHL, gap)
+always need the previous session, so at least MIN_SESSIONS are kept.
+
+  required_bars(settings)             bars to load / keep / compute
+  backfill_days(settings, interval)   calendar days to request from TPSeries
+  session_days(sessions)              calendar days spanning N trading sessions
+  trim_to_lookback(df, bars)          keep the window (never < MIN_SESSIONS)
+"""
+import math
+from datetime import date, timedelta
+
+from trading_calendar import SESSION_CLOSE, SESSION_OPEN, get_calendar
+
+DEFAULT_TOL = 1e-3
+MIN_SESSIONS = 2
+# used when no settings are available (previous fixed tail)
+FALLBACK_BARS = 200
+
+SESSION_MINUTES = (SESSION_CLOSE.hour * 60 + SESSION_CLOSE.minute) - \
+                  (SESSION_OPEN.hour * 60 + SESSION_OPEN.minute)
+
+
+def ema_bars(span, tol=DEFAULT_TOL):
+    """Bars until an EMA of `span` forgets its seed to within `tol`."""
+    span = float(span)
+    if span <= 1:
+        return 1
+    alpha = 2.0 / (span + 1.0)
+    return int(math.ceil(math.log(tol) / math.log(1.0 - alpha)))
+
+
+def plan_lookback(settings, tol=DEFAULT_TOL):
+    """Warm-up bars per indicator chain → {"tsi", "rsi", "macd", "pac", "atr", "bars"}."""
+    s = settings or {}
+    plan = {
+        # Δclose → ema(long) → ema(short) → tsi → ema(signal)
+        "tsi": 1 + ema_bars(s.get("long", 25), tol) + ema_bars(s.get("short", 5), tol)
+               + ema_bars(s.get("signal", 14), tol),
+        "rsi": int(s.get("len_rsi", 14)) + 1,
+        "macd": max(ema_bars(s.get("macd_fast", 12), tol), ema_bars(s.get("macd_slow", 26), tol))
+                + ema_bars(s.get("macd_signal", 9), tol),
+        "pac": ema_bars(s.get("pac_length", 34), tol),
+        # rolling mean of TR (TR needs the previous close)
+        "atr": max(int(s.get("atr_fast_period", 5)), int(s.get("atr_slow_period", 10))) + 1,
+    }
+    plan["bars"] = max(plan.values())
+    return plan
+
+
+def required_bars(settings, tol=DEFAULT_TOL):
+    """Bars of history the active settings need (FALLBACK_BARS without settings)."""
+    if not settings:
+        return FALLBACK_BARS
+    return plan_lookback(settings, tol)["bars"]
+
+
+def backfill_days(settings, interval=5, tol=DEFAULT_TOL, today=None):
+    """
+    Calendar days to request so that the warm-up window plus MIN_SESSIONS
+    full sessions are covered (weekends / holidays counted via the calendar).
+    """
+    per_session = max(1, SESSION_MINUTES // int(interval))
+    sessions = max(MIN_SESSIONS, math.ceil(required_bars(settings, tol) / per_session) + 1)
+    return session_days(sessions, today)
+
+
+def session_days(sessions, today=None):
+    """Calendar days back from today (inclusive) that contain `sessions` trading sessions."""
+    cal = get_calendar()
+    d = today or date.today()
+    found = 0
+    days = 0
+    while found < sessions and days < 3660:
+        if cal.is_trading_day(d - timedelta(days=days)):
+            found += 1
+        days += 1
+    return days
+
+
+def trim_to_lookback(df, bars, min_sessions=MIN_SESSIONS):
+    """
+    Last `bars` rows of a (sorted) candle frame, extended back to a session
+    start and to at least the last `min_sessions` sessions, so yesterday's
+    high / low / close are always complete.
+    """
+    if df is None or df.empty or bars is None or len(df) <= bars:
+        return df
+    dates = df["datetime"].dt.date
+    all_days = dates.unique()
+    keep_from = min(dates.iloc[len(df) - int(bars)],
+                    all_days[max(0, len(all_days) - min_sessions)])
+    return df.iloc[int((dates < keep_from).sum()):]
@@ -0,0 +1,118 @@
+# market_records.py
+"""
+Compact tick / candle records for the live path.
+
+Ticks used to travel as decoded WS dicts ({"t","e","tk","lp","ft","v",…},
+one hash table + a str per field) and candles were stored as one dict per
+bar. On the hot path every access is a string-key lookup, and a full
+session of 500 symbols keeps hundreds of thousands of those dicts alive.
+
+  Tick            __slots__ (token, price, volume, ts); pickles as a plain
+                  4-tuple (shard → parent bus)
+  Candle          __slots__ (time, open, high, low, close, volume), time =
+                  bucket start (epoch); updated in place while running and
+                  stored as-is once closed
+  TokenRegistry   key ("EXCH|TOKEN" / symbol) ↔ dense int id, so the candle
+                  stores index lists instead of hashing tuples / strings
+
+Dicts are only built at the edges (get_latest / history / JSON), via
+Candle.as_dict().
+"""
+import threading
+
+CANDLE_FIELDS = ("time", "open", "high", "low", "close", "volume")
+
+
+class Tick:
+    __slots__ = ("token", "price", "volume", "ts")
+
+    def __init__(self, token, price, volume, ts):
+        self.token = token
+        self.price = price
+        self.volume = volume
+        self.ts = ts
+
+    def __reduce__(self):
+        return Tick, (self.token, self.price, self.volume, self.ts)
+
+    def __repr__(self):
+        return f"Tick({self.token!r}, {self.price}, {self.volume}, {self.ts})"
+
+
+class Candle:
+    __slots__ = CANDLE_FIELDS
+
+    def __init__(self, time, open, high, low, close, volume):
+        self.time = time
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def from_dict(cls, d, time_key="time"):
+        return cls(d[time_key], d["open"], d["high"], d["low"], d["close"], d.get("volume", 0))
+
+    def add(self, price, volume):
+        """One tick of the same bucket."""
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += volume
+
+    def merge(self, high, low, close, volume):
+        """Several ticks of the same bucket, already aggregated (micro-batch row)."""
+        if high > self.high:
+            self.high = high
+        if low < self.low:
+            self.low = low
+        self.close = close
+        self.volume += volume
+
+    def as_dict(self, time_key="time", time_value=None):
+        return {time_key: self.time if time_value is None else time_value,
+                "open": self.open, "high": self.high, "low": self.low,
+                "close": self.close, "volume": self.volume}
+
+    def __eq__(self, other):
+        return isinstance(other, Candle) and all(
+            getattr(self, f) == getattr(other, f) for f in CANDLE_FIELDS)
+
+    def __reduce__(self):
+        return Candle, tuple(getattr(self, f) for f in CANDLE_FIELDS)
+
+    def __repr__(self):
+        return "Candle(" + ", ".join(str(getattr(self, f)) for f in CANDLE_FIELDS) + ")"
+
+
+class TokenRegistry:
+    """key ↔ dense int id (ids are never reused); lookups lock-free, inserts locked."""
+
+    def __init__(self):
+        self.keys = []          # id → key
+        self.ids = {}           # key → id
+        self._lock = threading.Lock()
+
+    def id_of(self, key):
+        i = self.ids.get(key)
+        if i is None:
+            with self._lock:
+                i = self.ids.get(key)
+                if i is None:
+                    i = len(self.keys)
+                    self.keys.append(key)
+                    self.ids[key] = i
+        return i
+
+    def get(self, key):
+        """Id of a known key or None (never registers)."""
+        return self.ids.get(key)
+
+    def key_of(self, i):
+        return self.keys[i]
+
+    def __len__(self):
+        return len(self.keys)
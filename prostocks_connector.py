@@ -7,12 +7,50 @@ import time
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, timezone
 import pandas as pd
+from trading_calendar import get_calendar
+from tick_aggregator import DEFAULT_INTERVALS, MAX_CANDLES, TickAggregator
+from tick_batch import TICK_BATCH_MS, MicroBatcher
+from conflating_queue import ConflatingTickQueue
 import websocket
 import threading
 import queue
 
 load_dotenv()
 
+TPSERIES_RENAME_MAP = {
+    "time": "datetime",
+    "into": "open",
+    "inth": "high",
+    "intl": "low",
+    "intc": "close",
+    "intvwap": "vwap",
+    "intv": "volume",
+    "intol": "open_interest_lot",
+    "oi": "open_interest"
+}
+
+
+def tpseries_to_df(records):
+    """
+    Raw TPSeries records (list of dicts) → DataFrame with
+    datetime/open/high/low/close/volume columns, sorted and de-duplicated.
+    """
+    df = pd.DataFrame(records)
+    if df.empty:
+        return df
+
+    if "time" in df.columns:
+        df.drop_duplicates(subset=["time"], inplace=True)
+
+    df.rename(columns=TPSERIES_RENAME_MAP, inplace=True)
+
+    if "datetime" in df.columns:
+        df["datetime"] = pd.to_datetime(df["datetime"], errors="coerce", dayfirst=True)
+        df = df.dropna(subset=["datetime"])
+        df = df.sort_values("datetime")
+
+    return df.reset_index(drop=True)
+
 
 class ProStocksAPI:
     def __init__(
@@ -52,13 +90,15 @@ class ProStocksAPI:
         self.ws_url = "wss://starapi.prostocks.com/NorenWSTP/"
 
         # ✅ Tick Queue + File init YAHAN karna hai
-        import queue
+        # bounded, one pending tick per token (latest wins) → no growth without a consumer
         self._tokens = {}  # symbol → token mapping
-        self.tick_queue = queue.Queue()
+        self.tick_queue = ConflatingTickQueue()
         self.tick_file = "ticks.log"
 
-        self.candles = {}
-        self.live_candles = {}   # <-- ADD THIS LINE HERE
+        self.on_new_candle = None
+        self.aggregator = TickAggregator(on_close=self._on_candle_close)
+        self.live_candles = self.aggregator.closed
+        self.tick_batcher = None
 
     # ---------------- Utils ----------------
     def sha256(self, text: str) -> str:
@@ -313,61 +353,32 @@ class ProStocksAPI:
         end_dt = datetime.now(timezone.utc)
         start_limit_dt = end_dt - timedelta(days=max_days)
 
-        while end_dt > start_limit_dt:
-            start_dt = end_dt - timedelta(days=chunk_days)
-            if start_dt < start_limit_dt:
-                start_dt = start_limit_dt
+        # only request windows that contain trading sessions (newest first);
+        # weekends / holidays are skipped without a broker call
+        windows = get_calendar().plan_fetch_windows(start_limit_dt, end_dt, chunk_days=chunk_days)
 
-            st = int(start_dt.timestamp())
-            et = int(end_dt.timestamp())
-            print(f"⏳ Fetching {start_dt} → {end_dt} (UTC)")
+        for st, et in windows:
+            print(f"⏳ Fetching {datetime.fromtimestamp(st, timezone.utc)} → {datetime.fromtimestamp(et, timezone.utc)} (UTC)")
             resp = self.get_tpseries(exch, token, interval, st, et)
 
             if isinstance(resp, dict):
                 print(f"⚠️ TPSeries chunk returned dict: {resp.get('emsg') or resp.get('stat')}")
-                end_dt = start_dt - timedelta(seconds=1)
                 time.sleep(0.25)
                 continue
 
             if not isinstance(resp, list) or len(resp) == 0:
                 print("⚠️ Empty chunk. Moving back…")
-                end_dt = start_dt - timedelta(seconds=1)
                 time.sleep(0.25)
                 continue
 
             df_chunk = pd.DataFrame(resp)
             all_chunks.append(df_chunk)
-            end_dt = start_dt - timedelta(seconds=1)
             time.sleep(0.25)
 
         if not all_chunks:
             return pd.DataFrame()
 
-        df = pd.concat(all_chunks, ignore_index=True)
-
-        if "time" in df.columns:
-            df.drop_duplicates(subset=["time"], inplace=True)
-            df.sort_values(by="time", inplace=True)
-
-        rename_map = {
-            "time": "datetime",
-            "into": "open",
-            "inth": "high",
-            "intl": "low",
-            "intc": "close",
-            "intvwap": "vwap",
-            "intv": "volume",
-            "intol": "open_interest_lot",
-            "oi": "open_interest"
-        }
-        df.rename(columns=rename_map, inplace=True)
-
-        if "datetime" in df.columns:
-            df["datetime"] = pd.to_datetime(df["datetime"], errors="coerce", dayfirst=True)
-            df = df.dropna(subset=["datetime"])
-
-        df.sort_values("datetime", inplace=True)
-        return df.reset_index(drop=True)
+        return tpseries_to_df(pd.concat(all_chunks, ignore_index=True))
 
     def fetch_tpseries_for_watchlist(self, wlname, interval="5"):
         results = []
@@ -785,135 +796,55 @@ class ProStocksAPI:
             print("❌ stop_ticks error:", e)
 
 
-    # inside ProStocksAPI class
+    # ---------------- Live candles ----------------
+    # One TickAggregator (tick_aggregator.py) per API object: running OHLCV per
+    # 'EXCH|TOKEN' and interval, closed candles in self.live_candles keyed by
+    # 'EXCH|TOKEN|interval' (bounded deques of market_records.Candle).
 
-    # store recent candles per symbol+interval in memory
+    def _on_candle_close(self, key, interval, candle):
+        if callable(getattr(self, "on_new_candle", None)):
+            self.on_new_candle(key, dict(candle.as_dict(), interval=interval))
 
-    def start_candle_builder(self, intervals=[1,3,5,15,30,60], max_candles=500):
+    def start_candle_builder(self, intervals=DEFAULT_INTERVALS, max_candles=MAX_CANDLES,
+                             batch_ms=TICK_BATCH_MS):
         """
-        Start a background thread that consumes self.tick_queue and builds candles
-        stored in self.live_candles keyed by 'EXCH|TOKEN|interval'.
+        (Re)configure the live candle intervals / history length.
+        Ticks are folded in _ws_on_message already — no consumer thread needed.
+        batch_ms > 0: ticks are buffered and folded as NumPy micro-batches
+        every batch_ms (tick_batch.MicroBatcher) instead of one by one.
         """
-        import threading, time
-        def builder():
-            buffers = {}  # key -> list of ticks for current bucket
-            while True:
-                try:
-                    tick = self.tick_queue.get()  # blocking
-                    ts = int(tick.get("ft") or tick.get("time") or 0)
-                    if ts == 0:
-                        continue
-                    price = float(tick.get("lp") or 0)
-                    exch = tick.get("e") or tick.get("exch") or "NSE"
-                    token = str(tick.get("tk") or tick.get("token") or "")
-                    if not token:
-                        continue
-
-                    for m in intervals:
-                        key = f"{exch}|{token}|{m}"
-                        bucket = ts - (ts % (m * 60))
-                        b = buffers.setdefault(key, {"bucket": bucket, "ticks": []})
-                        if bucket != b["bucket"]:
-                            # close previous bucket
-                            if b["ticks"]:
-                                o = float(b["ticks"][0]["lp"])
-                                c = float(b["ticks"][-1]["lp"])
-                                h = max(float(tk["lp"]) for tk in b["ticks"])
-                                l = min(float(tk["lp"]) for tk in b["ticks"])
-                                candle = {"time": b["bucket"], "open": o, "high": h, "low": l, "close": c, "volume": sum(int(tk.get("v") or 0) for tk in b["ticks"])}
-                                lst = self.live_candles.setdefault(key, [])
-                                lst.append(candle)
-                                if len(lst) > max_candles:
-                                    lst.pop(0)
-                                # call hook if exists
-                                if hasattr(self, "on_new_candle") and callable(self.on_new_candle):
-                                    try:
-                                        self.on_new_candle(f"{exch}|{token}", candle)
-                                    except Exception:
-                                        pass
-                            # reset
-                            buffers[key] = {"bucket": bucket, "ticks": []}
-                        # append tick
-                        buffers[key]["ticks"].append(tick)
-                except Exception as e:
-                    print("⚠️ candle_builder error:", e)
-                    time.sleep(0.1)
-
-        t = threading.Thread(target=builder, daemon=True)
-        t.start()
-        self._candle_builder_thread = t
+        if tuple(sorted(set(intervals))) != self.aggregator.intervals or max_candles != self.aggregator.max_candles:
+            self.aggregator = TickAggregator(intervals, max_candles, on_close=self._on_candle_close)
+            self.live_candles = self.aggregator.closed
+        if batch_ms and self.tick_batcher is None:
+            self.tick_batcher = MicroBatcher(lambda keys, ticks: self.aggregator.add_batch(keys, ticks),
+                                             flush_ms=batch_ms, registry=self.aggregator.tokens).start()
+        return self.aggregator
 
     def get_latest_candles(self, exch, token, interval=1, limit=200):
-        key = f"{exch}|{token}|{interval}"
-        return list(self.live_candles.get(key, []))[-limit:]
-    
+        return self.aggregator.history(f"{exch}|{token}", interval)[-limit:]
 
-    def build_live_candles_from_tick(self, tick, intervals=[1, 3, 5, 15, 30, 60]):
+    def build_live_candles_from_tick(self, tick):
         """
-        Build/update OHLCV candles from live ticks.
-        - tick: dict from websocket {e, tk, lp, v, ft}
-        - intervals: list of minute durations [1,3,5,15,30,60]
+        Fold one websocket tick {e, tk, lp, v, ft} into the live candles.
+        on_new_candle(key, candle) fires with each closed candle only.
         """
         try:
             ts = int(tick.get("ft", 0))   # epoch seconds
             price = float(tick.get("lp", 0) or 0)
-            volume = int(tick.get("v", 0) or 0)
-
-            if not price:
+            if not price or not ts:
                 return  # skip ticks without price
 
-            exch = tick.get("e")
+            exch = tick.get("e") or "NSE"
             token = tick.get("tk")
-
-            for m in intervals:
-                # Candle start bucket timestamp
-                bucket = ts - (ts % (m * 60))
-                key = f"{exch}|{token}|{m}"
-
-                # Init storage if not exists
-                if not hasattr(self, "candles"):
-                    self.candles = {}
-                if key not in self.candles:
-                    self.candles[key] = {}
-
-                last_buckets = sorted(self.candles[key].keys())
-                if last_buckets:
-                    last_bucket = last_buckets[-1]
-                    if bucket > last_bucket:
-                        # ✅ Candle closed → trigger callback
-                        closed_candle = self.candles[key][last_bucket]
-                        df = pd.DataFrame(list(self.candles[key].values()))
-                        df["datetime"] = pd.to_datetime(df["ts"], unit="s")
-                        if hasattr(self, "on_new_candle") and self.on_new_candle:
-                            try:
-                                self.on_new_candle(f"{exch}|{token}", df)
-                            except Exception as e:
-                                print("❌ on_new_candle error:", e)
-
-                # --- Create or update candle ---
-                if bucket not in self.candles[key]:
-                    # New candle
-                    self.candles[key][bucket] = {
-                        "ts": bucket,
-                        "o": price,
-                        "h": price,
-                        "l": price,
-                        "c": price,
-                        "v": volume,
-                    }
-                else:
-                    # Update existing candle
-                    candle = self.candles[key][bucket]
-                    candle["h"] = max(candle["h"], price)
-                    candle["l"] = min(candle["l"], price)
-                    candle["c"] = price
-                    candle["v"] += volume
+            if self.tick_batcher is not None:
+                self.tick_batcher.put(f"{exch}|{token}", price, int(tick.get("v", 0) or 0), ts)
+            else:
+                self.aggregator.add(f"{exch}|{token}", ts, price, int(tick.get("v", 0) or 0))
 
         except Exception as e:
             print(f"⚠️ build_live_candles_from_tick error: {e}, tick={tick}")
 
-   
-    
     def connect_websocket(self, symbols, on_tick=None, tick_file="ticks.log"):
         """
         SAFE MODE:
@@ -934,10 +865,9 @@ class ProStocksAPI:
         """
         import websocket
         import threading
-        import queue
 
         self.tick_file = tick_file
-        self.tick_queue = queue.Queue()
+        self.tick_queue = ConflatingTickQueue()
         self._sub_tokens = symbols
         self.is_ws_connected = False
 
@@ -0,0 +1,141 @@
+# rescreen_scheduler.py
+"""
+Event-driven rescreen scheduling.
+
+The tick engine reports candle events; the scheduler keeps a dirty set of
+symbols that need a new evaluation and the auto trader screens only those.
+
+Policies:
+  "close"    → a symbol is dirty when one of its candles closes
+  "intrabar" → also dirty when price moved ≥ intrabar_pct % since the
+               symbol was last marked (running candle)
+
+Event format (one dict per event):
+  {"symbol": "SBIN-EQ", "type": "update" | "close", "price": 812.4}
+"""
+import os
+import threading
+import time
+
+POLICIES = ("close", "intrabar")
+
+
+class RescreenScheduler:
+    def __init__(self, policy="close", intrabar_pct=0.25):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown rescreen policy: {policy} (use one of {POLICIES})")
+        self.policy = policy
+        self.intrabar_pct = float(intrabar_pct)
+
+        self._dirty = set()
+        self._ref_price = {}          # symbol → price when last marked dirty
+        self._cond = threading.Condition()
+
+        self.events = 0
+        self.marked = 0
+
+    @classmethod
+    def from_env(cls):
+        """RESCREEN_POLICY / RESCREEN_INTRABAR_PCT environment config."""
+        return cls(
+            policy=os.environ.get("RESCREEN_POLICY", "close"),
+            intrabar_pct=float(os.environ.get("RESCREEN_INTRABAR_PCT", "0.25")),
+        )
+
+    @staticmethod
+    def _norm(symbol):
+        return str(symbol).upper().strip()
+
+    def _mark(self, symbol, price):
+        self._dirty.add(symbol)
+        if price:
+            self._ref_price[symbol] = price
+        self.marked += 1
+        self._cond.notify_all()
+
+    # ---------- event side ----------
+    def on_update(self, symbol, price):
+        """Running candle changed."""
+        if self.policy != "intrabar" or not price:
+            return
+        symbol = self._norm(symbol)
+        with self._cond:
+            self.events += 1
+            ref = self._ref_price.get(symbol)
+            if ref is None:
+                self._ref_price[symbol] = price
+            elif abs(price - ref) / ref * 100 >= self.intrabar_pct:
+                self._mark(symbol, price)
+
+    def on_close(self, symbol, price=None):
+        """Candle closed → always rescreen."""
+        with self._cond:
+            self.events += 1
+            self._mark(self._norm(symbol), price)
+
+    def handle_events(self, events):
+        for ev in events or []:
+            sym = ev.get("symbol")
+            if not sym:
+                continue
+            price = float(ev.get("price") or 0) or None
+            if ev.get("type") == "close":
+                self.on_close(sym, price)
+            else:
+                self.on_update(sym, price)
+
+    # ---------- consumer side ----------
+    def take(self):
+        """Return and clear the dirty set (non-blocking)."""
+        with self._cond:
+            dirty, self._dirty = self._dirty, set()
+            return dirty
+
+    def wait(self, timeout=None):
+        """Block until at least one symbol is dirty (or timeout) → dirty set."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._dirty:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            dirty, self._dirty = self._dirty, set()
+            return dirty
+
+    def stats(self):
+        with self._cond:
+            return {
+                "policy": self.policy,
+                "intrabar_pct": self.intrabar_pct,
+                "pending": len(self._dirty),
+                "events": self.events,
+                "marked": self.marked,
+            }
+
+
+# =========================
+# Producer side (tick engine)
+# =========================
+class CandleEventBuffer:
+    """
+    Collects candle events between flushes, one per symbol.
+    A close is never overwritten by a later update of the same flush window.
+    """
+
+    def __init__(self):
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def add(self, symbol, event_type, price):
+        with self._lock:
+            prev = self._events.get(symbol)
+            if prev is not None and prev["type"] == "close" and event_type != "close":
+                prev["price"] = price
+                return
+            self._events[symbol] = {"symbol": symbol, "type": event_type, "price": price}
+
+    def drain(self):
+        with self._lock:
+            events, self._events = list(self._events.values()), {}
+            return events
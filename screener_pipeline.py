@@ -0,0 +1,296 @@
+# screener_pipeline.py
+"""
+Staged screener pipeline:  load → compute → decide → route
+
+  load     (I/O, threads)   candle file → normalized 5-min frame
+  compute  (CPU, processes) indicators + signal (generate_signal_for_df)
+  decide   (inline)         order/skip decision against the order book
+  route    (I/O, threads)   POST /place_order
+
+Stages are connected by bounded asyncio queues, so a slow stage applies
+backpressure upstream instead of piling up work. Every stage records
+items, busy time and queue high-water mark (StageMetrics).
+
+The process pool is created once and reused across screener runs. Its
+size is SCREENER_PROCS, by default the CPUs this process may run on
+(sched_getaffinity, not the host count a container reports) capped at
+MAX_DEFAULT_PROCS, since every spawned worker re-imports pandas and the
+TRM stack inside the web process. SCREENER_PROCS=0 computes on threads
+instead (e.g. constrained hosts).
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+
+import batch_screener as bs
+from daily_levels import levels_match
+from lookback_planner import required_bars
+from screener_prefilter import norm_symbol
+
+ORDER_URL = "https://backend-stream-nmlf.onrender.com/place_order"
+
+LOAD_WORKERS = 16
+ROUTE_WORKERS = 8
+QUEUE_SIZE = 64
+MAX_DEFAULT_PROCS = 4
+
+_process_pool = None
+
+
+def default_procs():
+    """Usable CPUs of this process (not of the host), at most MAX_DEFAULT_PROCS."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:          # no affinity API (macOS / Windows)
+        cpus = os.cpu_count() or 1
+    return max(1, min(MAX_DEFAULT_PROCS, cpus))
+
+
+def get_process_pool():
+    """Shared compute pool (spawned once per process)."""
+    global _process_pool
+    procs = int(os.environ.get("SCREENER_PROCS", default_procs()))
+    if procs <= 0:
+        return None
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=procs, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
+
+
+# =========================
+# Metrics
+# =========================
+class StageMetrics:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.errors = 0
+        self.busy_secs = 0.0
+        self.queue_max = 0
+
+    def observe_queue(self, q):
+        self.queue_max = max(self.queue_max, q.qsize())
+
+    def as_dict(self, wall_secs):
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "errors": self.errors,
+            "busy_secs": round(self.busy_secs, 3),
+            "items_per_sec": round(self.items / wall_secs, 2) if wall_secs > 0 else 0.0,
+            "queue_max": self.queue_max,
+        }
+
+
+# =========================
+# Stage functions
+# =========================
+def load_stage(symbol_obj, levels_map=None, bars=None):
+    """Candle file → (result, df, levels); df is None when the symbol is done."""
+    sym = symbol_obj.get("tsym")
+    result = {"symbol": sym, "exch": symbol_obj.get("exch", "NSE"), "status": "unknown"}
+
+    df = bs.load_live_5min(sym, bars=bars)
+    if df is None or df.empty:
+        result.update({"status": "no_live_data", "emsg": "Tick data missing. Run tick_engine_worker.py"})
+        return result, None, None
+
+    if len(df) < 2:
+        result.update({"status": "not_enough_candles",
+                       "emsg": f"Need at least 2 candles (TPSeries + Live). Found {len(df)}"})
+        return result, None, None
+
+    df = bs.tz_normalize_df(df)
+    if df.empty:
+        result.update({"status": "invalid_live_data"})
+        return result, None, None
+
+    # daily levels are only used when they describe this exact last bar
+    levels = (levels_map or {}).get(norm_symbol(sym))
+    if not levels_match(levels, df):
+        levels = None
+
+    return result, df, levels
+
+
+def compute_stage(df, settings, levels=None):
+    """Runs in a worker process."""
+    return bs.generate_signal_for_df(df, settings, levels=levels)
+
+
+def decide_stage(r, ob_list, place_orders):
+    """Order request dict, or a final {"symbol", "response"} skip record."""
+    if not (r.get("status") == "ok" and r.get("signal") in ["BUY", "SELL"] and place_orders):
+        return None, {"symbol": r.get("symbol"), "response": {"stat": "Skipped", "emsg": "No signal or disabled"}}
+
+    if r.get("skip_due_to_gap", False):
+        gap_pct = float(r.get("gap_pct", 0))
+        print(f"⏸ Skipping {r['symbol']} due to {gap_pct:.2f}% gap (>1.0%)")
+        return None, {"symbol": r["symbol"], "response": {"stat": "Skipped", "emsg": f"Gap {gap_pct:.2f}% > 1.0%"}}
+
+    open_orders = [
+        o for o in ob_list if isinstance(o, dict)
+        and (o.get("trading_symbol") == r["symbol"] or o.get("tsym") == r["symbol"])
+        and (o.get("status") in ["OPEN", "PENDING", "TRIGGER PENDING"])
+    ]
+    if open_orders:
+        return None, {"symbol": r["symbol"], "response": {"stat": "Skipped", "emsg": "Open order exists"}}
+
+    return {"symbol": r["symbol"], "side": r["signal"], "qty": r.get("suggested_qty", 1)}, None
+
+
+def route_stage(order):
+    res = requests.post(ORDER_URL, json=order, timeout=5)
+    return {"symbol": order["symbol"], "response": res.json()}
+
+
+# =========================
+# Pipeline
+# =========================
+async def _run(ps_api, symbols_with_tokens, settings, place_orders, levels_map=None, bars=None):
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    if bars is None:
+        bars = required_bars(settings)    # warm-up window, planned once per run
+
+    names = ["load", "compute", "decide", "route"]
+    metrics = {n: StageMetrics(n) for n in names}
+    q_compute = asyncio.Queue(QUEUE_SIZE)
+    q_decide = asyncio.Queue(QUEUE_SIZE)
+    q_route = asyncio.Queue(QUEUE_SIZE)
+    q_symbols = asyncio.Queue()
+    for s in symbols_with_tokens:
+        q_symbols.put_nowait(s)
+
+    results = []
+
+    # order book fetched once, concurrently with loading
+    async def fetch_book():
+        try:
+            ob_raw = await asyncio.to_thread(ps_api.order_book)
+            return bs.resp_to_status_and_list(ob_raw)[1]
+        except Exception as e:
+            print(f"⚠️ order book fetch failed: {e}")
+            return []
+    book_task = asyncio.create_task(fetch_book())
+
+    async def timed(stage, coro):
+        t0 = time.perf_counter()
+        try:
+            return await coro
+        except Exception:
+            metrics[stage].errors += 1
+            raise
+        finally:
+            metrics[stage].busy_secs += time.perf_counter() - t0
+            metrics[stage].items += 1
+
+    async def loader():
+        while not q_symbols.empty():
+            sym = q_symbols.get_nowait()
+            try:
+                result, df, levels = await timed("load", asyncio.to_thread(load_stage, sym, levels_map, bars))
+            except Exception as e:
+                results.append({"symbol": sym.get("tsym"), "response": {"stat": "Error", "emsg": str(e)}})
+                continue
+            if df is None:
+                results.append({"symbol": result["symbol"], "response": {"stat": "Skipped", "emsg": result["status"]}})
+                continue
+            await q_compute.put((result, df, levels))
+            metrics["compute"].observe_queue(q_compute)
+
+    async def computer():
+        while True:
+            item = await q_compute.get()
+            if item is None:
+                return
+            result, df, levels = item
+            try:
+                if pool is not None:
+                    fut = loop.run_in_executor(pool, compute_stage, df, settings, levels)
+                else:
+                    fut = asyncio.to_thread(compute_stage, df, settings, levels)
+                sig = await timed("compute", fut)
+            except Exception as e:
+                results.append({"symbol": result["symbol"], "response": {"stat": "Error", "emsg": str(e)}})
+                continue
+            if sig is None:
+                result.update({"status": "no_signal"})
+            else:
+                result.update(sig)
+                result.update({"status": "ok"})
+            await q_decide.put(result)
+            metrics["decide"].observe_queue(q_decide)
+
+    async def decider():
+        ob_list = await book_task
+        while True:
+            r = await q_decide.get()
+            if r is None:
+                return
+            t0 = time.perf_counter()
+            order, final = decide_stage(r, ob_list, place_orders)
+            metrics["decide"].busy_secs += time.perf_counter() - t0
+            metrics["decide"].items += 1
+            if final is not None:
+                results.append(final)
+            else:
+                await q_route.put(order)
+                metrics["route"].observe_queue(q_route)
+
+    async def router():
+        while True:
+            order = await q_route.get()
+            if order is None:
+                return
+            try:
+                results.append(await timed("route", asyncio.to_thread(route_stage, order)))
+            except Exception as e:
+                results.append({"symbol": order["symbol"], "response": {"stat": "Error", "emsg": str(e)}})
+
+    n_compute = int(os.environ.get("SCREENER_PROCS", os.cpu_count() or 2)) or 4
+    t_start = time.perf_counter()
+
+    loaders = [asyncio.create_task(loader()) for _ in range(LOAD_WORKERS)]
+    computers = [asyncio.create_task(computer()) for _ in range(n_compute)]
+    deciders = [asyncio.create_task(decider())]
+    routers = [asyncio.create_task(router()) for _ in range(ROUTE_WORKERS)]
+
+    # shut stages down in order: each one drains before the next gets sentinels
+    await asyncio.gather(*loaders)
+    for _ in computers:
+        await q_compute.put(None)
+    await asyncio.gather(*computers)
+    for _ in deciders:
+        await q_decide.put(None)
+    await asyncio.gather(*deciders)
+    for _ in routers:
+        await q_route.put(None)
+    await asyncio.gather(*routers)
+
+    wall = time.perf_counter() - t_start
+    stage_stats = [metrics[n].as_dict(wall) for n in names]
+    return results, {"symbols": len(symbols_with_tokens), "wall_secs": round(wall, 3), "stages": stage_stats}
+
+
+def run_pipeline(ps_api, symbols_with_tokens, settings, place_orders=False, levels_map=None,
+                 bars=None):
+    """
+    Sync entry point → (results, metrics). Call from a thread without a running loop.
+    levels_map: {normalized symbol: daily levels dict} from the tick engine snapshot.
+    bars: warm-up window (default: required_bars(settings)).
+    """
+    return asyncio.run(_run(ps_api, symbols_with_tokens, settings, place_orders, levels_map, bars))
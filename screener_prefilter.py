@@ -0,0 +1,196 @@
+# screener_prefilter.py
+"""
+Cheap universe-wide pre-filter before the indicator stage.
+
+The tick engine keeps a compact per-symbol daily snapshot
+(live_candles/_daily_snapshot.json), written from its DailyLevelsTable:
+  day_open / day_high / day_low / prev H/L/C / last / bar time
+  + max single-bar range % and max two-bar move % of the day
+
+prefilter_snapshot() applies the day-level rejections of
+generate_signal_for_df to the whole universe in one vectorized pass:
+  - day volatility below the time-of-day threshold
+  - day move from open > 1.5 %
+  - gap from previous close > 1.0 %
+Only survivors are loaded and run through TRM/MACD/PAC/ATR.
+"""
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from daily_levels import levels_from_frame
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_FILE = os.path.join(BASE_DIR, "live_candles", "_daily_snapshot.json")
+
+# ignore a snapshot the tick engine stopped updating
+SNAPSHOT_MAX_AGE_SECS = 60
+
+DAY_MOVE_MAX_PCT = 1.5
+GAP_MAX_PCT = 1.0
+INTRADAY_BAR_MAX_PCT = 1.3
+INTRADAY_TWO_BAR_MAX_PCT = 2.0
+
+# (start_min, end_min, end_inclusive, min day volatility %) — first match wins
+VOL_THRESHOLDS = [
+    (9 * 60 + 15, 9 * 60 + 20, False, 1.60),
+    (9 * 60 + 20, 10 * 60, False, 1.80),
+    (10 * 60, 11 * 60, False, 2.00),
+    (11 * 60, 12 * 60, False, 2.20),
+    (12 * 60, 13 * 60, False, 2.40),
+    (13 * 60, 14 * 60, False, 2.80),
+    (14 * 60, 14 * 60 + 45, True, 2.80),
+    (14 * 60 + 45, 15 * 60 + 25, True, 2.60),
+]
+VOL_THRESHOLD_DEFAULT = 1.0
+
+
+def norm_symbol(sym):
+    return str(sym).upper().replace("-EQ", "").strip()
+
+
+# =========================
+# Time-of-day volatility threshold
+# =========================
+def vol_threshold_at(t):
+    """Minimum day volatility % for a candle starting at time `t`."""
+    m = t.hour * 60 + t.minute + t.second / 60
+    for start, end, inclusive, thr in VOL_THRESHOLDS:
+        if start <= m and (m <= end if inclusive else m < end):
+            return thr
+    return VOL_THRESHOLD_DEFAULT
+
+
+def vol_thresholds(minutes):
+    """Vectorized vol_threshold_at over minutes-of-day."""
+    m = np.asarray(minutes, dtype="float64")
+    conds = [(start <= m) & ((m <= end) if inclusive else (m < end))
+             for start, end, inclusive, _ in VOL_THRESHOLDS]
+    return np.select(conds, [thr for *_, thr in VOL_THRESHOLDS], default=VOL_THRESHOLD_DEFAULT)
+
+
+# =========================
+# Snapshot (tick engine side)
+# =========================
+def daily_snapshot_row(df):
+    """Compact daily snapshot of one symbol's candle frame (IST datetimes)."""
+    return levels_from_frame(df)
+
+
+def save_snapshot(rows, path=SNAPSHOT_FILE):
+    """Atomic write: {"updated": epoch, "symbols": {SYM: row}}."""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"updated": time.time(), "symbols": rows}, f)
+    os.replace(tmp, path)
+
+
+def load_snapshot(path=SNAPSHOT_FILE, max_age=SNAPSHOT_MAX_AGE_SECS):
+    """Snapshot as a DataFrame indexed by normalized symbol (empty if missing/stale)."""
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except Exception:
+        return pd.DataFrame()
+
+    if max_age is not None and time.time() - float(data.get("updated", 0)) > max_age:
+        return pd.DataFrame()
+
+    df = pd.DataFrame.from_dict(data.get("symbols", {}), orient="index")
+    if not df.empty:
+        df.index = [norm_symbol(s) for s in df.index]
+    return df
+
+
+# =========================
+# Vectorized pre-filter
+# =========================
+def prefilter_snapshot(snap):
+    """
+    Boolean rejection columns for every symbol in the snapshot:
+      skip_vol, skip_day_move, skip_gap, would_skip_intraday, reject
+    """
+    out = pd.DataFrame(index=snap.index)
+    if snap.empty:
+        return out
+
+    low = snap["day_low"].to_numpy(dtype="float64")
+    high = snap["day_high"].to_numpy(dtype="float64")
+    day_open = snap["day_open"].to_numpy(dtype="float64")
+    last = snap["last"].to_numpy(dtype="float64")
+    prev_close = pd.to_numeric(snap["prev_close"], errors="coerce").to_numpy(dtype="float64")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        volatility = np.where(low > 0, (high - low) / low * 100, 0.0)
+        day_move = (last - day_open) / day_open * 100
+        gap = np.where(prev_close > 0, (day_open - prev_close) / prev_close * 100, 0.0)
+
+    out["volatility"] = volatility
+    out["vol_threshold"] = vol_thresholds(snap["last_minute"])
+    out["skip_vol"] = volatility < out["vol_threshold"].to_numpy()
+    out["skip_day_move"] = np.abs(np.nan_to_num(day_move)) > DAY_MOVE_MAX_PCT
+    out["skip_gap"] = np.abs(np.nan_to_num(gap)) > GAP_MAX_PCT
+
+    # informational: generate_signal_for_df logs this check but does not
+    # reject on it, so it is counted, not pruned
+    out["would_skip_intraday"] = (
+        (snap["max_range_pct"].to_numpy(dtype="float64") >= INTRADAY_BAR_MAX_PCT)
+        | (snap["max_two_bar_pct"].to_numpy(dtype="float64") >= INTRADAY_TWO_BAR_MAX_PCT)
+    )
+
+    out["reject"] = out["skip_vol"] | out["skip_day_move"] | out["skip_gap"]
+    return out
+
+
+def prefilter_symbols(symbols_with_tokens, snap=None):
+    """
+    Split the universe into survivors and pruned symbols.
+    Symbols missing from the snapshot always survive.
+    → (survivors, pruned_results, counters)
+    """
+    if snap is None:
+        snap = load_snapshot()
+
+    counters = {
+        "universe": len(symbols_with_tokens),
+        "in_snapshot": 0,
+        "pruned_vol": 0,
+        "pruned_day_move": 0,
+        "pruned_gap": 0,
+        "would_skip_intraday": 0,
+        "pruned": 0,
+        "survivors": len(symbols_with_tokens),
+    }
+    if snap.empty:
+        return symbols_with_tokens, [], counters
+
+    keys = [norm_symbol(s.get("tsym")) for s in symbols_with_tokens]
+    snap = snap[~snap.index.duplicated(keep="last")]
+    snap = snap.loc[snap.index.intersection(keys)]
+    flags = prefilter_snapshot(snap)
+
+    counters["in_snapshot"] = len(flags)
+    if not flags.empty:
+        counters["pruned_vol"] = int(flags["skip_vol"].sum())
+        counters["pruned_day_move"] = int(flags["skip_day_move"].sum())
+        counters["pruned_gap"] = int(flags["skip_gap"].sum())
+        counters["would_skip_intraday"] = int(flags["would_skip_intraday"].sum())
+
+    rejected = set(flags.index[flags["reject"]]) if not flags.empty else set()
+    survivors, pruned = [], []
+    for s, key in zip(symbols_with_tokens, keys):
+        if key not in rejected:
+            survivors.append(s)
+            continue
+        f = flags.loc[key]
+        why = [name for name, col in (("volatility", "skip_vol"), ("day move", "skip_day_move"),
+                                      ("gap", "skip_gap")) if f[col]]
+        pruned.append({"symbol": s.get("tsym"),
+                       "response": {"stat": "Skipped", "emsg": f"prefilter: {', '.join(why)}"}})
+
+    counters["pruned"] = len(pruned)
+    counters["survivors"] = len(survivors)
+    return survivors, pruned, counters
@@ -23,6 +23,8 @@ if params.get("healthz") == ["1"]:
 
 import pandas as pd
 from prostocks_connector import ProStocksAPI
+from conflating_queue import ConflatingTickQueue
+from trading_calendar import get_calendar
 from dashboard_logic import load_settings, save_settings, load_credentials
 from datetime import datetime, timedelta
 import calendar
@@ -383,45 +385,11 @@ with tab5:
         if key not in st.session_state:
             st.session_state[key] = default
 
-    # --- Define Indian market holidays (with Muhurat session fix) ---
-    # --- Define Indian market holidays (with Muhurat Trading exception) ---
-    full_holidays = pd.to_datetime([
-        "2025-02-26","2025-03-14","2025-03-31","2025-04-10","2025-04-14",
-        "2025-04-18","2025-05-01","2025-08-15","2025-08-27",
-        "2025-10-02","2025-10-22","2025-11-05","2025-12-25"  # 21 Oct removed
-    ]).normalize()
-
-    holiday_breaks = []
-
-    # --- Standard full-day holidays (skip entire trading hours) ---
-    for h in full_holidays:
-        start = h + pd.Timedelta(hours=9, minutes=15)
-        end   = h + pd.Timedelta(hours=15, minutes=30)
-        holiday_breaks.append(dict(bounds=[start, end]))
-
-    # --- Global non-trading hours (daily) ---
-    holiday_breaks.append(dict(bounds=["sat", "mon"]))  # weekend
-    holiday_breaks.append(dict(bounds=[15.5, 9.25], pattern="hour"))  # 15:30–09:15 off-hours
-
-    # --- Special case: Muhurat Day (21-Oct-2025) ---
-    # Normally market off, but allow 13:45–14:45 only
-    muhurat_day = pd.Timestamp("2025-10-21").tz_localize("Asia/Kolkata")
-
-    # Skip entire day except 13:45–14:45
-    # Before 13:45
-    holiday_breaks.append(dict(
-        bounds=[
-            muhurat_day.replace(hour=9, minute=15),
-            muhurat_day.replace(hour=13, minute=45)
-        ]
-    ))
-    # After 14:45
-    holiday_breaks.append(dict(
-        bounds=[
-            muhurat_day.replace(hour=14, minute=45),
-            muhurat_day.replace(hour=15, minute=30)
-        ]
-    ))
+    # --- Market calendar rangebreaks (weekends, off-hours, holidays, Muhurat) ---
+    # built once per session from the shared trading calendar
+    if "rangebreaks_obj" not in st.session_state:
+        st.session_state["rangebreaks_obj"] = get_calendar().plotly_rangebreaks()
+    rangebreaks = st.session_state["rangebreaks_obj"]
 
 
     # Guard clause
@@ -548,9 +516,21 @@ with tab5:
         st.success(f"Interval saved: {selected_interval} min")
 
     # --- Shared UI Queue ---
-    ui_queue = st.session_state.setdefault("ui_queue", queue.Queue())
+    # bounded, oldest dropped when full; not conflated: the live candle's
+    # high / low are built from every tick drained
+    ui_queue = st.session_state.setdefault("ui_queue", ConflatingTickQueue(conflate=False))
     ui_queue = st.session_state.ui_queue
 
+    # --- Indicator / figure cache (survives reruns) ---
+    from indicator_cache import IndicatorCache, make_key, data_version
+    indicator_cache = st.session_state.setdefault("indicator_cache", IndicatorCache())
+
+    def ohlc_version():
+        return data_version(
+            st.session_state.ohlc_x, st.session_state.ohlc_o, st.session_state.ohlc_h,
+            st.session_state.ohlc_l, st.session_state.ohlc_c
+        )
+
     # --- Placeholders ---
     placeholder_status = st.empty()
     placeholder_ticks = st.empty()
@@ -661,12 +641,11 @@ with tab5:
 
         exch, token = selected_symbol_key.split("|")
 
-        df_raw = ps_api.fetch_full_tpseries(
-            exch,
-            token,
-            interval=selected_interval,
-            max_days=5
-        )
+        # 1-minute history is fetched once per symbol; every interval is
+        # resampled locally (09:15-anchored), so switching costs no broker call
+        from candle_resampler import MinuteBarStore
+        minute_store = st.session_state.setdefault("minute_store", MinuteBarStore(max_days=5))
+        df_raw = minute_store.bars(ps_api, exch, token, selected_interval)
 
         df, err = normalize_tpseries(df_raw)
 
@@ -675,49 +654,16 @@ with tab5:
             st.stop()
 
         # Load into chart
+        # (indicators are computed once, from the cache, at render time below)
         load_history_into_state(df)
         st.success(f" Loaded TPSeries candles: {len(df)}")
 
-        # === Apply TRM + PAC + ATR + MACD immediately on TPSeries load ===
-        from tkp_trm_chart import (
-            calc_tkp_trm, calc_pac, calc_macd, calc_atr_trails,
-            get_trm_settings_safe
-        )
-
-        settings = get_trm_settings_safe()
-        df_trm = df.copy()
-
-        df_trm = calc_tkp_trm(df_trm, settings)
-        df_trm = calc_pac(df_trm, settings)
-        df_trm = calc_atr_trails(df_trm, settings)
-        df_trm = calc_macd(df_trm, settings)
-
-        # Replace internal df_live so that next chart render shows correct indicators
-        df_live = df_trm
-
-        # Manage holidays + rangebreaks
-        if "holiday_values" not in st.session_state or "holiday_breaks" not in st.session_state:
-            holiday_values = [pd.Timestamp(h).to_pydatetime().replace(tzinfo=None) for h in full_holidays]
-            holiday_breaks = []
-            for h in full_holidays:
-                start = pd.Timestamp(h).tz_localize("Asia/Kolkata").replace(hour=9, minute=15)
-                end   = pd.Timestamp(h).tz_localize("Asia/Kolkata").replace(hour=15, minute=30)
-                holiday_breaks.append(dict(
-                    bounds=[start.to_pydatetime().replace(tzinfo=None),
-                            end.to_pydatetime().replace(tzinfo=None)]
-                ))
-            st.session_state.holiday_values = holiday_values
-            st.session_state.holiday_breaks = holiday_breaks
-        else:
-            holiday_values = st.session_state.holiday_values
-            holiday_breaks = st.session_state.holiday_breaks
-
         # Apply styling to X-axis
         st.session_state.live_fig.update_xaxes(
             showgrid=True, gridwidth=0.5, gridcolor="gray",
             type="date", tickformat="%d-%m-%Y\n%H:%M", tickangle=0,
             rangeslider_visible=False,
-            rangebreaks=[dict(bounds=["sat","mon"]), dict(bounds=[15.5,9.25], pattern="hour"), *holiday_breaks]
+            rangebreaks=rangebreaks
         )
 
     else:
@@ -767,46 +713,32 @@ with tab5:
 
             # Convert history → Lightweight format
             # === Build Indicator DataFrame ===
-            from tkp_trm_chart import (
-                calc_tkp_trm, calc_pac, calc_macd, calc_atr_trails,
-                get_trm_settings_safe
-            )
-
-            df_live = pd.DataFrame({
-                "datetime": pd.to_datetime(st.session_state.ohlc_x),
-                "open": st.session_state.ohlc_o,
-                "high": st.session_state.ohlc_h,
-                "low": st.session_state.ohlc_l,
-                "close": st.session_state.ohlc_c
-            })
+            from tkp_trm_chart import get_trm_settings_safe
+            from indicator_graph import TRM_GRAPH
 
             settings = get_trm_settings_safe()
-            if settings:
-                df_live = calc_tkp_trm(df_live, settings)
-                df_live = calc_pac(df_live, settings)
-                df_live = calc_atr_trails(df_live, settings)
-                df_live = calc_macd(df_live, settings)
 
-            # ----------------------------------------
-            # ⭐ ADD YESTERDAY HIGH/LOW HERE
-            # ----------------------------------------
-            df_live = df_live.sort_values("datetime")
-            df_live["date"] = df_live["datetime"].dt.date
+            # indicator nodes shared with the TRM figure via indicator_cache
+            graph_key = (selected_symbol_key, selected_interval)
 
-            # Group by date → Yesterday's high/low (shift by 1 day)
-            yhl = df_live.groupby("date").agg({"high": "max", "low": "min"}).shift(1)
+            def build_indicator_frame():
+                df_live = pd.DataFrame({
+                    "datetime": pd.to_datetime(st.session_state.ohlc_x),
+                    "open": st.session_state.ohlc_o,
+                    "high": st.session_state.ohlc_h,
+                    "low": st.session_state.ohlc_l,
+                    "close": st.session_state.ohlc_c
+                }).sort_values("datetime")
 
-            # Join to main dataframe
-            df_live = df_live.join(yhl, on="date", rsuffix="_yest")
-
-            # Rename for JS
-            df_live["high_yest"] = df_live["high_yest"]
-            df_live["low_yest"]  = df_live["low_yest"]
-
-            # Clean up
-            df_live = df_live.drop(columns=["date"])
-            # ----------------------------------------
+                want = ["high_yest", "low_yest"]   # ⭐ Yesterday high/low
+                if settings:
+                    want += ["trm_signal", "pacC", "pacL", "pacU", "Trail1", "Trail2",
+                             "macd", "macd_signal", "macd_hist"]
+                df_live = TRM_GRAPH.frame(df_live, settings, want,
+                                          memo=indicator_cache, key=graph_key)
 
+                # Clean up
+                return df_live.drop(columns=["date"])
 
             # === Convert to JSON for JS (TradingView chart) ===
             import math
@@ -821,27 +753,38 @@ with tab5:
                     pass
                 return v
 
-            history = []
-            for _, r in df_live.iterrows():
-                history.append({
-                    "time": int(pd.Timestamp(r["datetime"]).timestamp()),
-                    "open": float(r["open"]),
-                    "high": float(r["high"]),
-                    "low": float(r["low"]),
-                    "close": float(r["close"]),
-                    "pacU": clean(r.get("pacU")),
-                    "pacL": clean(r.get("pacL")),
-                    "pacC": clean(r.get("pacC")),
-                    "Trail1": clean(r.get("Trail1")),
-                    "Trail2": clean(r.get("Trail2")),
-                    "macd": clean(r.get("macd")),
-                    "macd_signal": clean(r.get("macd_signal")),
-                    "macd_hist": clean(r.get("macd_hist")),
-                    "trm_signal": r.get("trm_signal", "Neutral"),
-                    "high_yest": clean(r.get("high_yest")),
-                    "low_yest": clean(r.get("low_yest")),
-                    "day_volatility": clean(r.get("day_move_pct"))
-                })
+            def build_history():
+                df_live = indicator_cache.get_or_compute(
+                    make_key("frame", selected_symbol_key, selected_interval, ohlc_version(), settings),
+                    build_indicator_frame
+                )
+                history = []
+                for _, r in df_live.iterrows():
+                    history.append({
+                        "time": int(pd.Timestamp(r["datetime"]).timestamp()),
+                        "open": float(r["open"]),
+                        "high": float(r["high"]),
+                        "low": float(r["low"]),
+                        "close": float(r["close"]),
+                        "pacU": clean(r.get("pacU")),
+                        "pacL": clean(r.get("pacL")),
+                        "pacC": clean(r.get("pacC")),
+                        "Trail1": clean(r.get("Trail1")),
+                        "Trail2": clean(r.get("Trail2")),
+                        "macd": clean(r.get("macd")),
+                        "macd_signal": clean(r.get("macd_signal")),
+                        "macd_hist": clean(r.get("macd_hist")),
+                        "trm_signal": r.get("trm_signal", "Neutral"),
+                        "high_yest": clean(r.get("high_yest")),
+                        "low_yest": clean(r.get("low_yest")),
+                        "day_volatility": clean(r.get("day_move_pct"))
+                    })
+                return history
+
+            history = indicator_cache.get_or_compute(
+                make_key("history", selected_symbol_key, selected_interval, ohlc_version(), settings),
+                build_history
+            )
 
 
             # Selected token
@@ -998,10 +941,12 @@ with tab5:
                 elif msg_type == "ws_error":
                     placeholder_status.error(f"WS start error: {payload}")
 
+        q_stats = ui_queue.stats() if hasattr(ui_queue, "stats") else {}
         placeholder_status.info(
             f"WS started: {st.session_state.get('ws_started', False)} | "
             f"symbols: {len(st.session_state.get('symbols_for_ws', []))} | "
             f"queue: {ui_queue.qsize()} | processed: {processed} | "
+            f"conflated: {q_stats.get('conflated', 0)} | dropped: {q_stats.get('dropped', 0)} | "
             f"display_len: {len(st.session_state.ohlc_x)}"
         )
         if "last_heartbeat" in st.session_state:
@@ -1027,63 +972,48 @@ with tab5:
     if st.button(" Show TRM + MACD Indicators"):
 
         if len(st.session_state.ohlc_x) >= 50:
-            # 1) Convert session_state → DataFrame
-            df_live = pd.DataFrame({
-                "datetime": pd.to_datetime(st.session_state.ohlc_x),
-                "open": st.session_state.ohlc_o,
-                "high": st.session_state.ohlc_h,
-                "low": st.session_state.ohlc_l,
-                "close": st.session_state.ohlc_c
-            })
-
-            # Timezone normalize (IST) + make tz-naive
-            if df_live["datetime"].dt.tz is None:
-                df_live["datetime"] = df_live["datetime"].dt.tz_localize("Asia/Kolkata")
-            else:
-                df_live["datetime"] = df_live["datetime"].dt.tz_convert("Asia/Kolkata")
-            df_live["datetime"] = df_live["datetime"].apply(lambda x: x.replace(tzinfo=None))
-
-            # Clean and sort
-            df_live = (
-                df_live.drop_duplicates(subset="datetime")
-                       .sort_values("datetime")
-                       .reset_index(drop=True)
-            )
 
-            # Build/restore rangebreaks for holidays + weekends + off hours
-            if "holiday_values" not in st.session_state or "holiday_breaks" not in st.session_state:
-                holiday_values = [
-                    pd.Timestamp(h).tz_localize("Asia/Kolkata").date().isoformat()
-                    for h in full_holidays
-                ]
-                holiday_breaks = []
-                for h in full_holidays:
-                    start = pd.Timestamp(h).tz_localize("Asia/Kolkata").replace(hour=9, minute=15)
-                    end   = pd.Timestamp(h).tz_localize("Asia/Kolkata").replace(hour=15, minute=30)
-                    start_naive = start.tz_convert(None)
-                    end_naive   = end.tz_convert(None)
-                    holiday_breaks.append(dict(bounds=[start_naive, end_naive]))
-
-                st.session_state.holiday_values = holiday_values
-                st.session_state.holiday_breaks = holiday_breaks
-            else:
-                holiday_breaks = st.session_state.holiday_breaks
+            # Load TRM settings & render indicator figure (cached per data version)
+            settings = get_trm_settings_safe()
 
-            rangebreaks = [
-                dict(bounds=["sat", "mon"]),                # weekends skip
-                dict(bounds=[15.5, 9.25], pattern="hour"),  # non-market time skip
-                *holiday_breaks                              # holidays skip
-            ]
-            st.session_state["rangebreaks_obj"] = rangebreaks
+            def build_trm_figure():
+                # 1) Convert session_state → DataFrame
+                df_live = pd.DataFrame({
+                    "datetime": pd.to_datetime(st.session_state.ohlc_x),
+                    "open": st.session_state.ohlc_o,
+                    "high": st.session_state.ohlc_h,
+                    "low": st.session_state.ohlc_l,
+                    "close": st.session_state.ohlc_c
+                })
 
-            # Load TRM settings & render indicator figure
-            settings = get_trm_settings_safe()
-            fig_trm = plot_trm_chart(
-                df_live,
-                settings,
-                rangebreaks=rangebreaks,
-                fig=None,
-                show_macd_panel=True
+                # Timezone normalize (IST) + make tz-naive
+                if df_live["datetime"].dt.tz is None:
+                    df_live["datetime"] = df_live["datetime"].dt.tz_localize("Asia/Kolkata")
+                else:
+                    df_live["datetime"] = df_live["datetime"].dt.tz_convert("Asia/Kolkata")
+                df_live["datetime"] = df_live["datetime"].apply(lambda x: x.replace(tzinfo=None))
+
+                # Clean and sort
+                df_live = (
+                    df_live.drop_duplicates(subset="datetime")
+                           .sort_values("datetime")
+                           .reset_index(drop=True)
+                )
+
+                return plot_trm_chart(
+                    df_live,
+                    settings,
+                    rangebreaks=rangebreaks,
+                    fig=None,
+                    show_macd_panel=True,
+                    lod=True,
+                    memo=indicator_cache,
+                    memo_key=(selected_symbol_key, selected_interval)
+                )
+
+            fig_trm = indicator_cache.get_or_compute(
+                make_key("figure", selected_symbol_key, selected_interval, ohlc_version(), settings),
+                build_trm_figure
             )
 
             trm_placeholder.plotly_chart(fig_trm, use_container_width=True)
@@ -0,0 +1,151 @@
+# tick_aggregator.py
+"""
+Multi-interval OHLCV aggregation of live ticks (ProStocksAPI).
+
+One running candle per (key, interval), updated in place: a tick costs a
+bucket compare and max / min / add per interval, whatever the number of
+ticks already in the candle. When a tick opens a new bucket the previous
+candle is closed:
+
+  - appended to a bounded history ring (deque, max_candles per key+interval)
+  - handed to on_close(key, interval, candle) — only the new bar, no frame
+    rebuilt from the history
+
+  key        "EXCH|TOKEN" (int id of a TokenRegistry internally)
+  candle     market_records.Candle (time = bucket epoch, open … volume);
+             history() / current() hand out dicts
+
+Ticks older than the running bucket of the finest interval (late /
+replayed) are counted and dropped, a closed candle is never rewritten.
+
+add_batch(keys, ticks) folds a tick_batch micro-batch (one vectorized
+fold per interval, then one merge per symbol and bucket).
+"""
+import threading
+from collections import deque
+
+import numpy as np
+
+from market_records import Candle, TokenRegistry
+from tick_batch import fold_ticks, group_rows
+
+DEFAULT_INTERVALS = (1, 3, 5, 15, 30, 60)
+MAX_CANDLES = 500
+
+
+class TickAggregator:
+    """
+    agg = TickAggregator(on_close=lambda key, m, candle: ...)
+    agg.add(key, ts, price, volume)
+    agg.history(key, 5)[-10:]     # closed 5m candles
+    agg.current(key, 5)           # running 5m candle
+    """
+
+    def __init__(self, intervals=DEFAULT_INTERVALS, max_candles=MAX_CANDLES, on_close=None):
+        self.intervals = tuple(sorted({int(m) for m in intervals}))
+        self._steps = tuple(m * 60 for m in self.intervals)
+        self.max_candles = max_candles
+        self.on_close = on_close
+        self.tokens = TokenRegistry()
+        self.running = []        # token id → [Candle | None per interval]
+        self._rings = []         # token id → [deque | None per interval]
+        self.closed = {}         # "EXCH|TOKEN|interval" → deque of closed candles (same deques)
+        self._lock = threading.Lock()
+        self.stats = {"ticks": 0, "closed": 0, "late": 0}
+
+    def _slot(self, tid):
+        """Running candles of a token id (grows the per-id lists on first use)."""
+        while len(self.running) <= tid:
+            self.running.append([None] * len(self.intervals))
+            self._rings.append([None] * len(self.intervals))
+        return self.running[tid]
+
+    def _ring(self, tid, i):
+        ring = self._rings[tid][i]
+        if ring is None:
+            ring = self._rings[tid][i] = deque(maxlen=self.max_candles)
+            self.closed[f"{self.tokens.key_of(tid)}|{self.intervals[i]}"] = ring
+        return ring
+
+    def add(self, key, ts, price, volume=0):
+        """Fold one tick into every interval → [(interval, closed candle)]."""
+        return self.add_id(self.tokens.id_of(key), ts, price, volume)
+
+    def add_id(self, tid, ts, price, volume=0):
+        closed = []
+        with self._lock:
+            runs = self.running[tid] if tid < len(self.running) else self._slot(tid)
+            first = runs[0]
+            if first is not None and ts - ts % self._steps[0] < first.time:
+                self.stats["late"] += 1
+                return closed
+            self.stats["ticks"] += 1
+
+            for i, step in enumerate(self._steps):
+                bucket = ts - ts % step
+                run = runs[i]
+                if run is None or bucket > run.time:
+                    if run is not None:
+                        self._ring(tid, i).append(run)
+                        closed.append((self.intervals[i], run))
+                    runs[i] = Candle(bucket, price, price, price, price, volume)
+                elif bucket == run.time:
+                    run.add(price, volume)
+            self.stats["closed"] += len(closed)
+
+        if self.on_close is not None and closed:
+            key = self.tokens.key_of(tid)
+            for m, candle in closed:
+                try:
+                    self.on_close(key, m, candle)
+                except Exception as e:
+                    print("❌ on_new_candle error:", e)
+        return closed
+
+    def add_batch(self, keys, ticks):
+        """
+        Fold a TICK_DTYPE micro-batch → [(key, interval, closed candle)].
+        Record ids index `keys`; a batcher sharing self.tokens skips the remap.
+        """
+        closed = []
+        ids = ticks["id"]
+        if keys is not self.tokens.keys:
+            remap = np.fromiter((self.tokens.id_of(k) for k in keys), dtype=np.int64, count=len(keys))
+            ids = remap[ids]
+        with self._lock:
+            self.stats["ticks"] += len(ticks)
+            for i, step in enumerate(self._steps):
+                groups = fold_ticks(ids, ticks["price"], ticks["volume"], ticks["ts"], step)
+                for tid, bucket, o, h, l, c, v in group_rows(groups):
+                    runs = self.running[tid] if tid < len(self.running) else self._slot(tid)
+                    run = runs[i]
+                    if run is None or bucket > run.time:
+                        if run is not None:
+                            self._ring(tid, i).append(run)
+                            closed.append((tid, self.intervals[i], run))
+                        runs[i] = Candle(bucket, o, h, l, c, v)
+                    elif bucket == run.time:
+                        run.merge(h, l, c, v)
+                    elif i == 0:
+                        self.stats["late"] += 1
+            self.stats["closed"] += len(closed)
+
+        if self.on_close is not None:
+            for tid, m, candle in closed:
+                try:
+                    self.on_close(self.tokens.key_of(tid), m, candle)
+                except Exception as e:
+                    print("❌ on_new_candle error:", e)
+        return closed
+
+    def history(self, key, interval):
+        """Closed candles (oldest first, dicts) of key at interval."""
+        return [c.as_dict() for c in self.closed.get(f"{key}|{int(interval)}", ())]
+
+    def current(self, key, interval):
+        """Running (not yet closed) candle as a dict, or None."""
+        tid = self.tokens.get(key)
+        if tid is None or tid >= len(self.running) or int(interval) not in self.intervals:
+            return None
+        run = self.running[tid][self.intervals.index(int(interval))]
+        return run.as_dict() if run is not None else None
@@ -0,0 +1,136 @@
+# tick_batch.py
+"""
+Micro-batched tick aggregation.
+
+Per-tick candle updates cost a few Python calls per tick and interval; at
+the open (thousands of ticks / s) that is what limits the WS thread. In
+batch mode the WS thread only queues the parsed tick, and every
+TICK_BATCH_MS a flusher thread copies the micro-batch into a preallocated
+record array (one C-level fill) and folds it at once:
+
+  MicroBatcher.put(key, price, volume, ts)   WS thread: one tuple append
+  fold_ticks(ids, price, volume, ts, step)   stable sort by (id, bucket),
+                                             np.maximum / minimum / add.reduceat
+                                             → one OHLCV row per (id, bucket)
+  sink(keys, ticks)                          CandleBuilder.update_batch /
+                                             TickAggregator.add_batch merge the
+                                             rows into the running candles
+
+put() takes no lock (list.append and the flusher's slice + del of the
+first n entries are each atomic under the GIL), so the WS thread keeps
+appending while a batch is folded; a record buffer too small for a batch
+is replaced by one twice the size (counted in stats).
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from market_records import TokenRegistry
+
+TICK_BATCH_MS = float(os.environ.get("TICK_BATCH_MS", 0))   # 0 = per-tick updates
+BATCH_CAPACITY = 65536
+
+TICK_DTYPE = np.dtype([("id", "i4"), ("price", "f8"), ("volume", "i8"), ("ts", "i8")])
+GROUP_FIELDS = ("id", "bucket", "open", "high", "low", "close", "volume")
+
+
+def fold_ticks(ids, price, volume, ts, step):
+    """
+    Ticks (arrival order) → {field: array} with one row per (id, bucket),
+    sorted by id then bucket; open / close are the first / last tick of the row.
+    """
+    ids = np.asarray(ids)
+    n = len(ids)
+    if n == 0:
+        return {f: np.empty(0) for f in GROUP_FIELDS}
+
+    ts = np.asarray(ts)
+    bucket = ts - ts % step
+    order = np.lexsort((bucket, ids))            # stable → arrival order within a row
+    ids_s, b_s = ids[order], bucket[order]
+    p_s, v_s = np.asarray(price)[order], np.asarray(volume)[order]
+
+    new = np.empty(n, dtype=bool)
+    new[0] = True
+    np.not_equal(ids_s[1:], ids_s[:-1], out=new[1:])
+    new[1:] |= b_s[1:] != b_s[:-1]
+    starts = np.flatnonzero(new)
+    ends = np.r_[starts[1:], n] - 1
+
+    return {
+        "id": ids_s[starts],
+        "bucket": b_s[starts],
+        "open": p_s[starts],
+        "high": np.maximum.reduceat(p_s, starts),
+        "low": np.minimum.reduceat(p_s, starts),
+        "close": p_s[ends],
+        "volume": np.add.reduceat(v_s, starts),
+    }
+
+
+def group_rows(groups):
+    """fold_ticks output → iterator of (id, bucket, open, high, low, close, volume) tuples."""
+    return zip(*(groups[f].tolist() for f in GROUP_FIELDS))
+
+
+class MicroBatcher:
+    """
+    batcher = MicroBatcher(sink, flush_ms=20).start()
+    batcher.put("NSE|2885", 2450.5, 10, 1718000000)
+
+    sink(keys, ticks): keys[i] is the key of record id i; ticks is a TICK_DTYPE
+    view that is only valid during the call. Pass the store's TokenRegistry
+    as `registry` so record ids are the store's token ids.
+    """
+
+    def __init__(self, sink, flush_ms=TICK_BATCH_MS or 20, capacity=BATCH_CAPACITY, registry=None):
+        self.sink = sink
+        self.flush_secs = flush_ms / 1000.0
+        self.registry = registry if registry is not None else TokenRegistry()
+        self.keys = self.registry.keys      # id → key
+        self._pending = []
+        self._buf = np.empty(capacity, dtype=TICK_DTYPE)
+        self._flush_lock = threading.Lock()
+        self.stats = {"ticks": 0, "batches": 0, "max_batch": 0, "grown": 0, "errors": 0}
+
+    def put(self, key, price, volume, ts):
+        i = self.registry.ids.get(key)
+        if i is None:
+            i = self.registry.id_of(key)
+        self._pending.append((i, price, volume, ts))     # atomic under the GIL
+
+    def flush(self):
+        """Fold everything buffered so far → number of ticks."""
+        with self._flush_lock:
+            # only the first n entries: the WS thread may append meanwhile
+            n = len(self._pending)
+            if n == 0:
+                return 0
+            pending = self._pending[:n]
+            del self._pending[:n]
+            st = self.stats
+            if n > len(self._buf):
+                self._buf = np.empty(max(n, 2 * len(self._buf)), dtype=TICK_DTYPE)
+                st["grown"] += 1
+            batch = self._buf[:n]
+            batch[:] = pending              # one C-level fill of the record buffer
+            st["ticks"] += n
+            st["batches"] += 1
+            st["max_batch"] = max(st["max_batch"], n)
+            try:
+                self.sink(self.keys, batch)
+            except Exception as e:
+                st["errors"] += 1
+                print("❌ tick batch fold error:", e)
+            return n
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_secs)
+            self.flush()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
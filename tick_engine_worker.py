@@ -3,28 +3,42 @@
 """
 LIVE TICK ENGINE
 ----------------
-✔ Fetch TPSeries (60 days)
+✔ Fetch TPSeries (warm-up window of the TRM settings)
 ✔ Subscribe ProStocks WS ticks for all tokens
 ✔ Build LIVE candles (1m)
 ✔ Merge TPSeries + live candle
 ✔ Save final dataframe per symbol
 ✔ Accessible to Auto Trader Worker
+✔ Checkpoint state → restart restores it + backfills only the gap
+✔ Optional NumPy micro-batching of ticks (TICK_BATCH_MS)
 """
 
-import json
 import os
 import time
 from datetime import datetime
+from functools import lru_cache
 
 import pandas as pd
 import pytz
 import requests
 
 from prostocks_connector import ProStocksAPI
+from candle_resampler import MinuteBarStore
+from trading_calendar import get_calendar
+from rescreen_scheduler import CandleEventBuffer
+from screener_prefilter import norm_symbol, save_snapshot
+from daily_levels import DailyLevelsTable
+from lookback_planner import backfill_days, required_bars, trim_to_lookback
+from trm_core import load_trm_settings_from_file
+from engine_checkpoint import CHECKPOINT_SECS, load_checkpoint, save_checkpoint
+from gap_repair import GapRepairer, detect_gaps, fetch_since, merge_gap
+from ws_supervisor import SupervisedWS
+from ws_shards import TICK_SHARDS, CumulativeVolume, ShardedTickIngest, parse_tick
+from tick_batch import TICK_BATCH_MS, MicroBatcher, fold_ticks, group_rows
+from market_records import Candle, TokenRegistry
 
-import websocket
 import threading
-from datetime import timedelta
+from collections import deque
 
 
 print("✅ Running file:", os.path.abspath(__file__))
@@ -41,11 +55,31 @@ BACKEND_URL = os.environ.get("BACKEND_URL", "https://backend-stream-nmlf.onrende
 
 IST = pytz.timezone("Asia/Kolkata")
 
+# warm-up window of the saved TRM settings (bars of 5-min candles)
+_trm_settings = load_trm_settings_from_file()
+LOOKBACK_BARS = required_bars(_trm_settings)
+
+# 1-minute history of the symbol being preloaded; 5-min candles derived locally
+minute_store = MinuteBarStore(max_days=backfill_days(_trm_settings, interval=5), refresh_secs=None)
+
 # -----------------------------------------------------------
 # 1) Load full TPSeries (backfill)
 # -----------------------------------------------------------
 def load_backfill(ps_api, exch, token, interval="1"):
-    df = ps_api.fetch_full_tpseries(exch, token, interval)
+    if str(interval) == "1":
+        df = ps_api.fetch_full_tpseries(exch, token, interval)
+    else:
+        # fetch 1m once, resample locally (09:15-anchored buckets); the copy is
+        # all cached_tp needs, so the 1m + derived frames are released right away
+        minute_store.load(ps_api, exch, token)
+        df = minute_store.get(exch, token, interval).copy()
+        minute_store.drop(exch, token)
+
+    return to_engine_frame(df)
+
+
+def to_engine_frame(df):
+    """TPSeries candles → cached_tp layout (also used for gap backfills)."""
     if df is None or isinstance(df, dict) or df.empty:
         return pd.DataFrame()
 
@@ -56,52 +90,224 @@ def load_backfill(ps_api, exch, token, interval="1"):
     df = df.sort_values("datetime")
     return df
 
+
+def backfill_gap(ps_api, exch, token, df_tp, since):
+    """cached_tp frame + only the candles since `since` (epoch), trimmed to the warm-up."""
+    df_gap = to_engine_frame(fetch_since(ps_api, exch, token, since, interval=5))
+    return trim_to_lookback(merge_gap(df_tp, df_gap), LOOKBACK_BARS)
+
 # -----------------------------------------------------------
 # 2) Build LIVE candles from ticks
 # -----------------------------------------------------------
+BUCKET_SECS = 5 * 60    # IST offset is a multiple of 5 min → epoch buckets = IST buckets
+LIVE_BARS = 75          # one session of 5-min bars per symbol
+
+
+@lru_cache(maxsize=4096)
+def _bucket_start(epoch):
+    return datetime.fromtimestamp(epoch, tz=IST)
+
+
 class CandleBuilder:
-    def __init__(self):
-        # key = (symbol, minute)
-        self.candles = {}
+    """
+    Running 5-min candles per symbol as market_records.Candle (time = bucket
+    epoch), one session of bars per symbol id; dicts with an IST "datetime"
+    only at the edges (get_latest / snapshot / restore).
+    """
+
+    def __init__(self, on_update=None, on_close=None, max_bars=LIVE_BARS):
+        # symbol ↔ int id; per id its bars, oldest first
+        self.symbols = TokenRegistry()
+        self.bars = []
+        self.max_bars = max_bars
+        self._lock = threading.Lock()
+        # event hooks: on_update(symbol, candle), on_close(symbol, closed_candle)
+        self.on_update = on_update
+        self.on_close = on_close
+
+    def _bars_of(self, symbol, create=True):
+        sid = self.symbols.get(symbol)
+        if sid is None or sid >= len(self.bars):
+            # new symbol (or registered by a batcher sharing self.symbols)
+            if not create:
+                return None
+            with self._lock:
+                sid = self.symbols.id_of(symbol)
+                while len(self.bars) <= sid:
+                    self.bars.append(deque(maxlen=self.max_bars))
+        return self.bars[sid]
+
+    @staticmethod
+    def as_dict(c):
+        return c.as_dict("datetime", _bucket_start(c.time))
 
     def update_tick(self, symbol, ltp, volume, ts):
         print("📥 TICK RECEIVED:", symbol, ltp, ts)
+        self.update_bar(symbol, ts, ltp, ltp, ltp, ltp, volume)
+        print(f"📈 TICK SAVED → {symbol} | {ltp}")
 
-        ts = datetime.fromtimestamp(ts, tz=IST)
-        minute = ts.replace(second=0, microsecond=0)
-        minute = minute - timedelta(minutes=minute.minute % 5)
-
-        key = (symbol, minute)
-
-        if key not in self.candles:
-            self.candles[key] = {
-                "datetime": minute,
-                "open": ltp,
-                "high": ltp,
-                "low": ltp,
-                "close": ltp,
-                "volume": volume
-            }
+    def update_bar(self, symbol, ts, open_, high, low, close, volume):
+        """Merge ticks aggregated within one bucket (a single tick: all prices equal)."""
+        self._fold(symbol, self._bars_of(symbol), int(ts) - int(ts) % BUCKET_SECS,
+                   open_, high, low, close, volume)
+
+    def _fold(self, symbol, bars, bucket, open_, high, low, close, volume):
+        last = bars[-1] if bars else None
+
+        if last is None or bucket > last.time:
+            # first tick of a new bucket → previous candle of this symbol closed
+            if last is not None and self.on_close:
+                self.on_close(symbol, last)
+            c = Candle(bucket, open_, high, low, close, volume)
+            bars.append(c)
+        elif bucket == last.time:
+            c = last
+            c.merge(high, low, close, volume)
         else:
-            c = self.candles[key]
-            c["high"] = max(c["high"], ltp)
-            c["low"] = min(c["low"], ltp)
-            c["close"] = ltp
-            c["volume"] += volume
-        print(f"📈 TICK SAVED → {symbol} | {ltp}")
+            # late tick of an earlier bucket still held
+            c = next((b for b in reversed(bars) if b.time == bucket), None)
+            if c is None:
+                return
+            c.merge(high, low, close, volume)
+
+        if self.on_update:
+            self.on_update(symbol, c)
+
+    def update_batch(self, symbols, ticks):
+        """
+        Fold a tick_batch micro-batch: symbols[i] is the symbol of record id i
+        (a batcher created with registry=self.symbols shares the ids).
+        One fold (and one on_update) per symbol and bucket, not per tick.
+        """
+        shared = symbols is self.symbols.keys
+        groups = fold_ticks(ticks["id"], ticks["price"], ticks["volume"], ticks["ts"], BUCKET_SECS)
+        for sid, bucket, o, h, l, c, v in group_rows(groups):
+            symbol = symbols[sid]
+            bars = self.bars[sid] if shared and sid < len(self.bars) else self._bars_of(symbol)
+            self._fold(symbol, bars, bucket, o, h, l, c, v)
+
+    def snapshot(self):
+        """Running candle per symbol (dicts) → checkpoint."""
+        out = {}
+        for symbol, bars in zip(list(self.symbols.keys), list(self.bars)):
+            if bars:
+                out[symbol] = self.as_dict(bars[-1])
+        return out
+
+    def restore(self, latest, now=None):
+        """
+        Re-seed running candles from a checkpoint. Only candles of the
+        current bucket are kept; older ones are covered by the gap backfill.
+        """
+        now = int(now or time.time())
+        bucket = now - now % BUCKET_SECS
+        kept = 0
+        for symbol, c in latest.items():
+            if int(c["datetime"].timestamp()) == bucket:
+                bars = self._bars_of(symbol)
+                bars.clear()
+                bars.append(Candle(bucket, c["open"], c["high"], c["low"], c["close"], c["volume"]))
+                kept += 1
+        return kept
+
+    def fold_bar(self, symbol, bar):
+        """
+        Merge a backfilled bar (naive IST datetime) into the live candle of the
+        same bucket — ticks missed while the WS was down.
+        """
+        bucket = int(IST.localize(pd.Timestamp(bar["datetime"]).to_pydatetime()).timestamp())
+        bars = self._bars_of(symbol, create=False)
+        c = next((b for b in reversed(bars) if b.time == bucket), None) if bars else None
+        if c is None:
+            return False
+        c.open = float(bar["open"])
+        c.high = max(c.high, float(bar["high"]))
+        c.low = min(c.low, float(bar["low"]))
+        c.volume = max(c.volume, bar.get("volume", 0) or 0)
+        return True
 
     def get_latest(self, symbol):
-        latest_keys = [k for k in self.candles.keys() if k[0] == symbol]
-        if not latest_keys:
+        bars = self._bars_of(symbol, create=False)
+        if not bars:
             return None
+        return self.as_dict(bars[-1])
+
+
+# -----------------------------------------------------------
+# Candle events → backend rescreen scheduler
+# -----------------------------------------------------------
+# closes are always forwarded; running-candle updates only for the
+# "intrabar" policy (the backend ignores them otherwise)
+RESCREEN_POLICY = os.environ.get("RESCREEN_POLICY", "close")
+candle_events = CandleEventBuffer()
 
-        latest_key = sorted(latest_keys, key=lambda x: x[1])[-1]
-        return self.candles[latest_key]
 
+def _forward_update(symbol, candle):
+    if RESCREEN_POLICY == "intrabar":
+        candle_events.add(symbol, "update", candle.close)
+
+
+def _forward_close(symbol, candle):
+    candle_events.add(symbol, "close", candle.close)
+
+
+def post_candle_events():
+    """Send buffered events (call after the candle files are written)."""
+    events = candle_events.drain()
+    if not events:
+        return
+    try:
+        requests.post(f"{BACKEND_URL}/candle_events", json={"events": events}, timeout=5)
+    except Exception as e:
+        print(f"⚠️ candle_events post failed ({len(events)} events): {e}")
 
-candle_builder = CandleBuilder()
+
+candle_builder = CandleBuilder(on_update=_forward_update, on_close=_forward_close)
 # ✅ ADD THIS
 cached_tp = {}
+# yesterday H/L/C + today's open/high/low per symbol (seeded at preload)
+daily_levels = DailyLevelsTable()
+
+
+# -----------------------------------------------------------
+# WS drop → targeted TPSeries repair of the missing span
+# -----------------------------------------------------------
+ws_state = {"disconnected_at": {}}     # shard → epoch of its last drop
+gap_repairer = None     # GapRepairer, created once ps_api exists
+ws_client = None        # SupervisedWS of start_prostocks_ws (metrics)
+
+
+def apply_gap(symbol, df_gap):
+    """GapRepairer callback: fold the repaired bars into the live + backfilled candles."""
+    for bar in df_gap.tail(2).to_dict("records"):
+        candle_builder.fold_bar(symbol, bar)
+    df_tp = cached_tp.get(symbol)
+    merged = merge_gap(df_tp, to_engine_frame(df_gap.copy()))
+    cached_tp[symbol] = trim_to_lookback(merged, LOOKBACK_BARS)
+
+
+def mark_disconnected(shard=0, at=None):
+    ws_state["disconnected_at"].setdefault(shard, at or time.time())
+
+
+def schedule_gap_repair(token_map, shard=0, shard_tokens=None):
+    """
+    On reconnect: queue every symbol (of the shard) that ticked this session
+    for the span since its last live candle (detect_gaps).
+    """
+    since = ws_state["disconnected_at"].pop(shard, None)
+    if since is None or gap_repairer is None:
+        return
+    tokens = {str(sym).upper().strip(): str(tkn).replace("NSE|", "").strip()
+              for sym, tkn in token_map.items()}
+    live = candle_builder.snapshot()
+    if shard_tokens is not None:
+        wanted = set(shard_tokens)
+        live = {sym: c for sym, c in live.items() if tokens.get(sym) in wanted}
+    gaps = detect_gaps(live, since)
+    if gaps:
+        print(f"🩹 WS #{shard} was down {time.time() - since:.0f}s → repairing {len(gaps)} symbols")
+        gap_repairer.schedule(gaps, tokens.get)
 
 
 # -----------------------------------------------------------
@@ -125,9 +331,20 @@ def save_loop(token_map):
     global cached_tp
     print("🧾 Save loop started (every 3 sec)...")
     last_merge = 0
+    calendar = get_calendar()
+    saved_after_close = False
 
     while True:
         try:
+            # market closed → one final save after the close, then idle
+            if not calendar.is_open():
+                if saved_after_close:
+                    time.sleep(30)
+                    continue
+                saved_after_close = True
+            else:
+                saved_after_close = False
+
             if time.time() - last_merge > 3:
                 last_merge = time.time()
 
@@ -161,22 +378,62 @@ def save_loop(token_map):
                             df_final.to_json(fn, orient="records", date_format="iso")
                             print(f"💾 SAVED: {fn}")
 
+                            # O(1) per new/updated bar after the first sync
+                            daily_levels.sync(norm_symbol(sym), df_final)
+
                     except Exception as e:
                         print(f"⚠️ Error saving {sym}: {e}")
 
+                # day-level snapshot for the screener pre-filter
+                try:
+                    save_snapshot(daily_levels.snapshot())
+                except Exception as e:
+                    print(f"⚠️ snapshot save failed: {e}")
+
+                # files are on disk → let the backend rescreen changed symbols
+                post_candle_events()
+
         except Exception as e:
             print(f"⚠️ save_loop error: {e}")
 
         time.sleep(1)
 
+# -----------------------------------------------------------
+# 4b) CHECKPOINT LOOP – cached_tp + running candles → local file
+# -----------------------------------------------------------
+def checkpoint_loop():
+    print(f"🧷 Checkpoint loop started (every {CHECKPOINT_SECS:.0f} sec)...")
+    calendar = get_calendar()
+    saved_after_close = False
+
+    while True:
+        time.sleep(CHECKPOINT_SECS)
+        try:
+            # market closed → one final checkpoint after the close, then idle
+            if not calendar.is_open():
+                if saved_after_close:
+                    continue
+                saved_after_close = True
+            else:
+                saved_after_close = False
+
+            if not cached_tp:
+                continue
+            t0 = time.time()
+            size = save_checkpoint(cached_tp, candle_builder.snapshot())
+            print(f"🧷 Checkpoint: {len(cached_tp)} symbols, {size / 1024:.0f} KB "
+                  f"in {time.time() - t0:.2f}s")
+        except Exception as e:
+            print(f"⚠️ checkpoint failed: {e}")
+
+
 # -----------------------------------------------------------
 # 5) ProStocks DIRECT WebSocket – ALL symbols
 # -----------------------------------------------------------
 def start_prostocks_ws(ps_api, token_map):
     print("🔥🔥 ENTERED start_prostocks_ws() 🔥🔥")
     print("DEBUG: Token map size =", len(token_map))
-    # ✅ ADD THIS BLOCK HERE
-    # --------------------------------
+    global ws_client
     token_to_symbol = {}
     for sym, tkn in token_map.items():
         # 🔁 SYMBOL KO FULL RAKHO (ABCAPITAL-EQ)
@@ -186,150 +443,76 @@ def start_prostocks_ws(ps_api, token_map):
 
     print("✅ token_to_symbol mapped:", len(token_to_symbol))
 
-    """
-    🔥 Direct ProStocks WebSocket for ALL symbols
-    """
-
-    WS_URL = "wss://starapi.prostocks.com/NorenWSTP/"
+    def login_msg():
+        uid = getattr(ps_api, "uid", None) or getattr(ps_api, "userid", None)
+        actid = getattr(ps_api, "actid", None) or uid
+        return {
+            "t": "c",
+            "uid": uid,
+            "actid": actid,
+            "susertoken": ps_api.session_token,   # ✅ THIS IS THE FIX
+            "source": "API"
+        }
 
     # ==============================
-    #  ✅ BATCH SUBSCRIBE HELPER
+    #  ✅ ticks → candle builder
     # ==============================
-    def subscribe_in_batches(ws, batch_size=25, delay=1.0):
-        items = list(token_map.items())
-        print(f"🚀 Batch subscribing {len(items)} symbols...")
-
-        for i in range(0, len(items), batch_size):
-            batch = items[i:i + batch_size]
-
-            for sym, tok in batch:
-                if not tok:
-                    continue
-
-                msg = {
-                    "t": "t",
-                    "k": f"NSE|{tok}"
-                }
-                ws.send(json.dumps(msg))
-                # print(f"📡 Subscribed: {sym} | {tok}")
-
-            print(f"✅ Subscribed batch {i+1} → {i+len(batch)}")
-            time.sleep(delay)
-
-    # ==============================
-    #  ✅ on_open → sirf LOGIN
-    # ==============================
-    def on_open(ws):
-        print("🔥🔥 on_open ENTERED 🔥🔥")
-        print("✅ ProStocks WS TCP Connected — sending login...")
-
-        try:
-            uid = getattr(ps_api, "uid", None) or getattr(ps_api, "userid", None)
-            actid = getattr(ps_api, "actid", None) or uid
-
-            login_msg = {
-                "t": "c",
-                "uid": uid,
-                "actid": actid,
-                "susertoken": ps_api.session_token,   # ✅ THIS IS THE FIX
-                "source": "API"
-            }
-
-            print("LOGIN PAYLOAD =")
-            print(json.dumps(login_msg, indent=2))
-
-            ws.send(json.dumps(login_msg))
-            print("📨 WS login sent")
-
-            # ✅ wait for login handshake
-            time.sleep(1)
-
-            print("⚡ TEST SUBSCRIBE : NSE|3045 (SBIN)")
-            ws.send(json.dumps({
-                "t": "t",
-                "k": "NSE|3045"
-            }))
-
-            print("✅ SBIN subscribe sent")
+    # TICK_BATCH_MS > 0: the WS thread only buffers, a flusher folds micro-batches
+    batcher = None
+    if TICK_BATCH_MS > 0:
+        batcher = MicroBatcher(candle_builder.update_batch, flush_ms=TICK_BATCH_MS,
+                               registry=candle_builder.symbols).start()
+        print(f"🧮 Tick micro-batching every {TICK_BATCH_MS:.0f} ms")
+
+    def apply_tick(tick):
+        symbol = token_to_symbol.get(tick.token)
+        if not symbol:
+            print("❌ TOKEN MAP FAIL:", tick.token)
+            return
+        if batcher is not None:
+            batcher.put(symbol, tick.price, tick.volume, tick.ts)
+        else:
+            candle_builder.update_tick(symbol, tick.price, tick.volume, tick.ts)
 
-        except Exception as e:
-            print("⚠️ Failed to send WS login:", e)
+    volumes = CumulativeVolume()
 
-    # ==============================
-    #  ✅ on_message → ck + ticks
-    # ==============================
-    def on_message(ws, message):
-        print("\n📩 FROM WS >>>", message, "\n")
+    def on_tick(data):
         try:
-            data = json.loads(message)
-
-            # 🔎 LOGIN RESPONSE (ck)
-            if data.get("t") == "ck":
-                print("🔔 WS ck message:", data)
-
-                # ✅ LOGIN OK → ab batch subscribe
-                if data.get("s") == "OK":
-                    print("✅ WS LOGIN OK — starting batch subscribe...")
-                    subscribe_in_batches(ws)
-                else:
-                    print("❌ WS LOGIN NOT_OK — jKey / creds check karo")
-
-                return
-
-            # 🔎 Heartbeat / other non-tick messages
-            if data.get("t") != "tk":
-                print("ℹ️ Non-tick WS msg:", data)
-                return
-
-            print("📩 LIVE RAW:", data)
-
-            token_raw = str(data.get("tk"))
-            token = token_raw.replace("NSE|", "").strip()
-
-            price = data.get("lp") or data.get("fp")
-            ts = data.get("ft")
-
-            if not token or not price or not ts:
-                print("⚠️ Missing fields:", data)
-                return
-
-            price = float(price)
-            ts = int(float(ts))
-            volume = int(float(data.get("v", 1)))
-
-            print("DEBUG token raw:", token_raw, " cleaned:", token)
-
-            symbol = token_to_symbol.get(token)
-
-            if not symbol:
-                print("❌ TOKEN MAP FAIL:", token)
+            tick = parse_tick(data, volumes)
+            if tick is None:
+                # partial "tf" updates (no price / time change) are expected
+                if data.get("t") == "tk":
+                    print("⚠️ Missing fields:", data)
                 return
-
-            print(f"✅ TICK OK → {symbol} | {price} | {ts}")
-
-            candle_builder.update_tick(symbol, price, volume, ts)
+            apply_tick(tick)
         except Exception as e:
             print("❌ WS Message Error:", e)
 
-    def on_error(ws, error):
-        print("❌ WebSocket Error:", error)
-
-    def on_close(ws, close_status_code, close_msg):
-        print("⚠️ ProStocks WS closed… reconnecting in 5s")
-        time.sleep(5)
-        start_prostocks_ws(ps_api, token_map)
-
-    # ✅ WebSocket client
-    ws = websocket.WebSocketApp(
-        WS_URL,
-        on_message=on_message,
-        on_error=on_error,
-        on_close=on_close,
-        on_open=on_open,
-    )
-
-    # ✅ Keepalive with ping
-    ws.run_forever(ping_interval=10, ping_timeout=5)
+    if TICK_SHARDS > 1:
+        # N connections in N processes (consistent hashing), one candle store here
+        def on_ticks(batch):
+            for tick in batch:
+                try:
+                    apply_tick(tick)
+                except Exception as e:
+                    print("❌ WS Message Error:", e)
+
+        ws_client = ShardedTickIngest(
+            list(token_to_symbol), login_msg(), on_ticks, shards=TICK_SHARDS,
+            on_ready=lambda shard, toks: schedule_gap_repair(token_map, shard, toks),
+            on_disconnect=lambda shard, toks, at: mark_disconnected(shard, at),
+        )
+        ws_client.run_forever()
+        return
+
+    def on_ready():
+        print("✅ WS LOGIN OK — subscribed | metrics:", ws_client.metrics())
+        schedule_gap_repair(token_map)
+
+    # one supervisor loop: backoff + '#'-joined resubscribe on every reconnect
+    ws_client = SupervisedWS(login_msg, list(token_to_symbol), on_tick,
+                             on_ready=on_ready, on_disconnect=mark_disconnected)
+    ws_client.run_forever(ping_interval=10, ping_timeout=5)
 
 # -----------------------------------------------------------
 # 6) ENTRY POINT
@@ -408,6 +591,16 @@ if __name__ == "__main__":
     # ---- 3) Preload TPSeries for all symbols ----
     # ---- 3) Preload TPSeries for all symbols (BACKGROUND THREAD) ----
 
+    # ---- restore the last checkpoint (older than the backfill window → ignored) ----
+    checkpoint = load_checkpoint(max_age_secs=backfill_days(_trm_settings, interval=5) * 86400)
+    restored_since = None
+    if checkpoint:
+        restored_since = checkpoint["saved_at"]
+        cached_tp.update(checkpoint["tp"])
+        kept = candle_builder.restore(checkpoint["live"])
+        print(f"♻️ Checkpoint restored: {len(checkpoint['tp'])} symbols, {kept} running candles "
+              f"(saved {time.time() - restored_since:.0f}s ago)")
+
     def preload_all_tpseries(ps_api, token_map):
         global cached_tp
         print("📥 Background TPSeries loading started...")
@@ -415,12 +608,22 @@ if __name__ == "__main__":
 
         for sym, token in token_map.items():
             try:
+                if restored_since is not None and sym in cached_tp:
+                    # restored → only the gap since the checkpoint
+                    df_tp = backfill_gap(ps_api, "NSE", token, cached_tp[sym], restored_since)
+                    cached_tp[sym] = df_tp
+                    daily_levels.seed(norm_symbol(sym), df_tp)
+                    print(f"✅ {sym} gap backfilled: {len(df_tp)} candles")
+                    continue
+
                 df_tp = load_backfill(ps_api, "NSE", token, interval="5")
 
                 if df_tp is None or df_tp.empty:
                     print(f"⚠️ {sym} backfill empty")
                 else:
+                    df_tp = trim_to_lookback(df_tp, LOOKBACK_BARS)
                     cached_tp[sym] = df_tp
+                    daily_levels.seed(norm_symbol(sym), df_tp)
                     print(f"✅ {sym} backfill loaded: {len(df_tp)} candles")
 
             except Exception as e:
@@ -430,6 +633,8 @@ if __name__ == "__main__":
 
 
     
+    gap_repairer = GapRepairer(ps_api, apply_gap)
+
     print("🔥 STARTING PROSTOCKS WS THREAD")
     threading.Thread(
         target=start_prostocks_ws,
@@ -448,6 +653,9 @@ if __name__ == "__main__":
 
     time.sleep(3)
 
+    print("🔥 STARTING CHECKPOINT LOOP")
+    threading.Thread(target=checkpoint_loop, daemon=True).start()
+
     print("🔥 STARTING TPSeries preload thread")
     threading.Thread(
         target=preload_all_tpseries,
@@ -2,51 +2,19 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import streamlit as st
-import json
-import os
 
-# Always save/load TRM settings from the src folder
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-TRM_FILE = os.path.join(BASE_DIR, "trm_settings.json")
-
-# Render safety backup
-ALT_TRM_FILE = "/opt/render/project/src/trm_settings.json"
-if not os.path.exists(TRM_FILE) and os.path.exists(ALT_TRM_FILE):
-    print(f"⚠️ Using ALT TRM file: {ALT_TRM_FILE}")
-    TRM_FILE = ALT_TRM_FILE
-
-
-# =========================
-# Load / Save Settings
-# =========================
-def load_trm_settings_from_file():
-    """Load TRM settings strictly from JSON file."""
-    if os.path.exists(TRM_FILE):
-        try:
-            with open(TRM_FILE, "r") as f:
-                settings = json.load(f)
-        except Exception as e:
-            print(f"❌ Error reading TRM file: {e}")
-            settings = {}
-    else:
-        print(f"⚠️ TRM file not found at: {TRM_FILE}")
-        settings = {}
-
-    return settings
-
-
-def save_trm_settings(settings):
-    try:
-        print("📝 SAVING TRM TO:", TRM_FILE)
-
-        with open(TRM_FILE, "w") as f:
-            json.dump(settings, f, indent=2)
-
-        print("✅ TRM SAVED:", os.path.exists(TRM_FILE))
-
-    except Exception as e:
-        print("❌ SAVE ERROR:", e)
+# compute core (re-exported so existing `from tkp_trm_chart import ...` keeps working)
+from trm_core import (
+    TRM_FILE, load_trm_settings_from_file, save_trm_settings, get_trm_settings,
+    ema, rsi, calc_tkp_trm, calc_yhl, calc_intraday_volatility_flag,
+    calc_day_move_flag, calc_gap_move_flag, calc_pac, calc_atr, calc_atr_trails,
+    calc_macd, suggested_qty_by_mapping,
+)
+from indicator_graph import TRM_GRAPH
 
+# columns the chart draws (only these nodes are computed)
+PLOT_COLUMNS = ["trm_signal", "barcolor", "pacC", "pacL", "pacU", "Trail1", "Trail2",
+                "high_yest", "low_yest", "macd", "macd_signal", "macd_hist"]
 
 # =========================
 # Initialize session_state safely
@@ -108,14 +76,12 @@ def render_trm_settings_ui_body():
 
 
 # --- Prevent expander duplication safely ---
-if "trm_settings_expander_rendered" not in st.session_state:
-    st.session_state["trm_settings_expander_rendered"] = False
-
+# (flag is created on first render, not at import → module imports outside Streamlit)
 def render_trm_settings_once():
     """Render TRM Settings UI once per rerun"""
     ensure_trm_settings_loaded()   # ✅ FIX: load settings only when UI is drawn
 
-    if not st.session_state["trm_settings_expander_rendered"]:
+    if not st.session_state.setdefault("trm_settings_expander_rendered", False):
         with st.expander("⚙️ TRM Settings (Manual Adjust)", expanded=False):
             render_trm_settings_ui_body()
         st.session_state["trm_settings_expander_rendered"] = True
@@ -143,305 +109,6 @@ def get_trm_settings_safe():
         return None
     return st.session_state["trm_settings"]
 
-# =========================
-# SAFE ACCESS (Non-streamlit, FILE ONLY)
-# =========================
-def get_trm_settings():
-    """
-    Used by auto_trader_worker only.
-    Must load from JSON file. No Streamlit. No fallback. No defaults.
-    """
-
-    settings = load_trm_settings_from_file()
-
-    if not settings:
-        print("❌ TRM settings file empty or not found")
-        return None
-
-    # Minimal required keys to allow trading
-    required = [
-        "long", "short", "signal",
-        "len_rsi", "rsiBuyLevel", "rsiSellLevel",
-        "macd_fast", "macd_slow", "macd_signal",
-        "pac_length",
-        "atr_fast_period", "atr_fast_mult",
-        "atr_slow_period", "atr_slow_mult"
-    ]
-
-    missing = [k for k in required if k not in settings]
-
-    if missing:
-        print("❌ TRM settings missing keys:", missing)
-        return None
-
-    print("✅ TRM SETTINGS LOADED FOR AUTOTRADER")
-    return settings
-
-
-# =========================
-# Utility Functions
-# =========================
-def ema(series, length):
-    return series.ewm(span=length, adjust=False).mean()
-
-def rsi(series, length=14):
-    delta = series.diff()
-    up = delta.clip(lower=0)
-    down = -delta.clip(upper=0)
-    ma_up = up.rolling(length).mean()
-    ma_down = down.rolling(length).mean()
-    rs = ma_up / ma_down
-    return 100 - (100 / (1 + rs))
-
-# =========================
-# TRM Logic
-# =========================
-def calc_tkp_trm(df, settings):
-    # === Settings Validation (before indicators) ===
-    required_keys = ["long", "short", "signal", "len_rsi",
-                     "rsiBuyLevel", "rsiSellLevel",
-                     "macd_fast", "macd_slow", "macd_signal"]
-
-    if not settings:
-        raise ValueError("❌ TRM/MACD settings missing! Please configure them in dashboard.")
-
-    missing_keys = [k for k in required_keys if k not in settings]
-    if missing_keys:
-        raise ValueError(f"❌ TRM/MACD settings incomplete! Missing keys: {missing_keys}")
-
-    print("🔹 Strategy settings loaded OK:", settings)
-
-    # === Indicator Calculation ===
-    price = df["close"]
-    pc = price.diff()
-
-    first_smooth = ema(pc, settings["long"])
-    double_smoothed_pc = ema(first_smooth, settings["short"])
-
-    first_smooth_abs = ema(pc.abs(), settings["long"])
-    double_smoothed_abs = ema(first_smooth_abs, settings["short"])
-
-    tsi = 100 * (double_smoothed_pc / double_smoothed_abs)
-    tsi_signal = ema(tsi, settings["signal"])
-    rsi_vals = rsi(price, settings["len_rsi"])
-
-    isBuy = (tsi > tsi_signal) & (rsi_vals > settings["rsiBuyLevel"])
-    isSell = (tsi < tsi_signal) & (rsi_vals < settings["rsiSellLevel"])
-
-    df["trm_signal"] = np.where(isBuy, "Buy",
-                                np.where(isSell, "Sell", "Neutral"))
-
-    df["barcolor"] = np.where(isBuy, settings["buyColor"],
-                              np.where(isSell, settings["sellColor"], settings["neutralColor"]))
-    df["tsi"] = tsi
-    df["tsi_signal"] = tsi_signal
-    df["rsi"] = rsi_vals
-
-    return df
-
-# =========================
-# Yesterday High / Low
-# =========================
-def calc_yhl(df):
-    df["date"] = df["datetime"].dt.date
-    yhl = df.groupby("date").agg({"high": "max", "low": "min"}).shift(1)
-    df = df.join(yhl, on="date", rsuffix="_yest")
-    return df
-
-# =========================
-# Intraday Volatility Filter (Indicator)
-# =========================
-def calc_intraday_volatility_flag(df, threshold_single=1.3, threshold_two=2.0):
-    """
-    Returns a DataFrame column 'skip_due_to_intraday_vol' = True/False.
-    Marks True if:
-      (1) Any single candle > threshold_single % range
-      (2) Two consecutive candles combined move ≥ threshold_two %
-    """
-    if df.empty:
-        df["skip_due_to_intraday_vol"] = False
-        return df
-
-    try:
-        df = df.copy()
-        df["range_pct"] = ((df["high"] - df["low"]) / df["low"]) * 100
-
-        # --- Single candle > threshold ---
-        df["flag_single"] = df["range_pct"] >= threshold_single
-
-        # --- Two-candle combined change ---
-        df["close_change_pct"] = df["close"].pct_change() * 100
-        df["two_candle_move"] = df["close_change_pct"].rolling(2).sum().abs()
-        df["flag_two"] = df["two_candle_move"] >= threshold_two
-
-        # --- Final flag ---
-        df["skip_due_to_intraday_vol"] = df["flag_single"] | df["flag_two"]
-        return df
-
-    except Exception as e:
-        print(f"⚠️ Intraday volatility calculation failed: {e}")
-        df["skip_due_to_intraday_vol"] = False
-        return df
-
-# =========================
-# Day Move Filter Indicator
-# =========================
-def calc_day_move_flag(df, threshold_pct=1.5):
-    """
-    Adds 'day_move_pct' and 'skip_due_to_day_move' columns.
-    Marks True if today's price move from open exceeds threshold_pct (%).
-    """
-    if df.empty:
-        df["day_move_pct"] = 0
-        df["skip_due_to_day_move"] = False
-        return df
-
-    try:
-        df = df.copy()
-        df["date"] = df["datetime"].dt.date
-        df["day_open"] = df.groupby("date")["open"].transform("first")
-        df["day_move_pct"] = ((df["close"] - df["day_open"]) / df["day_open"]) * 100
-        df["skip_due_to_day_move"] = df["day_move_pct"].abs() > threshold_pct
-        return df
-
-    except Exception as e:
-        print(f"⚠️ Day move calculation failed: {e}")
-        df["day_move_pct"] = 0
-        df["skip_due_to_day_move"] = False
-        return df
-
-# ============================================================
-# 🔹 Gap Move Filter (indicator)
-# ============================================================
-def calc_gap_move_flag(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Marks stocks that have >1.0% gap up/down between yesterday close and today's open.
-    Adds columns: 'gap_pct' and 'skip_due_to_gap'
-    """
-    try:
-        df = df.copy()
-        df["gap_pct"] = 0.0
-        df["skip_due_to_gap"] = False
-
-        if len(df) < 2:
-            return df
-
-        # Get yesterday close and today's open (based on date)
-        df["date"] = df["datetime"].dt.date
-        unique_dates = df["date"].unique()
-        if len(unique_dates) >= 2:
-            today_date = unique_dates[-1]
-            yesterday_date = unique_dates[-2]
-
-            yclose = df.loc[df["date"] == yesterday_date, "close"].iloc[-1]
-            oprice = df.loc[df["date"] == today_date, "open"].iloc[0]
-
-            if yclose > 0:
-                gap_pct = ((oprice - yclose) / yclose) * 100
-                df.loc[df["date"] == today_date, "gap_pct"] = gap_pct
-                if abs(gap_pct) > 1.0:
-                    df.loc[df["date"] == today_date, "skip_due_to_gap"] = True
-
-    except Exception as e:
-        print(f"⚠️ Gap move calculation failed: {e}")
-
-    return df
-
-# =========================
-# PAC Channel
-# =========================
-def calc_pac(df, settings):
-    close = df["close"]
-    high = df["high"]
-    low = df["low"]
-
-    if settings["use_heikin_ashi"]:
-        ha_close = (df["open"] + df["high"] + df["low"] + df["close"]) / 4
-        ha_open = (df["open"] + df["close"]) / 2
-        ha_high = df[["high", "open", "close"]].max(axis=1)
-        ha_low = df[["low", "open", "close"]].min(axis=1)
-    else:
-        ha_close, ha_open, ha_high, ha_low = close, df["open"], high, low
-
-    df["pacC"] = ema(ha_close, settings["pac_length"])
-    df["pacL"] = ema(ha_low, settings["pac_length"])
-    df["pacU"] = ema(ha_high, settings["pac_length"])
-    return df
-
-# =========================
-# ATR Trails
-# =========================
-def calc_atr(df, period):
-    high, low, close = df["high"], df["low"], df["close"]
-    tr = pd.concat([
-        high - low,
-        (high - close.shift()).abs(),
-        (low - close.shift()).abs()
-    ], axis=1).max(axis=1)
-    return tr.rolling(period).mean()
-
-def calc_atr_trails(df, settings):
-    sc = df["close"]
-
-    # --- Fast Trail ---
-    sl1 = settings["atr_fast_mult"] * calc_atr(df, settings["atr_fast_period"])
-    trail1 = pd.Series(index=df.index, dtype="float64")
-    trail1.iloc[0] = sc.iloc[0]
-
-    for i in range(1, len(df)):
-        prev = trail1.iloc[i - 1]
-        if sc.iloc[i] > prev and sc.iloc[i - 1] > prev:
-            trail1.iloc[i] = max(prev, sc.iloc[i] - sl1.iloc[i])
-        elif sc.iloc[i] < prev and sc.iloc[i - 1] < prev:
-            trail1.iloc[i] = min(prev, sc.iloc[i] + sl1.iloc[i])
-        elif sc.iloc[i] > prev:
-            trail1.iloc[i] = sc.iloc[i] - sl1.iloc[i]
-        else:
-            trail1.iloc[i] = sc.iloc[i] + sl1.iloc[i]
-
-    # --- Slow Trail ---
-    sl2 = settings["atr_slow_mult"] * calc_atr(df, settings["atr_slow_period"])
-    trail2 = pd.Series(index=df.index, dtype="float64")
-    trail2.iloc[0] = sc.iloc[0]
-
-    for i in range(1, len(df)):
-        prev = trail2.iloc[i - 1]
-        if sc.iloc[i] > prev and sc.iloc[i - 1] > prev:
-            trail2.iloc[i] = max(prev, sc.iloc[i] - sl2.iloc[i])
-        elif sc.iloc[i] < prev and sc.iloc[i - 1] < prev:
-            trail2.iloc[i] = min(prev, sc.iloc[i] + sl2.iloc[i])
-        elif sc.iloc[i] > prev:
-            trail2.iloc[i] = sc.iloc[i] - sl2.iloc[i]
-        else:
-            trail2.iloc[i] = sc.iloc[i] + sl2.iloc[i]
-
-    # Save results
-    df["Trail1"] = trail1
-    df["Trail2"] = trail2
-
-    # Bullish/Bearish area shading condition
-    df["Bull"] = (trail1 > trail2) & (sc > trail2) & (df["low"] > trail2)
-
-    return df
-
-# =========================
-# MACD Calculation
-# =========================
-def calc_macd(df, settings):
-    fast = settings.get("macd_fast", 12)
-    slow = settings.get("macd_slow", 26)
-    signal = settings.get("macd_signal", 9)
-
-    exp1 = df["close"].ewm(span=fast, adjust=False).mean()
-    exp2 = df["close"].ewm(span=slow, adjust=False).mean()
-    macd_line = exp1 - exp2
-    signal_line = macd_line.ewm(span=signal, adjust=False).mean()
-    histogram = macd_line - signal_line
-
-    df["macd"] = macd_line
-    df["macd_signal"] = signal_line
-    df["macd_hist"] = histogram
-    return df
 
 def add_volatility_panel(fig, df):
     """
@@ -477,65 +144,6 @@ def add_volatility_panel(fig, df):
 
     return fig
 
-from dashboard_logic import load_qty_map
-
-def suggested_qty_by_mapping(price, qty_map=None):
-    """
-    Decide quantity based on price range and mapping dict.
-    Always requires a valid qty_map (from qty_map.json).
-    If file missing/corrupt → return None (no trade).
-    """
-    if qty_map is None:
-        qty_map = load_qty_map()
-
-    # Agar file load hi nahi hui ya dict nahi mila
-    if not isinstance(qty_map, dict) or not qty_map:
-        return None   # ❌ no fallback default
-
-    # --- Updated price ranges (1–100 ... 1000+)
-    if 1 <= price <= 100:
-        return qty_map.get("Q1")
-    elif 101 <= price <= 150:
-        return qty_map.get("Q2")
-    elif 151 <= price <= 200:
-        return qty_map.get("Q3")
-    elif 201 <= price <= 250:
-        return qty_map.get("Q4")
-    elif 251 <= price <= 300:
-        return qty_map.get("Q5")
-    elif 301 <= price <= 350:
-        return qty_map.get("Q6")
-    elif 351 <= price <= 400:
-        return qty_map.get("Q7")
-    elif 401 <= price <= 450:
-        return qty_map.get("Q8")
-    elif 451 <= price <= 500:
-        return qty_map.get("Q9")
-    elif 501 <= price <= 550:
-        return qty_map.get("Q10")
-    elif 551 <= price <= 600:
-        return qty_map.get("Q11")
-    elif 601 <= price <= 650:
-        return qty_map.get("Q12")
-    elif 651 <= price <= 700:
-        return qty_map.get("Q13")
-    elif 701 <= price <= 750:
-        return qty_map.get("Q14")
-    elif 751 <= price <= 800:
-        return qty_map.get("Q15")
-    elif 801 <= price <= 850:
-        return qty_map.get("Q16")
-    elif 851 <= price <= 900:
-        return qty_map.get("Q17")
-    elif 901 <= price <= 950:
-        return qty_map.get("Q18")
-    elif 951 <= price <= 1000:
-        return qty_map.get("Q19")
-    elif price > 1000:
-        return qty_map.get("Q20")
-    else:
-        return None   # ❌ invalid range → no qty
-
 
 # =========================
 # Wrapper for Streamlit / Plotly
@@ -545,17 +153,130 @@ import plotly.graph_objects as go
 import numpy as np
 import pandas as pd
 
+# =========================
+# Level-of-detail (LOD) helpers
+# =========================
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    Returns the indices of the n_out points that best keep the visual shape
+    of the line (first and last point are always kept).
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (n_out - 2)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0] = 0
+    idx[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        nxt_end = min(int((i + 2) * every) + 1, n)
+
+        avg_x = x[end:nxt_end].mean()
+        avg_y = y[end:nxt_end].mean()
+
+        ax, ay = x[a], y[a]
+        area = np.abs(
+            (ax - avg_x) * (y[start:end] - ay)
+            - (ax - x[start:end]) * (avg_y - ay)
+        )
+        a = start + int(np.argmax(area))
+        idx[i + 1] = a
+
+    return idx
+
+
+def ohlc_bucket_downsample(df, n_buckets):
+    """
+    Aggregate consecutive candles into n_buckets OHLC candles
+    (open=first, high=max, low=min, close=last, signal=last).
+    """
+    n = len(df)
+    if n_buckets >= n or n_buckets < 1:
+        return df
+
+    starts = np.unique(np.linspace(0, n, n_buckets, endpoint=False).astype(np.int64))
+    ends = np.append(starts[1:], n) - 1
+
+    out = {
+        "datetime": df["datetime"].to_numpy()[starts],
+        "open": df["open"].to_numpy(dtype="float64")[starts],
+        "high": np.maximum.reduceat(df["high"].to_numpy(dtype="float64"), starts),
+        "low": np.minimum.reduceat(df["low"].to_numpy(dtype="float64"), starts),
+        "close": df["close"].to_numpy(dtype="float64")[ends],
+    }
+    if "trm_signal" in df.columns:
+        out["trm_signal"] = df["trm_signal"].to_numpy(dtype=object)[ends]
+    if "macd_hist" in df.columns:
+        # keep the bar with the largest magnitude so peaks survive
+        hist = df["macd_hist"].to_numpy(dtype="float64")
+        mag = np.nan_to_num(np.abs(hist), nan=-1.0)
+        bucket_id = np.repeat(np.arange(len(starts)), ends - starts + 1)
+        order = np.lexsort((-mag, bucket_id))
+        first_in_bucket = np.r_[True, bucket_id[order][1:] != bucket_id[order][:-1]]
+        out["macd_hist"] = hist[order[first_in_bucket]]
+
+    return pd.DataFrame(out)
+
+
+def _lod_line(df, col, lod_width, full_detail_bars):
+    """LTTB on the history part of a series, full detail on the recent window."""
+    x = df["datetime"]
+    y = df[col].to_numpy(dtype="float64")
+    finite = np.isfinite(y)
+
+    recent = np.zeros(len(df), dtype=bool)
+    if full_detail_bars > 0:
+        recent[-full_detail_bars:] = True
+
+    hist_pos = np.flatnonzero(finite & ~recent)
+    budget = max(lod_width - int((finite & recent).sum()), 3)
+    if len(hist_pos) > budget:
+        x_num = x.to_numpy(dtype="datetime64[ns]").astype("int64")[hist_pos]
+        hist_pos = hist_pos[lttb_indices(x_num, y[hist_pos], budget)]
+
+    keep = np.sort(np.concatenate([hist_pos, np.flatnonzero(finite & recent)]))
+    return x.iloc[keep], y[keep]
+
+
 # =========================
 # Optimized TRM Candles
 # =========================
-def add_trm_colored_candles(fig, df, settings, row=1, col=1, max_bars=1500):
+def _segments(x, y0, y1):
+    """
+    Interleave vertical segments as [x, x, None] / [y0, y1, NaN] so that a
+    single line trace draws all of them without connecting neighbours.
+    """
+    n = len(x)
+    seg_x = np.empty(n * 3, dtype=object)
+    seg_x[0::3] = x
+    seg_x[1::3] = x
+    seg_x[2::3] = None
+
+    seg_y = np.empty(n * 3, dtype="float64")
+    seg_y[0::3] = y0
+    seg_y[1::3] = y1
+    seg_y[2::3] = np.nan
+    return seg_x, seg_y
+
+
+def add_trm_colored_candles(fig, df, settings, row=1, col=1, max_bars=1500, webgl=False):
     """
     TRM-colored candlesticks (stable with indicators)
     - Wick = one trace (gray)
-    - Body = one scatter per candle (with TRM color)
+    - Body = one trace per TRM signal color (None-separated segments)
+    - webgl=True draws with Scattergl instead of SVG Scatter
     """
+    scatter = go.Scattergl if webgl else go.Scatter
 
-    if len(df) > max_bars:
+    if max_bars and len(df) > max_bars:
         df = df.iloc[-max_bars:]
 
     # --- Color settings ---
@@ -563,15 +284,21 @@ def add_trm_colored_candles(fig, df, settings, row=1, col=1, max_bars=1500):
     sell_color = settings.get("sellColor", "#ef5350")
     neutral_color = settings.get("neutralColor", "#808080")
 
+    times = df["datetime"].to_numpy(dtype=object)
+    opens = df["open"].to_numpy(dtype="float64")
+    closes = df["close"].to_numpy(dtype="float64")
+    signals = df["trm_signal"].to_numpy(dtype=object)
+
     # ------------------------
     # Wick trace (all gray)
     # ------------------------
-    wick_x, wick_y = [], []
-    for t, l, h in zip(df["datetime"], df["low"], df["high"]):
-        wick_x += [t, t, None]
-        wick_y += [l, h, None]
+    wick_x, wick_y = _segments(
+        times,
+        df["low"].to_numpy(dtype="float64"),
+        df["high"].to_numpy(dtype="float64"),
+    )
 
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=wick_x, y=wick_y,
         mode="lines",
         line=dict(color="lightgray", width=1),
@@ -579,19 +306,24 @@ def add_trm_colored_candles(fig, df, settings, row=1, col=1, max_bars=1500):
     ), row=row, col=col)
 
     # ------------------------
-    # Body traces (one per candle)
+    # Body traces (one per signal color)
     # ------------------------
-    for t, o, c, sig in zip(df["datetime"], df["open"], df["close"], df["trm_signal"]):
-        if sig == "Buy":
-            colr = buy_color
-        elif sig == "Sell":
-            colr = sell_color
-        else:
-            colr = neutral_color
-
-        fig.add_trace(go.Scatter(
-            x=[t, t],
-            y=[o, c],
+    is_buy = signals == "Buy"
+    is_sell = signals == "Sell"
+    groups = [
+        (is_buy, buy_color),
+        (is_sell, sell_color),
+        (~(is_buy | is_sell), neutral_color),
+    ]
+
+    for mask, colr in groups:
+        if not mask.any():
+            continue
+
+        body_x, body_y = _segments(times[mask], opens[mask], closes[mask])
+        fig.add_trace(scatter(
+            x=body_x,
+            y=body_y,
             mode="lines",
             line=dict(color=colr, width=6),
             showlegend=False
@@ -600,31 +332,45 @@ def add_trm_colored_candles(fig, df, settings, row=1, col=1, max_bars=1500):
 # =========================
 # Main TRM Chart
 # =========================
-def plot_trm_chart(df, settings, rangebreaks=None, fig=None, show_macd_panel=True):
-    # === Settings Validation ===
-    required_keys = ["long", "short", "signal", "len_rsi",
-                     "rsiBuyLevel", "rsiSellLevel",
-                     "macd_fast", "macd_slow", "macd_signal"]
-
-    if not settings:
-        raise ValueError("❌ TRM/MACD settings missing! Please configure them in dashboard.")
-
-    missing_keys = [k for k in required_keys if k not in settings]
-    if missing_keys:
-        raise ValueError(f"❌ TRM/MACD settings incomplete! Missing: {missing_keys}")
-
-    print("🔹 Strategy settings loaded OK:", settings)
-
-    # === Indicator calculations ===
+def plot_trm_chart(df, settings, rangebreaks=None, fig=None, show_macd_panel=True,
+                   lod=False, lod_width=1200, full_detail_bars=300, webgl=None,
+                   memo=None, memo_key=None):
+    """
+    lod=True downsamples long histories before plotting:
+      - candles older than the last `full_detail_bars` are merged into OHLC buckets
+      - overlay / MACD lines are reduced with LTTB
+    so each series carries roughly `lod_width` points (one per pixel).
+    webgl defaults to `lod` when no rangebreaks are given, because plotly.js
+    does not apply rangebreaks to WebGL traces; pass webgl=True to force it.
+    memo/memo_key: optional IndicatorCache + symbol key → indicator nodes are
+    reused across redraws of unchanged candles.
+    """
+    # === Indicator calculations (validates settings in the trm node) ===
     df["datetime"] = pd.to_datetime(df["datetime"])
-    df = calc_tkp_trm(df, settings)
-    df = calc_yhl(df)
-    df = calc_pac(df, settings)
-    df = calc_atr_trails(df, settings)
-    df = calc_macd(df, settings)   # ✅ MACD added
-    df = calc_intraday_volatility_flag(df)   # ✅ add this
-    df = calc_gap_move_flag(df)
-    df = calc_intraday_volatility_flag(df)
+    df = TRM_GRAPH.frame(df, settings, PLOT_COLUMNS, memo=memo, key=memo_key)
+
+    # --- Level of detail ---
+    if webgl is None:
+        webgl = bool(lod) and not rangebreaks
+    scatter = go.Scattergl if webgl else go.Scatter
+
+    candle_budget = max(lod_width // 2, full_detail_bars + 50)
+    use_lod = bool(lod) and len(df) > candle_budget
+
+    if use_lod:
+        recent = df.iloc[-full_detail_bars:] if full_detail_bars > 0 else df.iloc[0:0]
+        history = df.iloc[:len(df) - len(recent)]
+        candle_df = pd.concat([
+            ohlc_bucket_downsample(history, candle_budget - len(recent)),
+            recent[["datetime", "open", "high", "low", "close", "trm_signal", "macd_hist"]],
+        ], ignore_index=True)
+    else:
+        candle_df = df
+
+    def line_xy(col):
+        if use_lod:
+            return _lod_line(df, col, lod_width, full_detail_bars)
+        return df["datetime"], df[col]
 
     # --- Create figure ---
     if show_macd_panel:
@@ -638,9 +384,11 @@ def plot_trm_chart(df, settings, rangebreaks=None, fig=None, show_macd_panel=Tru
         fig = go.Figure()
 
     # --- Candles (TRM coloring) ---
-    add_trm_colored_candles(fig, df, settings,
+    add_trm_colored_candles(fig, candle_df, settings,
                             row=1 if show_macd_panel else None,
-                            col=1 if show_macd_panel else None)
+                            col=1 if show_macd_panel else None,
+                            max_bars=None if use_lod else 1500,
+                            webgl=webgl)
 
     # --- Overlays on price ---
     for col, name, color, width in [
@@ -653,8 +401,9 @@ def plot_trm_chart(df, settings, rangebreaks=None, fig=None, show_macd_panel=Tru
         ("low_yest", "Yesterday Low", "teal", 1),
     ]:
         if col in df.columns:
-            fig.add_trace(go.Scatter(
-                x=df["datetime"], y=df[col], name=name,
+            x, y = line_xy(col)
+            fig.add_trace(scatter(
+                x=x, y=y, name=name,
                 line=dict(color=color, width=width)
             ), row=1 if show_macd_panel else None, col=1 if show_macd_panel else None)
 
@@ -663,19 +412,20 @@ def plot_trm_chart(df, settings, rangebreaks=None, fig=None, show_macd_panel=Tru
         # Histogram
         fig.add_trace(
             go.Bar(
-                x=df["datetime"],
-                y=df["macd_hist"],
-                marker_color=np.where(df["macd_hist"] >= 0, "#00FF00", "#FF0000"),
+                x=candle_df["datetime"],
+                y=candle_df["macd_hist"],
+                marker_color=np.where(candle_df["macd_hist"] >= 0, "#00FF00", "#FF0000"),
                 name="MACD Histogram"
             ),
             row=2, col=1, secondary_y=False
         )
 
         # MACD Line
+        x, y = line_xy("macd")
         fig.add_trace(
-            go.Scatter(
-                x=df["datetime"],
-                y=df["macd"],
+            scatter(
+                x=x,
+                y=y,
                 name="MACD Line",
                 line=dict(color="#00FFFF", width=1)
             ),
@@ -683,10 +433,11 @@ def plot_trm_chart(df, settings, rangebreaks=None, fig=None, show_macd_panel=Tru
         )
 
         # Signal Line
+        x, y = line_xy("macd_signal")
         fig.add_trace(
-            go.Scatter(
-                x=df["datetime"],
-                y=df["macd_signal"],
+            scatter(
+                x=x,
+                y=y,
                 name="Signal Line",
                 line=dict(color="#FF00FF", dash="dot", width=1)
             ),
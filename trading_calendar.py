@@ -0,0 +1,232 @@
+# trading_calendar.py
+"""
+NSE trading calendar shared by the dashboard, tick engine, backfill and
+auto trader.
+
+- regular session 09:15–15:30 IST, Mon–Fri
+- full-day holidays
+- special sessions (e.g. Muhurat trading) that override a holiday/weekend
+
+Sessions are precomputed per year into a dict keyed by IST day number,
+so is_open(ts) and session_bounds(date) are O(1) lookups.
+
+Extra holidays / special sessions can be added without a code change in
+trading_calendar.json next to this file:
+  {"holidays": ["2026-01-26", ...],
+   "special_sessions": {"2026-11-08": ["18:00", "19:00"]}}
+"""
+import json
+import os
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+
+import pytz
+
+IST = pytz.timezone("Asia/Kolkata")
+IST_OFFSET_SECS = 5 * 3600 + 30 * 60
+
+SESSION_OPEN = time(9, 15)
+SESSION_CLOSE = time(15, 30)
+
+# NSE equity holidays (same list Tab 5 used for rangebreaks)
+DEFAULT_HOLIDAYS = [
+    "2025-02-26", "2025-03-14", "2025-03-31", "2025-04-10", "2025-04-14",
+    "2025-04-18", "2025-05-01", "2025-08-15", "2025-08-27",
+    "2025-10-02", "2025-10-22", "2025-11-05", "2025-12-25",
+    "2026-01-26", "2026-03-03", "2026-03-26", "2026-03-31", "2026-04-03",
+    "2026-04-14", "2026-05-01", "2026-05-28", "2026-06-26", "2026-09-14",
+    "2026-10-02", "2026-10-20", "2026-11-10", "2026-11-24", "2026-12-25",
+]
+
+# date → (open, close) IST; overrides weekends/holidays
+DEFAULT_SPECIAL_SESSIONS = {
+    "2025-10-21": ("13:45", "14:45"),   # Muhurat trading
+}
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CALENDAR_FILE = os.path.join(BASE_DIR, "trading_calendar.json")
+
+
+def _parse_hhmm(s):
+    return datetime.strptime(s, "%H:%M").time()
+
+
+def _day_number(d):
+    """Days since 1970-01-01 for a date."""
+    return (d - date(1970, 1, 1)).days
+
+
+def _to_epoch(ts):
+    """epoch seconds / datetime (naive = IST wall clock) / pd.Timestamp → epoch."""
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    if ts.tzinfo is None:
+        return (ts - datetime(1970, 1, 1)).total_seconds() - IST_OFFSET_SECS
+    return ts.timestamp()
+
+
+class TradingCalendar:
+    def __init__(self, holidays=None, special_sessions=None):
+        self.holidays = {date.fromisoformat(str(h)[:10]) for h in (holidays or [])}
+        self.special_sessions = {
+            date.fromisoformat(str(d)[:10]): (_parse_hhmm(o), _parse_hhmm(c))
+            for d, (o, c) in (special_sessions or {}).items()
+        }
+        self._sessions = {}      # day number → (open_epoch, close_epoch)
+        self._years = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=CALENDAR_FILE):
+        """Built-in NSE list + optional overrides from trading_calendar.json."""
+        holidays = list(DEFAULT_HOLIDAYS)
+        specials = dict(DEFAULT_SPECIAL_SESSIONS)
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+                holidays += data.get("holidays", [])
+                specials.update({k: tuple(v) for k, v in data.get("special_sessions", {}).items()})
+            except Exception as e:
+                print(f"⚠️ trading_calendar.json ignored: {e}")
+        return cls(holidays, specials)
+
+    # ---------- precompute ----------
+    def _ensure_year(self, year):
+        if year in self._years:
+            return
+        with self._lock:
+            if year in self._years:
+                return
+            if not any(d.year == year for d in self.holidays | set(self.special_sessions)):
+                print(f"⚠️ Trading calendar has no holidays for {year}: every weekday is a session "
+                      f"(add them to DEFAULT_HOLIDAYS or trading_calendar.json)")
+            d = date(year, 1, 1)
+            while d.year == year:
+                bounds = None
+                if d in self.special_sessions:
+                    bounds = self.special_sessions[d]
+                elif d.weekday() < 5 and d not in self.holidays:
+                    bounds = (SESSION_OPEN, SESSION_CLOSE)
+
+                if bounds:
+                    day0 = _day_number(d) * 86400 - IST_OFFSET_SECS
+                    o, c = bounds
+                    self._sessions[_day_number(d)] = (
+                        day0 + o.hour * 3600 + o.minute * 60,
+                        day0 + c.hour * 3600 + c.minute * 60,
+                    )
+                d += timedelta(days=1)
+            self._years.add(year)
+
+    def _session_for_day(self, day_no):
+        self._ensure_year((date(1970, 1, 1) + timedelta(days=day_no)).year)
+        return self._sessions.get(day_no)
+
+    # ---------- queries ----------
+    def session_bounds(self, d):
+        """(open, close) as tz-aware IST datetimes, or None if no session."""
+        if isinstance(d, datetime):
+            d = d.astimezone(IST).date() if d.tzinfo else d.date()
+        s = self._session_for_day(_day_number(d))
+        if s is None:
+            return None
+        return (datetime.fromtimestamp(s[0], IST), datetime.fromtimestamp(s[1], IST))
+
+    def is_trading_day(self, d):
+        return self.session_bounds(d) is not None
+
+    def is_open(self, ts=None):
+        """True while a session is running (open ≤ ts < close)."""
+        epoch = _to_epoch(ts) if ts is not None else datetime.now(timezone.utc).timestamp()
+        s = self._session_for_day(int((epoch + IST_OFFSET_SECS) // 86400))
+        return s is not None and s[0] <= epoch < s[1]
+
+    def next_open(self, ts=None, max_days=30):
+        """Next session open at/after ts (tz-aware IST), None if none in max_days."""
+        epoch = _to_epoch(ts) if ts is not None else datetime.now(timezone.utc).timestamp()
+        day_no = int((epoch + IST_OFFSET_SECS) // 86400)
+        for i in range(max_days + 1):
+            s = self._session_for_day(day_no + i)
+            if s and epoch < s[1]:
+                return datetime.fromtimestamp(max(s[0], epoch), IST)
+        return None
+
+    def seconds_until_open(self, ts=None):
+        """0 while open, else seconds to the next session open."""
+        epoch = _to_epoch(ts) if ts is not None else datetime.now(timezone.utc).timestamp()
+        if self.is_open(epoch):
+            return 0.0
+        nxt = self.next_open(epoch)
+        return (nxt.timestamp() - epoch) if nxt else float("inf")
+
+    def sessions_between(self, start, end):
+        """[(open_epoch, close_epoch)] of sessions overlapping [start, end], clipped."""
+        st, et = _to_epoch(start), _to_epoch(end)
+        out = []
+        day_no = int((st + IST_OFFSET_SECS) // 86400)
+        last_day = int((et + IST_OFFSET_SECS) // 86400)
+        while day_no <= last_day:
+            s = self._session_for_day(day_no)
+            if s and s[1] > st and s[0] < et:
+                out.append((max(s[0], st), min(s[1], et)))
+            day_no += 1
+        return out
+
+    # ---------- backfill planner ----------
+    def plan_fetch_windows(self, start, end, chunk_days=5):
+        """
+        (st, et) epoch windows covering only trading sessions in [start, end],
+        newest first, each spanning at most `chunk_days` sessions.
+        Weekends/holidays never produce a request.
+        """
+        sessions = self.sessions_between(start, end)
+        windows = []
+        for i in range(len(sessions), 0, -chunk_days):
+            chunk = sessions[max(0, i - chunk_days):i]
+            windows.append((int(chunk[0][0]), int(chunk[-1][1])))
+        return windows
+
+    # ---------- charts ----------
+    def plotly_rangebreaks(self, start_year=None, end_year=None):
+        """
+        Plotly x-axis rangebreaks (naive IST wall clock): weekends, overnight,
+        holidays, and the closed part of special-session days.
+        """
+        years = range(start_year or min([d.year for d in self.holidays] or [date.today().year]),
+                      (end_year or date.today().year + 1) + 1)
+        for y in years:
+            self._ensure_year(y)
+
+        breaks = [
+            dict(bounds=["sat", "mon"]),
+            dict(bounds=[15.5, 9.25], pattern="hour"),
+        ]
+        fmt = "%Y-%m-%d %H:%M"
+        for h in sorted(self.holidays):
+            if h.year in years and h.weekday() < 5 and h not in self.special_sessions:
+                breaks.append(dict(bounds=[
+                    datetime.combine(h, SESSION_OPEN).strftime(fmt),
+                    datetime.combine(h, SESSION_CLOSE).strftime(fmt),
+                ]))
+        for d, (o, c) in sorted(self.special_sessions.items()):
+            if d.year not in years:
+                continue
+            if o > SESSION_OPEN:
+                breaks.append(dict(bounds=[datetime.combine(d, SESSION_OPEN).strftime(fmt),
+                                           datetime.combine(d, o).strftime(fmt)]))
+            if c < SESSION_CLOSE:
+                breaks.append(dict(bounds=[datetime.combine(d, c).strftime(fmt),
+                                           datetime.combine(d, SESSION_CLOSE).strftime(fmt)]))
+        return breaks
+
+
+_calendar = None
+
+
+def get_calendar():
+    """Process-wide calendar instance (loaded once)."""
+    global _calendar
+    if _calendar is None:
+        _calendar = TradingCalendar.load()
+    return _calendar
@@ -0,0 +1,423 @@
+# trm_core.py
+"""
+TRM compute core: settings file I/O, indicator math and quantity mapping.
+
+Pure numpy/pandas — no Streamlit or Plotly — so headless workers
+(batch_screener, backend auto trader, CLI) import it cheaply and outside
+a Streamlit runtime. tkp_trm_chart re-exports everything for the UI.
+"""
+import bisect
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import config_cache
+from dashboard_logic import load_qty_map
+
+# Always save/load TRM settings from the src folder
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRM_FILE = os.path.join(BASE_DIR, "trm_settings.json")
+
+# Render safety backup
+ALT_TRM_FILE = "/opt/render/project/src/trm_settings.json"
+if not os.path.exists(TRM_FILE) and os.path.exists(ALT_TRM_FILE):
+    print(f"⚠️ Using ALT TRM file: {ALT_TRM_FILE}")
+    TRM_FILE = ALT_TRM_FILE
+
+
+# =========================
+# Load / Save Settings
+# =========================
+def load_trm_settings_from_file():
+    """Load TRM settings strictly from JSON file (re-read only when it changes)."""
+    try:
+        settings = config_cache.load_json(TRM_FILE)
+    except FileNotFoundError:
+        print(f"⚠️ TRM file not found at: {TRM_FILE}")
+        settings = {}
+    except Exception as e:
+        print(f"❌ Error reading TRM file: {e}")
+        settings = {}
+
+    return settings
+
+
+def save_trm_settings(settings):
+    try:
+        print("📝 SAVING TRM TO:", TRM_FILE)
+
+        with open(TRM_FILE, "w") as f:
+            json.dump(settings, f, indent=2)
+        config_cache.invalidate(TRM_FILE)
+
+        print("✅ TRM SAVED:", os.path.exists(TRM_FILE))
+
+    except Exception as e:
+        print("❌ SAVE ERROR:", e)
+
+
+# =========================
+# SAFE ACCESS (Non-streamlit, FILE ONLY)
+# =========================
+def get_trm_settings():
+    """
+    Used by auto_trader_worker only.
+    Must load from JSON file. No Streamlit. No fallback. No defaults.
+    """
+
+    settings = load_trm_settings_from_file()
+
+    if not settings:
+        print("❌ TRM settings file empty or not found")
+        return None
+
+    # Minimal required keys to allow trading
+    required = [
+        "long", "short", "signal",
+        "len_rsi", "rsiBuyLevel", "rsiSellLevel",
+        "macd_fast", "macd_slow", "macd_signal",
+        "pac_length",
+        "atr_fast_period", "atr_fast_mult",
+        "atr_slow_period", "atr_slow_mult"
+    ]
+
+    missing = [k for k in required if k not in settings]
+
+    if missing:
+        print("❌ TRM settings missing keys:", missing)
+        return None
+
+    print("✅ TRM SETTINGS LOADED FOR AUTOTRADER")
+    return settings
+
+
+# =========================
+# Utility Functions
+# =========================
+def ema(series, length):
+    return series.ewm(span=length, adjust=False).mean()
+
+def rsi(series, length=14):
+    delta = series.diff()
+    up = delta.clip(lower=0)
+    down = -delta.clip(upper=0)
+    ma_up = up.rolling(length).mean()
+    ma_down = down.rolling(length).mean()
+    rs = ma_up / ma_down
+    return 100 - (100 / (1 + rs))
+
+# =========================
+# Strategy rules (one copy: calc_* chain, indicator_graph nodes, optimizer)
+# =========================
+TRM_REQUIRED_KEYS = ["long", "short", "signal", "len_rsi",
+                     "rsiBuyLevel", "rsiSellLevel",
+                     "macd_fast", "macd_slow", "macd_signal"]
+
+
+def check_trm_settings(settings):
+    if not settings:
+        raise ValueError("❌ TRM/MACD settings missing! Please configure them in dashboard.")
+
+    missing_keys = [k for k in TRM_REQUIRED_KEYS if k not in settings]
+    if missing_keys:
+        raise ValueError(f"❌ TRM/MACD settings incomplete! Missing keys: {missing_keys}")
+
+
+def trm_signal(tsi, tsi_signal, rsi_vals, settings):
+    """TSI vs its signal line + RSI levels → "Buy" / "Sell" / "Neutral" per bar."""
+    isBuy = (tsi > tsi_signal) & (rsi_vals > settings["rsiBuyLevel"])
+    isSell = (tsi < tsi_signal) & (rsi_vals < settings["rsiSellLevel"])
+    return np.where(isBuy, "Buy", np.where(isSell, "Sell", "Neutral"))
+
+
+def trm_barcolor(trm, settings):
+    return np.where(trm == "Buy", settings["buyColor"],
+                    np.where(trm == "Sell", settings["sellColor"], settings["neutralColor"]))
+
+
+def yesterday_high_low(date, high, low):
+    """Previous day's high / low on every bar → (high_yest, low_yest)."""
+    daily = pd.DataFrame({"date": date, "high": high, "low": low}) \
+        .groupby("date").agg({"high": "max", "low": "min"}).shift(1)
+    return date.map(daily["high"]), date.map(daily["low"])
+
+
+def day_move(close, day_open, threshold_pct=1.5):
+    """Move % from the day's open on every bar → (day_move_pct, skip)."""
+    pct = ((close - day_open) / day_open) * 100
+    return pct, pct.abs() > threshold_pct
+
+
+def day_volatility(date, high, low):
+    """Day-so-far range % ((day high - day low) / day low) on every bar."""
+    day_high = high.groupby(date).cummax()
+    day_low = low.groupby(date).cummin()
+    return (((day_high - day_low) / day_low) * 100).where(day_low > 0, 0.0)
+
+
+def gap_move(date, day_open, close, threshold_pct=1.0):
+    """Each day's opening gap % vs the previous day's close, on every bar of the day → (gap_pct, skip)."""
+    yclose = date.map(close.groupby(date).last().shift(1))
+    pct = (((day_open - yclose) / yclose) * 100).where(yclose > 0, 0.0).fillna(0.0)
+    return pct, pct.abs() > threshold_pct
+
+
+def two_bar_move(close_change_pct):
+    """Combined move % of two consecutive candles."""
+    return close_change_pct.rolling(2).sum().abs()
+
+
+def intraday_volatility(range_pct, close_change_pct, threshold_single=1.3, threshold_two=2.0):
+    """→ (flag_single, two_candle_move, flag_two, skip)."""
+    flag_single = range_pct >= threshold_single
+    two = two_bar_move(close_change_pct)
+    flag_two = two >= threshold_two
+    return flag_single, two, flag_two, flag_single | flag_two
+
+# =========================
+# TRM Logic
+# =========================
+def calc_tkp_trm(df, settings):
+    # === Settings Validation (before indicators) ===
+    check_trm_settings(settings)
+
+    print("🔹 Strategy settings loaded OK:", settings)
+
+    # === Indicator Calculation ===
+    price = df["close"]
+    pc = price.diff()
+
+    first_smooth = ema(pc, settings["long"])
+    double_smoothed_pc = ema(first_smooth, settings["short"])
+
+    first_smooth_abs = ema(pc.abs(), settings["long"])
+    double_smoothed_abs = ema(first_smooth_abs, settings["short"])
+
+    tsi = 100 * (double_smoothed_pc / double_smoothed_abs)
+    tsi_signal = ema(tsi, settings["signal"])
+    rsi_vals = rsi(price, settings["len_rsi"])
+
+    df["trm_signal"] = trm_signal(tsi, tsi_signal, rsi_vals, settings)
+    df["barcolor"] = trm_barcolor(df["trm_signal"].to_numpy(), settings)
+    df["tsi"] = tsi
+    df["tsi_signal"] = tsi_signal
+    df["rsi"] = rsi_vals
+
+    return df
+
+# =========================
+# Yesterday High / Low
+# =========================
+def calc_yhl(df):
+    df["date"] = df["datetime"].dt.date
+    df["high_yest"], df["low_yest"] = yesterday_high_low(df["date"], df["high"], df["low"])
+    return df
+
+# =========================
+# Intraday Volatility Filter (Indicator)
+# =========================
+def calc_intraday_volatility_flag(df, threshold_single=1.3, threshold_two=2.0):
+    """
+    Returns a DataFrame column 'skip_due_to_intraday_vol' = True/False.
+    Marks True if:
+      (1) Any single candle > threshold_single % range
+      (2) Two consecutive candles combined move ≥ threshold_two %
+    """
+    if df.empty:
+        df["skip_due_to_intraday_vol"] = False
+        return df
+
+    try:
+        df = df.copy()
+        df["range_pct"] = ((df["high"] - df["low"]) / df["low"]) * 100
+        df["close_change_pct"] = df["close"].pct_change() * 100
+        (df["flag_single"], df["two_candle_move"], df["flag_two"],
+         df["skip_due_to_intraday_vol"]) = intraday_volatility(
+            df["range_pct"], df["close_change_pct"], threshold_single, threshold_two)
+        return df
+
+    except Exception as e:
+        print(f"⚠️ Intraday volatility calculation failed: {e}")
+        df["skip_due_to_intraday_vol"] = False
+        return df
+
+# =========================
+# Day Move Filter Indicator
+# =========================
+def calc_day_move_flag(df, threshold_pct=1.5):
+    """
+    Adds 'day_move_pct' and 'skip_due_to_day_move' columns.
+    Marks True if today's price move from open exceeds threshold_pct (%).
+    """
+    if df.empty:
+        df["day_move_pct"] = 0
+        df["skip_due_to_day_move"] = False
+        return df
+
+    try:
+        df = df.copy()
+        df["date"] = df["datetime"].dt.date
+        df["day_open"] = df.groupby("date")["open"].transform("first")
+        df["day_move_pct"], df["skip_due_to_day_move"] = day_move(df["close"], df["day_open"], threshold_pct)
+        return df
+
+    except Exception as e:
+        print(f"⚠️ Day move calculation failed: {e}")
+        df["day_move_pct"] = 0
+        df["skip_due_to_day_move"] = False
+        return df
+
+# ============================================================
+# 🔹 Gap Move Filter (indicator)
+# ============================================================
+def calc_gap_move_flag(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Marks days that opened with a >1.0% gap up/down from the previous day's close.
+    Adds columns: 'gap_pct' and 'skip_due_to_gap' (every bar of the day)
+    """
+    try:
+        df = df.copy()
+        df["gap_pct"] = 0.0
+        df["skip_due_to_gap"] = False
+
+        if len(df) < 2:
+            return df
+
+        df["date"] = df["datetime"].dt.date
+        day_open = df.groupby("date")["open"].transform("first")
+        df["gap_pct"], df["skip_due_to_gap"] = gap_move(df["date"], day_open, df["close"])
+
+    except Exception as e:
+        print(f"⚠️ Gap move calculation failed: {e}")
+
+    return df
+
+# =========================
+# PAC Channel
+# =========================
+def calc_pac(df, settings):
+    close = df["close"]
+    high = df["high"]
+    low = df["low"]
+
+    if settings["use_heikin_ashi"]:
+        ha_close = (df["open"] + df["high"] + df["low"] + df["close"]) / 4
+        ha_open = (df["open"] + df["close"]) / 2
+        ha_high = df[["high", "open", "close"]].max(axis=1)
+        ha_low = df[["low", "open", "close"]].min(axis=1)
+    else:
+        ha_close, ha_open, ha_high, ha_low = close, df["open"], high, low
+
+    df["pacC"] = ema(ha_close, settings["pac_length"])
+    df["pacL"] = ema(ha_low, settings["pac_length"])
+    df["pacU"] = ema(ha_high, settings["pac_length"])
+    return df
+
+# =========================
+# ATR Trails
+# =========================
+def calc_atr(df, period):
+    high, low, close = df["high"], df["low"], df["close"]
+    tr = pd.concat([
+        high - low,
+        (high - close.shift()).abs(),
+        (low - close.shift()).abs()
+    ], axis=1).max(axis=1)
+    return tr.rolling(period).mean()
+
+def atr_trail(sc, sl):
+    """ATR trailing stop over close `sc` with stop distance `sl` (Series)."""
+    trail = pd.Series(index=sc.index, dtype="float64")
+    trail.iloc[0] = sc.iloc[0]
+
+    for i in range(1, len(sc)):
+        prev = trail.iloc[i - 1]
+        if sc.iloc[i] > prev and sc.iloc[i - 1] > prev:
+            trail.iloc[i] = max(prev, sc.iloc[i] - sl.iloc[i])
+        elif sc.iloc[i] < prev and sc.iloc[i - 1] < prev:
+            trail.iloc[i] = min(prev, sc.iloc[i] + sl.iloc[i])
+        elif sc.iloc[i] > prev:
+            trail.iloc[i] = sc.iloc[i] - sl.iloc[i]
+        else:
+            trail.iloc[i] = sc.iloc[i] + sl.iloc[i]
+    return trail
+
+
+def calc_atr_trails(df, settings):
+    sc = df["close"]
+
+    # --- Fast Trail ---
+    sl1 = settings["atr_fast_mult"] * calc_atr(df, settings["atr_fast_period"])
+    trail1 = atr_trail(sc, sl1)
+
+    # --- Slow Trail ---
+    sl2 = settings["atr_slow_mult"] * calc_atr(df, settings["atr_slow_period"])
+    trail2 = atr_trail(sc, sl2)
+
+    # Save results
+    df["Trail1"] = trail1
+    df["Trail2"] = trail2
+
+    # Bullish/Bearish area shading condition
+    df["Bull"] = (trail1 > trail2) & (sc > trail2) & (df["low"] > trail2)
+
+    return df
+
+# =========================
+# MACD Calculation
+# =========================
+def calc_macd(df, settings):
+    fast = settings.get("macd_fast", 12)
+    slow = settings.get("macd_slow", 26)
+    signal = settings.get("macd_signal", 9)
+
+    exp1 = df["close"].ewm(span=fast, adjust=False).mean()
+    exp2 = df["close"].ewm(span=slow, adjust=False).mean()
+    macd_line = exp1 - exp2
+    signal_line = macd_line.ewm(span=signal, adjust=False).mean()
+    histogram = macd_line - signal_line
+
+    df["macd"] = macd_line
+    df["macd_signal"] = signal_line
+    df["macd_hist"] = histogram
+    return df
+
+
+# =========================
+# Quantity mapping
+# =========================
+# --- Price bands (inclusive): Q1 = 1–100, Q2 = 101–150, ... Q19 = 951–1000, Q20 = >1000
+# Prices between bands (e.g. 100.5) and below 1 map to no band → no trade.
+QTY_BAND_LOWS = [1] + [50 * k + 1 for k in range(2, 20)]
+QTY_BAND_HIGHS = [100] + [50 * k + 50 for k in range(2, 20)]
+QTY_BAND_KEYS = [f"Q{i}" for i in range(1, 20)]
+QTY_TOP_BAND = (1000, "Q20")
+
+
+def qty_band(price):
+    """Q-key of the price band containing `price` (None if in no band)."""
+    i = bisect.bisect_right(QTY_BAND_LOWS, price) - 1
+    if i >= 0 and price <= QTY_BAND_HIGHS[i]:
+        return QTY_BAND_KEYS[i]
+    if price > QTY_TOP_BAND[0]:
+        return QTY_TOP_BAND[1]
+    return None
+
+
+def suggested_qty_by_mapping(price, qty_map=None):
+    """
+    Decide quantity based on price range and mapping dict.
+    Always requires a valid qty_map (from qty_map.json).
+    If file missing/corrupt → return None (no trade).
+    """
+    if qty_map is None:
+        qty_map = load_qty_map()
+
+    # Agar file load hi nahi hui ya dict nahi mila
+    if not isinstance(qty_map, dict) or not qty_map:
+        return None   # ❌ no fallback default
+
+    key = qty_band(price)
+    return qty_map.get(key) if key is not None else None
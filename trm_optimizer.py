@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+trm_optimizer.py
+Parallel parameter sweep for the TRM strategy settings.
+
+Grid or random search over the settings that drive the screener entries
+(TSI / RSI / MACD lengths and levels, PAC length, Heikin Ashi), scored with
+the vectorized backtester over historical 5-min candles.
+
+Work is split per symbol chunk across a process pool. Inside a worker every
+symbol keeps a FeatureCache, so intermediates are computed once and shared
+by all grid points of the chunk:
+  - day filters, yesterday high / low, volatility   (settings-independent)
+  - Δclose, |Δclose|, PAC sources
+  - every EMA, keyed by (source, span chain): ema(Δclose, long) is reused by
+    all (short, signal) combinations, ema(close, 12) by all MACD slows, …
+  - RSI per length, MACD histogram per (fast, slow, signal)
+Points are visited in key order (costly keys outermost) so neighbours share
+their chains. Every point is scored on the same bars: the warm-up is the
+largest required_bars() of the whole sweep.
+
+ATR trail settings are not swept: the trails are only drawn on the chart
+and never enter the screener rules, so every ATR value scores the same.
+
+Usage:
+  python trm_optimizer.py --days 60 [--method random --samples 200]
+                          [--objective total_pnl] [--out sweep.json] [--save]
+"""
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtester import (backtest_frame, day_context, signal_frame, strategy_sides,
+                        summarize, load_history)
+from ema_kernel import pac_sources
+from lookback_planner import required_bars
+from trm_core import rsi, trm_signal
+
+# sweep order: costly shared chains first, cheap thresholds last
+PARAM_SPACE = {
+    "long": [15, 25, 40],
+    "short": [3, 5, 8],
+    "signal": [9, 14],
+    "pac_length": [21, 34, 55],
+    "macd_fast": [8, 12],
+    "macd_slow": [21, 26],
+    "macd_signal": [5, 9],
+    "len_rsi": [5, 14],
+    "rsiBuyLevel": [50, 55],
+    "rsiSellLevel": [45, 50],
+}
+SWEEP_KEYS = ["long", "short", "signal", "pac_length", "use_heikin_ashi",
+              "macd_fast", "macd_slow", "macd_signal",
+              "len_rsi", "rsiBuyLevel", "rsiSellLevel"]
+OBJECTIVES = ("total_pnl", "profit_factor", "avg_pnl_pct", "win_rate")
+MIN_TRADES = 10
+TRADE_COLUMNS = ["symbol", "entry_time", "exit_time", "pnl", "pnl_pct", "reason"]
+
+
+# =========================
+# Search space
+# =========================
+def _check_space(space):
+    unknown = [k for k in space if k not in SWEEP_KEYS]
+    if unknown:
+        raise ValueError(f"❌ Not a sweepable setting: {unknown} (allowed: {SWEEP_KEYS})")
+
+
+def _valid(point):
+    return point.get("macd_fast", 0) < point.get("macd_slow", math.inf)
+
+
+def _ordered(points, space):
+    keys = list(space)
+    return sorted(points, key=lambda p: tuple(space[k].index(p[k]) for k in keys))
+
+
+def grid_points(space=None):
+    """Every combination of the space (invalid MACD fast ≥ slow dropped)."""
+    space = space or PARAM_SPACE
+    _check_space(space)
+    keys = list(space)
+    points = (dict(zip(keys, values)) for values in itertools.product(*space.values()))
+    return [p for p in points if _valid(p)]
+
+
+def random_points(space=None, samples=200, seed=0):
+    """`samples` distinct random combinations, returned in sweep order."""
+    space = space or PARAM_SPACE
+    _check_space(space)
+    rng = random.Random(seed)
+    total = math.prod(len(v) for v in space.values())
+    seen = {}
+    attempts = 0
+    while len(seen) < samples and attempts < samples * 20 and len(seen) < total:
+        attempts += 1
+        p = {k: rng.choice(v) for k, v in space.items()}
+        if _valid(p):
+            seen.setdefault(tuple(p.values()), p)
+    return _ordered(list(seen.values()), space)
+
+
+# =========================
+# Shared intermediates
+# =========================
+class FeatureCache:
+    """Per-symbol indicator intermediates, shared by every grid point."""
+
+    def __init__(self, df):
+        self.day = day_context(df)
+        close = pd.Series(self.day["close"])
+        pc = close.diff()
+        self._memo = {"close": close, "pc": pc, "apc": pc.abs()}
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key, build):
+        value = self._memo.get(key)
+        if value is None:
+            self.misses += 1
+            value = self._memo[key] = build()
+        else:
+            self.hits += 1
+        return value
+
+    def ema(self, src, *spans):
+        """ema(...ema(source, spans[0])..., spans[-1]); every link is memoized."""
+        inner = src if len(spans) == 1 else ("ema", src) + spans[:-1]
+        if len(spans) > 1:
+            self.ema(src, *spans[:-1])
+        return self._get(("ema", src) + spans,
+                         lambda: self._memo[inner].ewm(span=spans[-1], adjust=False).mean())
+
+    def tsi(self, long, short):
+        return self._get(("tsi", long, short),
+                         lambda: 100 * (self.ema("pc", long, short) / self.ema("apc", long, short)))
+
+    def tsi_signal(self, long, short, signal):
+        self.tsi(long, short)
+        return self.ema(("tsi", long, short), signal)
+
+    def rsi(self, length):
+        return self._get(("rsi", length), lambda: rsi(self._memo["close"], length))
+
+    def macd_hist(self, fast, slow, signal):
+        macd = self._get(("macd", fast, slow),
+                         lambda: self.ema("close", fast) - self.ema("close", slow))
+        return self._get(("macd_hist", fast, slow, signal),
+                         lambda: (macd - self.ema(("macd", fast, slow), signal)).to_numpy())
+
+    def pac(self, length, use_heikin_ashi):
+        """(pacC, pacL, pacU) arrays."""
+        ha = bool(use_heikin_ashi)
+        if ("pac_src", ha, 0) not in self._memo:
+            d = self.day
+            for i, src in enumerate(pac_sources(d["open"], d["high"], d["low"], d["close"], ha)):
+                self._memo[("pac_src", ha, i)] = pd.Series(src)
+        return tuple(self.ema(("pac_src", ha, i), length).to_numpy() for i in range(3))
+
+    def sides(self, settings):
+        """strategy_frame for `settings` built from cached pieces → signal frame."""
+        s = settings
+        tsi = self.tsi(s["long"], s["short"])
+        tsi_signal = self.tsi_signal(s["long"], s["short"], s["signal"])
+        trm = trm_signal(tsi, tsi_signal, self.rsi(s["len_rsi"]), s)
+
+        hist = self.macd_hist(s.get("macd_fast", 12), s.get("macd_slow", 26), s.get("macd_signal", 9))
+        pac_c, pac_l, pac_u = self.pac(s["pac_length"], s["use_heikin_ashi"])
+        return signal_frame(self.day, strategy_sides(self.day, trm, hist, pac_c), pac_l, pac_u)
+
+
+# =========================
+# Evaluation
+# =========================
+def _evaluate_chunk(frames, settings_list, qty_map, warmup, bt_kwargs):
+    """
+    Worker: every settings set on every symbol of the chunk.
+    → ([TRADE_COLUMNS tuple per trade] per settings, cache hits, misses)
+    """
+    results = [[] for _ in settings_list]
+    hits = misses = 0
+    for sym, df in frames.items():
+        if df is None or len(df) < 2:
+            continue
+        cache = FeatureCache(df)
+        for i, s in enumerate(settings_list):
+            frame = cache.sides(s)
+            for t in backtest_frame(sym, frame, qty_map=qty_map, warmup=warmup, **bt_kwargs):
+                results[i].append((sym, t["entry_time"], t["exit_time"],
+                                   t["pnl"], t["pnl_pct"], t["reason"]))
+        hits += cache.hits
+        misses += cache.misses
+    return results, hits, misses
+
+
+def _tasks(frames, n_points, workers):
+    """Symbol chunks × contiguous point blocks, about one task per worker."""
+    symbols = list(frames)
+    n_sym = max(1, min(len(symbols), workers))
+    n_blk = max(1, min(n_points, workers // n_sym))
+    sym_chunks = [symbols[i::n_sym] for i in range(n_sym)]
+    bounds = np.linspace(0, n_points, n_blk + 1).astype(int)
+    return [({s: frames[s] for s in chunk}, lo, hi)
+            for chunk in sym_chunks if chunk
+            for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+
+def score(summary, objective, min_trades):
+    if summary["trades"] < min_trades:
+        return None
+    if objective == "profit_factor" and summary["profit_factor"] is None:
+        # no losing trade: unbounded profit factor (all flat → nothing won either)
+        return math.inf if summary["wins"] else 0.0
+    return summary[objective]
+
+
+def sweep_trades(frames, settings_list, qty_map, warmup, workers=None, **bt_kwargs):
+    """
+    Backtest every settings set on every symbol (process pool over symbol
+    chunks, shared FeatureCache per symbol inside each worker).
+    → ([trades DataFrame (TRADE_COLUMNS) per settings], {"hits", "misses"})
+    """
+    workers = int(workers or os.cpu_count() or 1)
+    rows = [[] for _ in settings_list]
+    stats = {"hits": 0, "misses": 0}
+
+    def collect(lo, result):
+        per_point, hits, misses = result
+        for i, trades in enumerate(per_point):
+            rows[lo + i].extend(trades)
+        stats["hits"] += hits
+        stats["misses"] += misses
+
+    tasks = _tasks(frames, len(settings_list), workers)
+    if workers <= 1 or len(tasks) <= 1:
+        for chunk, lo, hi in tasks:
+            collect(lo, _evaluate_chunk(chunk, settings_list[lo:hi], qty_map, warmup, bt_kwargs))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [(lo, pool.submit(_evaluate_chunk, chunk, settings_list[lo:hi],
+                                        qty_map, warmup, bt_kwargs))
+                       for chunk, lo, hi in tasks]
+            for lo, fut in futures:
+                collect(lo, fut.result())
+
+    # symbol order as in frames, so equity ties resolve like run_backtest
+    order = {sym: i for i, sym in enumerate(frames)}
+    out = []
+    for trades in rows:
+        trades.sort(key=lambda t: order[t[0]])      # stable: per-symbol order kept
+        out.append(pd.DataFrame(trades, columns=TRADE_COLUMNS))
+    return out, stats
+
+
+def optimize(frames, points, base_settings, qty_map=None, objective="total_pnl",
+             min_trades=MIN_TRADES, workers=None, **bt_kwargs):
+    """
+    Score every point (dict of swept keys) merged over base_settings.
+    → ranking: [{"rank", "score", "params", "settings", "summary"}], best first
+      (points under min_trades have score None and rank last)
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"❌ Unknown objective '{objective}' (use one of {OBJECTIVES})")
+    if qty_map is None:
+        from dashboard_logic import load_qty_map
+        qty_map = load_qty_map()
+
+    settings_list = [dict(base_settings, **p) for p in points]
+    if not settings_list:
+        return []
+    warmup = max(required_bars(s) for s in settings_list)
+    trades, stats = sweep_trades(frames, settings_list, qty_map, warmup, workers, **bt_kwargs)
+
+    ranking = []
+    for p, s, df in zip(points, settings_list, trades):
+        summary = summarize(df)
+        ranking.append({"score": score(summary, objective, min_trades),
+                        "params": p, "settings": s, "summary": summary})
+
+    # equal scores (e.g. several loss-free points at pf = inf) → higher pnl first
+    ranking.sort(key=lambda r: (r["score"] is None, -(r["score"] or 0), -r["summary"]["total_pnl"]))
+    for i, r in enumerate(ranking, 1):
+        r["rank"] = i
+    print(f"🧮 {len(ranking)} settings | warm-up {warmup} bars | "
+          f"cache hits {stats['hits']} / misses {stats['misses']}")
+    return ranking
+
+
+def save_best(ranking):
+    """Write the best-scored settings to trm_settings.json."""
+    from trm_core import save_trm_settings
+
+    best = next((r for r in ranking if r["score"] is not None), None)
+    if best is None:
+        print("⚠️ No settings reached the minimum trade count — nothing saved")
+        return None
+    save_trm_settings(best["settings"])
+    return best["settings"]
+
+
+# =========================
+# CLI
+# =========================
+def main():
+    from trm_core import load_trm_settings_from_file
+
+    parser = argparse.ArgumentParser(description="TRM settings sweep")
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--symbols", default="", help="comma separated (default: backend token map)")
+    parser.add_argument("--method", choices=["grid", "random"], default="random")
+    parser.add_argument("--samples", type=int, default=200, help="random search size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--space", default="", help="JSON file {setting: [values]} (default PARAM_SPACE)")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="total_pnl")
+    parser.add_argument("--min-trades", type=int, default=MIN_TRADES)
+    parser.add_argument("--workers", type=int, default=0, help="processes (default: all cores)")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--out", default="", help="write the full ranking as JSON")
+    parser.add_argument("--save", action="store_true", help="save the best settings to trm_settings.json")
+    args = parser.parse_args()
+
+    base = load_trm_settings_from_file()
+    if not base:
+        raise SystemExit("❌ TRM settings missing (trm_settings.json)")
+
+    space = PARAM_SPACE
+    if args.space:
+        with open(args.space) as f:
+            space = json.load(f)
+    points = (grid_points(space) if args.method == "grid"
+              else random_points(space, args.samples, args.seed))
+
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()] or None
+
+    # history long enough for the slowest point of the sweep
+    longest = max([{}] + points, key=lambda p: required_bars(dict(base, **p)))
+    try:
+        frames = load_history(symbols, args.days, dict(base, **longest))
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"🔎 {len(points)} settings x {len(frames)} symbols ({args.method})")
+
+    ranking = optimize(frames, points, base, objective=args.objective,
+                       min_trades=args.min_trades, workers=args.workers or None)
+
+    for r in ranking[:args.top]:
+        sm = r["summary"]
+        print(f"#{r['rank']:<3} {args.objective}={r['score']} trades={sm['trades']} "
+              f"win={sm['win_rate']}% pf={sm['profit_factor']} dd={sm['max_drawdown']} | {r['params']}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(ranking, f, indent=2, default=str)
+        print(f"💾 ranking → {args.out}")
+    if args.save:
+        save_best(ranking)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+walk_forward.py
+Walk-forward validation of the TRM settings.
+
+Rolling windows over the trading sessions of the history, e.g.
+  train 20 sessions → test the next 5 → shift by 5 → …
+In every window the sweep points are ranked on the train sessions, the
+best one is then scored out-of-sample on the test sessions, next to the
+current settings (baseline).
+
+Windows overlap heavily, so nothing is computed per window:
+  - indicators are causal, each symbol's indicators are computed once over
+    the whole history (trm_optimizer.FeatureCache, shared by all points)
+  - trades never span sessions (entries by the cutoff, square-off at the
+    auto-exit time, one position / side once per day), so each session's
+    trades are the same whatever window contains it
+Every point is backtested once over the full history (process pool over
+symbol chunks) and a window is just a filter of those trades by entry
+session. Sessions come from the trading calendar; sessions inside the
+indicator warm-up are never part of a window.
+
+Usage:
+  python walk_forward.py --days 60 [--train 20 --test 5] [--samples 50]
+                         [--objective total_pnl] [--fixed] [--out wf.csv]
+"""
+import argparse
+import math
+
+import pandas as pd
+
+from backtester import BARS_PER_SESSION, load_history, summarize
+from lookback_planner import required_bars
+from trading_calendar import get_calendar
+from trm_optimizer import (MIN_TRADES, OBJECTIVES, PARAM_SPACE, random_points, score,
+                           sweep_trades)
+
+DEFAULT_TRAIN = 20
+DEFAULT_TEST = 5
+
+
+# =========================
+# Windows
+# =========================
+def trading_sessions(frames, warmup=0):
+    """Sorted trading dates present in the history, minus the warm-up sessions."""
+    cal = get_calendar()
+    days = set()
+    for df in frames.values():
+        if df is not None and not df.empty:
+            days.update(df["datetime"].dt.date.unique())
+    sessions = sorted(d for d in days if cal.is_trading_day(d))
+    return sessions[math.ceil(warmup / BARS_PER_SESSION):]
+
+
+def session_windows(sessions, train=DEFAULT_TRAIN, test=DEFAULT_TEST, step=None):
+    """[(train_sessions, test_sessions)] rolling forward by `step` (default: test)."""
+    step = step or test
+    windows = []
+    i = 0
+    while i + train + test <= len(sessions):
+        windows.append((sessions[i:i + train], sessions[i + train:i + train + test]))
+        i += step
+    return windows
+
+
+def _in_sessions(trades, sessions):
+    if trades.empty:
+        return trades
+    return trades[pd.to_datetime(trades["entry_time"]).dt.date.isin(set(sessions))]
+
+
+# =========================
+# Runner
+# =========================
+def walk_forward(frames, points, base_settings, qty_map=None, train=DEFAULT_TRAIN,
+                 test=DEFAULT_TEST, step=None, objective="total_pnl",
+                 min_trades=MIN_TRADES, workers=None, **bt_kwargs):
+    """
+    → DataFrame, one row per window: sessions, best params (train, changes
+      vs base_settings), train score, test stats of the best params and of
+      base_settings.
+      Without points only the baseline is scored per window.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"❌ Unknown objective '{objective}' (use one of {OBJECTIVES})")
+    if qty_map is None:
+        from dashboard_logic import load_qty_map
+        qty_map = load_qty_map()
+
+    # baseline first, then the sweep points
+    params = [{}] + list(points)
+    settings_list = [dict(base_settings, **p) for p in params]
+    warmup = max(required_bars(s) for s in settings_list)
+
+    sessions = trading_sessions(frames, warmup)
+    windows = session_windows(sessions, train, test, step)
+    if not windows:
+        raise ValueError(f"❌ History too short: {len(sessions)} sessions after the warm-up, "
+                         f"a window needs {train}+{test}")
+
+    trades, stats = sweep_trades(frames, settings_list, qty_map, warmup, workers, **bt_kwargs)
+    print(f"🧮 {len(settings_list)} settings x {len(frames)} symbols | {len(windows)} windows | "
+          f"cache hits {stats['hits']} / misses {stats['misses']}")
+
+    rows = []
+    for w, (train_days, test_days) in enumerate(windows, 1):
+        best, best_score = 0, None
+        for i in range(1, len(params)):
+            sc = score(summarize(_in_sessions(trades[i], train_days)), objective, min_trades)
+            if sc is not None and (best_score is None or sc > best_score):
+                best, best_score = i, sc
+
+        oos = summarize(_in_sessions(trades[best], test_days))
+        base = oos if best == 0 else summarize(_in_sessions(trades[0], test_days))
+        rows.append({
+            "window": w,
+            "train": f"{train_days[0]}..{train_days[-1]}",
+            "test": f"{test_days[0]}..{test_days[-1]}",
+            # only what differs from the current settings
+            "params": " ".join(f"{k}={v}" for k, v in params[best].items()
+                               if base_settings.get(k) != v) or "-",
+            "train_score": best_score,
+            "trades": oos["trades"],
+            "win_rate": oos["win_rate"],
+            "pnl": oos["total_pnl"],
+            "pf": oos["profit_factor"],
+            "max_dd": oos["max_drawdown"],
+            "base_trades": base["trades"],
+            "base_pnl": base["total_pnl"],
+        })
+    return pd.DataFrame(rows)
+
+
+# =========================
+# CLI
+# =========================
+def main():
+    from trm_core import load_trm_settings_from_file
+
+    parser = argparse.ArgumentParser(description="Walk-forward validation of the TRM settings")
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--symbols", default="", help="comma separated (default: backend token map)")
+    parser.add_argument("--train", type=int, default=DEFAULT_TRAIN, help="train sessions per window")
+    parser.add_argument("--test", type=int, default=DEFAULT_TEST, help="test sessions per window")
+    parser.add_argument("--step", type=int, default=0, help="sessions between windows (default: --test)")
+    parser.add_argument("--samples", type=int, default=50, help="random sweep points tuned per window")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixed", action="store_true", help="no tuning, score the current settings only")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="total_pnl")
+    parser.add_argument("--min-trades", type=int, default=MIN_TRADES)
+    parser.add_argument("--workers", type=int, default=0, help="processes (default: all cores)")
+    parser.add_argument("--out", default="", help="write the window table as CSV")
+    args = parser.parse_args()
+
+    base = load_trm_settings_from_file()
+    if not base:
+        raise SystemExit("❌ TRM settings missing (trm_settings.json)")
+    if args.days < args.train + args.test:
+        raise SystemExit(f"❌ --days {args.days} is shorter than one {args.train}+{args.test} window")
+    points = [] if args.fixed else random_points(PARAM_SPACE, args.samples, args.seed)
+
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()] or None
+    longest = max([{}] + points, key=lambda p: required_bars(dict(base, **p)))
+    warmup = required_bars(dict(base, **longest))
+    try:
+        # raises unless every symbol has all `days` sessions past the longest warm-up
+        frames = load_history(symbols, args.days, dict(base, **longest))
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    sessions = trading_sessions(frames, warmup)
+    windows = session_windows(sessions, args.train, args.test, args.step or None)
+    if not windows:
+        raise SystemExit(f"❌ {len(sessions)} sessions after the warm-up, "
+                         f"a window needs {args.train}+{args.test}")
+    print(f"📅 {len(sessions)} sessions ({sessions[0]}..{sessions[-1]}) → {len(windows)} windows")
+
+    table = walk_forward(frames, points, base, train=args.train, test=args.test,
+                         step=args.step or None, objective=args.objective,
+                         min_trades=args.min_trades, workers=args.workers or None)
+    if table.empty:
+        return
+    with pd.option_context("display.width", 200, "display.max_columns", None,
+                           "display.max_colwidth", 60):
+        print(table.to_string(index=False))
+    print(f"📊 out-of-sample pnl {table['pnl'].sum():.2f} vs current settings "
+          f"{table['base_pnl'].sum():.2f} over {len(table)} windows")
+    if args.out:
+        table.to_csv(args.out, index=False)
+        print(f"💾 windows → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
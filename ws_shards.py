@@ -0,0 +1,231 @@
+# ws_shards.py
+"""
+Sharded WebSocket tick ingestion.
+
+One WebSocketApp thread parses every tick of the whole universe in one
+interpreter. With TICK_SHARDS = N > 1 the token map is split over N
+connections, each in its own (spawned) process:
+
+  HashRing            consistent hashing token → shard; changing N only
+                      moves ~1/N of the tokens, so per-shard files / state
+                      stay mostly put
+  shard process       SupervisedWS (backoff, '#'-joined resubscribe) +
+                      JSON parsing → compact Tick records (pickled as
+                      4-tuples), micro-batched every SHARD_FLUSH_SECS
+  bus                 one multiprocessing queue back to the parent:
+                      ("ticks", shard, batch) / ("ready" | "down", shard, ts)
+                      / ("metrics", shard, {...})
+  ShardedTickIngest   parent side: feeds every batch to on_ticks (the
+                      common candle store), restarts dead shards and keeps
+                      the latest per-shard metrics (tick rate, state,
+                      reconnects)
+
+JSON parsing — the per-tick cost — scales with cores; the parent only
+folds ready-made tuples into the candle store.
+"""
+import bisect
+import hashlib
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from market_records import Tick
+from ws_supervisor import WS_URL, SupervisedWS
+
+TICK_SHARDS = int(os.environ.get("TICK_SHARDS", 1))
+RING_VNODES = 64
+SHARD_FLUSH_SECS = 0.05
+SHARD_METRICS_SECS = 10.0
+
+
+# =========================
+# Consistent hashing
+# =========================
+def _hash(key):
+    return int.from_bytes(hashlib.md5(str(key).encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Token → shard via a ring of RING_VNODES virtual nodes per shard."""
+
+    def __init__(self, shards, vnodes=RING_VNODES):
+        self.shards = int(shards)
+        points = sorted((_hash(f"shard-{s}-{v}"), s)
+                        for s in range(self.shards) for v in range(vnodes))
+        self._keys = [p[0] for p in points]
+        self._owners = [p[1] for p in points]
+
+    def shard_of(self, token):
+        i = bisect.bisect(self._keys, _hash(token)) % len(self._keys)
+        return self._owners[i]
+
+    def partition(self, tokens):
+        """[tokens of shard 0, tokens of shard 1, …]"""
+        parts = [[] for _ in range(self.shards)]
+        for tok in tokens:
+            parts[self.shard_of(tok)].append(tok)
+        return parts
+
+
+# =========================
+# Tick parsing (shared by the in-process and the sharded path)
+# =========================
+class CumulativeVolume:
+    """
+    Noren "v" is the day's cumulative volume (in "tk" and "tf") → volume
+    traded since the previous tick of the token. The first sighting of a
+    token (and a counter that went backwards) only sets the reference.
+    """
+
+    def __init__(self):
+        self.last = {}      # token → last cumulative volume
+
+    def delta(self, token, v):
+        prev = self.last.get(token)
+        self.last[token] = v
+        if prev is None or v < prev:
+            return 0
+        return v - prev
+
+
+def parse_tick(data, volumes=None):
+    """
+    Noren "tk"/"tf" message → Tick(token, price, volume, epoch) or None.
+
+    "tf" updates only carry the fields that changed; one without a price or
+    time is not a tick (None) and leaves the volume reference untouched, so
+    its volume counts towards the next tick. volumes: CumulativeVolume of
+    the connection (without it the tick volume is 0).
+    """
+    token = str(data.get("tk")).replace("NSE|", "").strip()
+    price = data.get("lp") or data.get("fp")
+    ts = data.get("ft")
+    if not token or not price or not ts:
+        return None
+    v = data.get("v")
+    volume = volumes.delta(token, int(float(v))) if volumes is not None and v is not None else 0
+    return Tick(token, float(price), volume, int(float(ts)))
+
+
+# =========================
+# Shard process
+# =========================
+def _shard_main(shard, tokens, login, bus, url=WS_URL, flush_secs=SHARD_FLUSH_SECS,
+                metrics_secs=SHARD_METRICS_SECS):
+    buf = []
+    lock = threading.Lock()
+    volumes = CumulativeVolume()
+
+    def on_tick(data):
+        try:
+            tick = parse_tick(data, volumes)
+        except (TypeError, ValueError):
+            return
+        if tick is not None:
+            with lock:
+                buf.append(tick)
+
+    ws = SupervisedWS(lambda: login, tokens, on_tick, url=url, name=f"shard{shard}",
+                      on_ready=lambda: bus.put(("ready", shard, time.time())),
+                      on_disconnect=lambda: bus.put(("down", shard, time.time())))
+
+    def flusher():
+        last_m, last_ticks = time.time(), 0
+        while True:
+            time.sleep(flush_secs)
+            with lock:
+                batch = buf[:]
+                del buf[:]
+            if batch:
+                bus.put(("ticks", shard, batch))
+
+            now = time.time()
+            if now - last_m >= metrics_secs:
+                m = ws.metrics()
+                m["tick_rate"] = round((m["ticks"] - last_ticks) / (now - last_m), 1)
+                m["pid"] = os.getpid()
+                bus.put(("metrics", shard, m))
+                last_m, last_ticks = now, m["ticks"]
+
+    threading.Thread(target=flusher, daemon=True).start()
+    ws.run_forever(ping_interval=10, ping_timeout=5)
+
+
+# =========================
+# Parent side
+# =========================
+class ShardedTickIngest:
+    """
+    ingest = ShardedTickIngest(tokens, login, on_ticks, shards=4)
+    ingest.run_forever()      # blocks: consumes the bus, restarts dead shards
+
+    on_ticks(batch): list of market_records.Tick, in arrival order per shard
+    on_ready(shard, tokens) / on_disconnect(shard, tokens, at): connection events
+    """
+
+    def __init__(self, tokens, login, on_ticks, shards=TICK_SHARDS,
+                 on_ready=None, on_disconnect=None, url=WS_URL):
+        self.ring = HashRing(shards)
+        self.parts = self.ring.partition([str(t) for t in tokens])
+        self.login = login
+        self.on_ticks = on_ticks
+        self.on_ready = on_ready
+        self.on_disconnect = on_disconnect
+        self.url = url
+        self._ctx = multiprocessing.get_context("spawn")
+        self._bus = self._ctx.Queue()
+        self._procs = {}
+        self._metrics = {}
+        self.restarts = 0
+
+    def _spawn(self, shard):
+        p = self._ctx.Process(target=_shard_main, name=f"tick-shard-{shard}", daemon=True,
+                              args=(shard, self.parts[shard], self.login, self._bus, self.url))
+        p.start()
+        self._procs[shard] = p
+
+    def start(self):
+        for shard, part in enumerate(self.parts):
+            if part:
+                self._spawn(shard)
+        print(f"🧩 {len(self._procs)} WS shards: " +
+              ", ".join(f"#{s}={len(p)}" for s, p in enumerate(self.parts)))
+
+    def metrics(self):
+        """{shard: latest metrics (tick_rate, state, connects, …)}"""
+        return {s: dict(m, tokens=len(self.parts[s])) for s, m in self._metrics.items()}
+
+    def _check_procs(self):
+        for shard, p in list(self._procs.items()):
+            if not p.is_alive():
+                print(f"⚠️ WS shard #{shard} died (exit {p.exitcode}) — restarting")
+                self.restarts += 1
+                if self.on_disconnect:
+                    self.on_disconnect(shard, self.parts[shard], time.time())
+                self._spawn(shard)
+
+    def run_forever(self):
+        self.start()
+        last_check = time.time()
+        while True:
+            try:
+                kind, shard, payload = self._bus.get(timeout=1.0)
+            except queue.Empty:
+                kind = None
+
+            if kind == "ticks":
+                self.on_ticks(payload)
+            elif kind == "ready" and self.on_ready:
+                self.on_ready(shard, self.parts[shard])
+            elif kind == "down" and self.on_disconnect:
+                self.on_disconnect(shard, self.parts[shard], payload)
+            elif kind == "metrics":
+                self._metrics[shard] = payload
+                print(f"📊 WS shard #{shard}: {payload['tick_rate']} ticks/s, "
+                      f"{payload['state']}, reconnects={payload['disconnects']}")
+
+            if time.time() - last_check >= SHARD_METRICS_SECS:
+                last_check = time.time()
+                self._check_procs()
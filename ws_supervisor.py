@@ -0,0 +1,205 @@
+# ws_supervisor.py
+"""
+Supervised ProStocks (Noren) WebSocket connection.
+
+One loop owns the connection instead of on_close re-entering the start
+function (which nested a run_forever + stack frame per disconnect):
+
+  connect → login ("c") → ck OK → subscribe → ticks … → closed
+     ↑                                                    │
+     └──────── sleep backoff_delay(attempt) ◄─────────────┘
+
+- full-jitter exponential backoff (WS_BACKOFF_BASE … WS_BACKOFF_MAX); a
+  connection that stayed up WS_STABLE_SECS resets the attempt counter
+- subscriptions are '#'-joined multi-token "t" messages (Noren supports
+  "NSE|22#NSE|2885#…"), chunked only by message size and sent back to back,
+  so full coverage after a reconnect costs one round-trip
+- metrics(): state, connects / disconnects, last downtime (disconnect →
+  login OK), time from the disconnect to the first tick after resubscribe
+"""
+import json
+import random
+import threading
+import time
+
+import websocket
+
+WS_URL = "wss://starapi.prostocks.com/NorenWSTP/"
+WS_BACKOFF_BASE = 1.0
+WS_BACKOFF_MAX = 60.0
+WS_STABLE_SECS = 30.0
+SUBSCRIBE_MAX_CHARS = 8000      # per '#'-joined message
+
+
+def backoff_delay(attempt, base=WS_BACKOFF_BASE, cap=WS_BACKOFF_MAX, rng=random):
+    """Full jitter: uniform(0, min(cap, base·2^attempt)), never below base / 2."""
+    return max(base / 2, rng.uniform(0, min(cap, base * (2 ** min(attempt, 30)))))
+
+
+def subscribe_messages(tokens, kind="t", exch="NSE", max_chars=SUBSCRIBE_MAX_CHARS):
+    """'#'-joined {"t": kind, "k": "NSE|a#NSE|b…"} messages covering all tokens."""
+    msgs, keys, size = [], [], 0
+    for tok in tokens:
+        key = f"{exch}|{tok}"
+        if keys and size + len(key) + 1 > max_chars:
+            msgs.append({"t": kind, "k": "#".join(keys)})
+            keys, size = [], 0
+        keys.append(key)
+        size += len(key) + 1
+    if keys:
+        msgs.append({"t": kind, "k": "#".join(keys)})
+    return msgs
+
+
+class SupervisedWS:
+    """
+    ws = SupervisedWS(login_msg, tokens, on_tick, name="ws")
+    ws.run_forever()         # blocks; reconnects with backoff
+
+    login_msg: callable → login payload (read at every connect, so a
+               refreshed session token is picked up)
+    on_tick(data): every "tk"/"tf" message
+    on_ready():    after each successful login + subscribe
+    on_disconnect(): once per dropped connection
+    """
+
+    def __init__(self, login_msg, tokens, on_tick, on_ready=None, on_disconnect=None,
+                 url=WS_URL, name="ws", exch="NSE"):
+        self.login_msg = login_msg
+        self.on_tick = on_tick
+        self.on_ready = on_ready
+        self.on_disconnect = on_disconnect
+        self.url = url
+        self.name = name
+        self.exch = exch
+
+        self._wanted = list(dict.fromkeys(str(t) for t in tokens if t))
+        self._subscribed = set()
+        self._lock = threading.Lock()
+        self._ws = None
+        self._stop = False
+
+        self._metrics = {
+            "state": "idle", "connects": 0, "disconnects": 0, "logins_failed": 0,
+            "attempt": 0, "next_retry_in": 0.0, "ticks": 0,
+            "connected_at": None, "disconnected_at": None, "last_tick_at": None,
+            "last_downtime_secs": None, "resubscribe_secs": None,
+        }
+
+    # ---------- metrics ----------
+    def metrics(self):
+        with self._lock:
+            return dict(self._metrics, tokens=len(self._wanted), subscribed=len(self._subscribed))
+
+    def _set(self, **kw):
+        with self._lock:
+            self._metrics.update(kw)
+
+    # ---------- subscriptions ----------
+    def _send(self, ws, msgs):
+        for msg in msgs:
+            ws.send(json.dumps(msg))
+
+    def _subscribe_all(self, ws):
+        with self._lock:
+            tokens = list(self._wanted)
+        msgs = subscribe_messages(tokens, "t", self.exch)
+        self._send(ws, msgs)
+        with self._lock:
+            self._subscribed = set(tokens)
+        print(f"📡 [{self.name}] subscribed {len(tokens)} tokens in {len(msgs)} message(s)")
+
+    # ---------- callbacks ----------
+    def _on_open(self, ws):
+        self._set(state="login")
+        ws.send(json.dumps(self.login_msg()))
+        print(f"📨 [{self.name}] WS login sent")
+
+    def _on_message(self, ws, message):
+        try:
+            data = json.loads(message)
+        except Exception as e:
+            print(f"❌ [{self.name}] WS message parse error:", e)
+            return
+
+        kind = data.get("t")
+        if kind in ("tk", "tf"):
+            now = time.time()
+            with self._lock:
+                m = self._metrics
+                m["ticks"] += 1
+                m["last_tick_at"] = now
+                # first tick after a reconnect → back to full coverage
+                if m["disconnected_at"] is not None and m["resubscribe_secs"] is None:
+                    m["resubscribe_secs"] = round(now - m["disconnected_at"], 3)
+            self.on_tick(data)
+            return
+
+        if kind == "ck":
+            if data.get("s") in ("OK", "Ok"):
+                with self._lock:
+                    m = self._metrics
+                    m["state"] = "subscribing"
+                    if m["disconnected_at"] is not None:
+                        m["last_downtime_secs"] = round(time.time() - m["disconnected_at"], 3)
+                self._subscribe_all(ws)
+                self._set(state="subscribed")
+                if self.on_ready:
+                    self.on_ready()
+            else:
+                self._set(logins_failed=self._metrics["logins_failed"] + 1)
+                print(f"❌ [{self.name}] WS LOGIN NOT_OK:", data)
+                ws.close()
+            return
+
+        print(f"ℹ️ [{self.name}] Non-tick WS msg:", data)
+
+    def _on_error(self, ws, error):
+        print(f"❌ [{self.name}] WebSocket Error:", error)
+
+    # ---------- supervisor loop ----------
+    def stop(self):
+        self._stop = True
+        if self._ws is not None:
+            self._ws.close()
+
+    def run_forever(self, ping_interval=10, ping_timeout=5):
+        attempt = 0
+        while not self._stop:
+            ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+            )
+            with self._lock:
+                self._ws = ws
+                self._metrics["state"] = "connecting"
+                self._metrics["connects"] += 1
+                self._metrics["connected_at"] = time.time()
+
+            try:
+                ws.run_forever(ping_interval=ping_interval, ping_timeout=ping_timeout)
+            except Exception as e:
+                print(f"❌ [{self.name}] run_forever crashed:", e)
+
+            now = time.time()
+            with self._lock:
+                m = self._metrics
+                up = now - (m["connected_at"] or now)
+                m["state"] = "disconnected"
+                m["disconnects"] += 1
+                m["disconnected_at"] = now
+                m["resubscribe_secs"] = None
+                self._ws = None
+                self._subscribed = set()
+            if self._stop:
+                break
+            if self.on_disconnect:
+                self.on_disconnect()
+
+            attempt = 0 if up >= WS_STABLE_SECS else attempt + 1
+            delay = backoff_delay(attempt)
+            self._set(attempt=attempt, next_retry_in=round(delay, 2), state="backoff")
+            print(f"⚠️ [{self.name}] WS closed after {up:.0f}s… reconnect #{attempt} in {delay:.1f}s")
+            time.sleep(delay)